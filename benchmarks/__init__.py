@@ -0,0 +1,14 @@
+"""
+Performance benchmarks for sprockets.clients.http.
+
+The benchmarks run against a local Tornado upstream (see
+:mod:`benchmarks.upstream`) so that results do not depend on the
+network.  Run the request path benchmarks with::
+
+   python -m benchmarks.run
+
+and pass ``--help`` for the available options.  Micro-benchmarks for
+individual features live in their own modules, for example
+``python -m benchmarks.templates``.
+
+"""
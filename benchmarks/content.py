@@ -0,0 +1,93 @@
+"""
+Compare the body codecs on representative payloads.
+
+Each available codec encodes and decodes a small object, a list of
+records and a nested document.  Form encoding is only measured for the
+flat object since it cannot represent the others.  The standard library
+JSON codec is always measured so that the gain of the selected JSON
+backend is visible.  Run it with::
+
+   python -m benchmarks.content
+
+"""
+from __future__ import print_function
+
+import argparse
+import sys
+import timeit
+
+from sprockets.clients.http import content
+
+
+def _record(index):
+    return {'id': index, 'name': 'user-{}'.format(index),
+            'email': 'user{}@example.com'.format(index),
+            'active': index % 3 != 0, 'score': index * 1.5,
+            'tags': ['alpha', 'beta', 'gamma'][:index % 4]}
+
+
+PAYLOADS = {
+    'small': {'id': 42, 'status': 'ok', 'message': 'accepted'},
+    'records': [_record(index) for index in range(500)],
+    'nested': {'page': {'number': 1, 'size': 50},
+               'items': [{'id': index, 'owner': _record(index),
+                          'history': [_record(n) for n in range(5)]}
+                         for index in range(50)]},
+}
+
+
+class StdlibJSONCodec(content.JSONCodec):
+
+    @staticmethod
+    def encode(obj):
+        return content._stdlib_dumps(obj)
+
+    @staticmethod
+    def decode(data, charset='utf-8'):
+        return content._stdlib_loads(data)
+
+
+def _codecs(payload):
+    codecs = [('json ({})'.format(content.JSON_BACKEND),
+               content.JSONCodec())]
+    if content.JSON_BACKEND != 'json':
+        codecs.append(('json (json)', StdlibJSONCodec()))
+    if content.msgpack is not None:
+        codecs.append(('msgpack', content.MsgPackCodec()))
+    flat = isinstance(payload, dict) and not any(
+        isinstance(value, (dict, list)) for value in payload.values())
+    if flat:
+        codecs.append(('form', content.FormCodec()))
+    return codecs
+
+
+def _best(case, number, repeat):
+    return min(timeit.repeat(case, number=number, repeat=repeat)) / number
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark body codecs')
+    parser.add_argument('--number', type=int, default=200,
+                        help='calls per measurement')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of measurements (best is reported)')
+    args = parser.parse_args(argv)
+
+    print('{:<10} {:<16} {:>10} {:>12} {:>12}'.format(
+        'payload', 'codec', 'bytes', 'encode us', 'decode us'))
+    for payload_name in sorted(PAYLOADS):
+        payload = PAYLOADS[payload_name]
+        for codec_name, codec in _codecs(payload):
+            encoded = codec.encode(payload)
+            encode = _best(lambda: codec.encode(payload), args.number,
+                           args.repeat)
+            decode = _best(lambda: codec.decode(encoded), args.number,
+                           args.repeat)
+            print('{:<10} {:<16} {:>10} {:>12.1f} {:>12.1f}'.format(
+                payload_name, codec_name, len(encoded), encode * 1e6,
+                decode * 1e6))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
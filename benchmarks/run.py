@@ -0,0 +1,313 @@
+"""
+Benchmark the request path against a local upstream.
+
+Each scenario drives :meth:`.HTTPClient.send_request` or
+:meth:`.ClientMixin.make_http_request` with a fixed number of
+concurrent workers and reports throughput, latency percentiles, CPU
+time per request and memory use.  Results can be saved as a baseline
+and later runs compared against it::
+
+   python -m benchmarks.run --save-baseline benchmarks/baseline.json
+   python -m benchmarks.run --baseline benchmarks/baseline.json
+
+The process exits with a non-zero status when a scenario regressed by
+more than the tolerance.
+
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+from tornado import gen, httpclient, httputil, ioloop, web
+
+from sprockets.clients.http import client, metrics, mixins, registry
+
+from benchmarks import upstream
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+
+CLIENTS = {
+    'simple': 'tornado.simple_httpclient.SimpleAsyncHTTPClient',
+    'curl': 'tornado.curl_httpclient.CurlAsyncHTTPClient',
+}
+DRIVERS = ('send_request', 'make_http_request')
+
+COMPARISONS = (
+    # metric, larger is better
+    ('throughput', True),
+    ('p99', False),
+    ('cpu_per_request', False),
+)
+
+
+class BenchmarkHandler(mixins.ClientMixin, web.RequestHandler):
+    pass
+
+
+class _Connection(object):
+    """Just enough of a HTTP connection to create a request handler."""
+
+    def set_close_callback(self, callback):
+        pass
+
+
+def _make_handler(application):
+    request = httputil.HTTPServerRequest(method='GET', uri='/',
+                                         connection=_Connection())
+    return BenchmarkHandler(application, request)
+
+
+def _cpu_time():
+    times = os.times()
+    return times[0] + times[1]
+
+
+class Scenario(object):
+    """
+    A single benchmark configuration.
+
+    :param str driver: ``send_request`` or ``make_http_request``
+    :param str client_name: key of :data:`.CLIENTS`
+    :param str profile: key of :data:`.upstream.PROFILES`
+    :param int concurrency: number of concurrent workers
+    :param int port: port that the upstream listens on
+
+    """
+
+    def __init__(self, driver, client_name, profile, concurrency, port):
+        super(Scenario, self).__init__()
+        self.driver = driver
+        self.client_name = client_name
+        self.profile = profile
+        self.concurrency = concurrency
+        self.port = port
+
+    @property
+    def name(self):
+        return '{}/{}/{}/c{}'.format(self.driver, self.client_name,
+                                     self.profile, self.concurrency)
+
+    def _make_senders(self):
+        if self.driver == 'send_request':
+            http_client = client.HTTPClient(force_instance=True,
+                                            max_clients=self.concurrency)
+
+            def send():
+                return http_client.send_request('GET', 'http', '127.0.0.1',
+                                                'payload', port=self.port)
+
+            return [send] * self.concurrency, http_client.close
+
+        application = web.Application(http_clients={
+            'default': {'max_clients': self.concurrency}})
+        senders = []
+        for _ in range(self.concurrency):
+            handler = _make_handler(application)
+            senders.append(lambda h=handler: h.make_http_request(
+                'GET', 'http', '127.0.0.1', 'payload', port=self.port,
+                on_error=self._on_error))
+        return senders, registry.close_clients
+
+    def _on_error(self, handler, request, error):
+        self._errors += 1
+
+    @gen.coroutine
+    def _drive(self, senders, requests, histogram):
+        io_loop = ioloop.IOLoop.current()
+        remaining = [requests]
+
+        @gen.coroutine
+        def worker(send):
+            while remaining[0] > 0:
+                remaining[0] -= 1
+                start = io_loop.time()
+                try:
+                    yield send()
+                except client.HTTPError:
+                    self._errors += 1
+                histogram.record(io_loop.time() - start)
+
+        yield [worker(send) for send in senders]
+
+    def run(self, requests, trace_memory=True):
+        """
+        Run the scenario.
+
+        :param int requests: number of requests to measure
+        :param bool trace_memory: measure memory use in a second pass
+            with :mod:`tracemalloc` when it is available
+        :returns: :class:`dict` of results
+
+        """
+        httpclient.AsyncHTTPClient.configure(CLIENTS[self.client_name])
+        io_loop = ioloop.IOLoop()
+        io_loop.make_current()
+        senders, close = self._make_senders()
+        try:
+            self._errors = 0
+            io_loop.run_sync(lambda: self._drive(
+                senders, 2 * self.concurrency, metrics.Histogram()))
+
+            self._errors = 0
+            histogram = metrics.Histogram()
+            cpu_start, wall_start = _cpu_time(), io_loop.time()
+            io_loop.run_sync(lambda: self._drive(senders, requests,
+                                                 histogram))
+            cpu = _cpu_time() - cpu_start
+            wall = io_loop.time() - wall_start
+            result = {
+                'requests': requests,
+                'errors': self._errors,
+                'throughput': requests / wall,
+                'p50': histogram.percentile(50),
+                'p90': histogram.percentile(90),
+                'p99': histogram.percentile(99),
+                'cpu_per_request': cpu / requests,
+                'peak_kib': None,
+                'retained_per_request': None,
+            }
+
+            if trace_memory and tracemalloc is not None:
+                traced = min(requests, 500)
+                tracemalloc.start()
+                before = tracemalloc.take_snapshot()
+                io_loop.run_sync(lambda: self._drive(
+                    senders, traced, metrics.Histogram()))
+                after = tracemalloc.take_snapshot()
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                retained = sum(stat.size_diff for stat in
+                               after.compare_to(before, 'filename'))
+                result['peak_kib'] = peak / 1024.0
+                result['retained_per_request'] = retained / float(traced)
+            return result
+        finally:
+            close()
+            io_loop.clear_current()
+            io_loop.close(all_fds=True)
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare results to a baseline.
+
+    :param dict results: mapping of scenario name to results
+    :param dict baseline: mapping of scenario name to results
+    :param float tolerance: allowed relative change, for example
+        ``0.1`` for 10%
+    :returns: :class:`dict` mapping scenario name to a :class:`list`
+        of regression descriptions
+
+    """
+    regressions = {}
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric, larger_is_better in COMPARISONS:
+            old, new = previous.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (change < -tolerance if larger_is_better
+                    else change > tolerance):
+                regressions.setdefault(name, []).append(
+                    '{} {:+.1%}'.format(metric, change))
+    return regressions
+
+
+def _format_ms(seconds):
+    return '-' if seconds is None else '{:.2f}'.format(seconds * 1000.0)
+
+
+def report(results, regressions, out=sys.stdout):
+    """Print a results table."""
+    row = '{:<44} {:>9} {:>8} {:>8} {:>10} {:>9} {:>6}  {}'
+    print(row.format('scenario', 'req/s', 'p50 ms', 'p99 ms',
+                     'cpu us/req', 'peak KiB', 'errors', 'baseline'),
+          file=out)
+    for name in sorted(results):
+        result = results[name]
+        print(row.format(
+            name, '{:.0f}'.format(result['throughput']),
+            _format_ms(result['p50']), _format_ms(result['p99']),
+            '{:.0f}'.format(result['cpu_per_request'] * 1e6),
+            ('-' if result['peak_kib'] is None
+             else '{:.0f}'.format(result['peak_kib'])),
+            result['errors'],
+            ', '.join(regressions.get(name, [])) or 'ok'), file=out)
+
+
+def _csv(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the HTTP request path')
+    parser.add_argument('--profile', action='append',
+                        choices=sorted(upstream.PROFILES),
+                        help='upstream profile (repeatable, default: fast)')
+    parser.add_argument('--concurrency', default='1,10,50',
+                        help='comma-separated concurrency levels')
+    parser.add_argument('--requests', type=int, default=2000,
+                        help='requests per scenario')
+    parser.add_argument('--clients', default='simple,curl',
+                        help='comma-separated client implementations')
+    parser.add_argument('--drivers', default=','.join(DRIVERS),
+                        help='comma-separated request drivers')
+    parser.add_argument('--baseline', help='baseline file to compare with')
+    parser.add_argument('--save-baseline', metavar='PATH',
+                        help='write the results to PATH')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='allowed relative regression (default 0.1)')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='skip the tracemalloc pass')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.ERROR)
+    clients = []
+    for name in _csv(args.clients):
+        try:
+            __import__(CLIENTS[name].rsplit('.', 1)[0])
+        except ImportError as error:
+            print('skipping {} client: {}'.format(name, error),
+                  file=sys.stderr)
+            continue
+        clients.append(name)
+
+    results = {}
+    for profile in args.profile or ['fast']:
+        with upstream.Upstream(upstream.PROFILES[profile]) as server:
+            for driver in _csv(args.drivers):
+                for client_name in clients:
+                    for concurrency in _csv(args.concurrency):
+                        scenario = Scenario(driver, client_name, profile,
+                                            int(concurrency), server.port)
+                        results[scenario.name] = scenario.run(
+                            args.requests, not args.no_memory)
+
+    regressions = {}
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file),
+                                  args.tolerance)
+    report(results, regressions)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
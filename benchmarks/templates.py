@@ -0,0 +1,69 @@
+"""
+Compare request preparation with and without a request template.
+
+Only the work done before a request is handed to Tornado is measured:
+building the URL, merging headers and creating the
+:class:`~tornado.httpclient.HTTPRequest`.  Run it with::
+
+   python -m benchmarks.templates
+
+"""
+from __future__ import print_function
+
+import argparse
+import sys
+import timeit
+
+from sprockets.clients.http import client
+
+
+def _prepare_only(http_client):
+    # replace the network path so that only request preparation runs
+    http_client._send = lambda request, *args: request
+    http_client.headers.update({'Accept': 'application/json',
+                                'User-Agent': 'benchmark/1.0'})
+    return http_client
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark request templates')
+    parser.add_argument('--number', type=int, default=20000,
+                        help='calls per measurement')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of measurements (best is reported)')
+    args = parser.parse_args(argv)
+
+    http_client = _prepare_only(client.HTTPClient())
+    headers = {'X-Request-Id': 'abc'}
+    template = http_client.template('GET', 'https', 'api.example.com',
+                                    'v1', 'users', '{user_id}', 'orders',
+                                    port=8443)
+
+    cases = [
+        ('send_request', lambda: http_client.send_request(
+            'GET', 'https', 'api.example.com', 'v1', 'users', 42,
+            'orders', port=8443)),
+        ('template', lambda: template(user_id=42)),
+        ('send_request with headers', lambda: http_client.send_request(
+            'GET', 'https', 'api.example.com', 'v1', 'users', 42,
+            'orders', port=8443, headers=headers)),
+        ('template with headers', lambda: template(user_id=42,
+                                                   headers=headers)),
+    ]
+    timings = {}
+    for name, case in cases:
+        best = min(timeit.repeat(case, number=args.number,
+                                 repeat=args.repeat))
+        timings[name] = best / args.number
+        print('{:<28} {:8.2f} us/call'.format(name, timings[name] * 1e6))
+
+    for plain, templated in ((cases[0][0], cases[1][0]),
+                             (cases[2][0], cases[3][0])):
+        print('{} is {:.2f}x faster than {}'.format(
+            templated, timings[plain] / timings[templated], plain))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
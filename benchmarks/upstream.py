@@ -0,0 +1,107 @@
+"""
+Local upstream server with configurable behaviour.
+
+The upstream runs in a separate process so that its CPU time is not
+charged to the client that is being measured.
+
+"""
+import logging
+import multiprocessing
+import random
+
+from tornado import gen, httpserver, ioloop, netutil, web
+
+
+PROFILES = {
+    'fast': {'latency': 0.0, 'jitter': 0.0, 'size': 128,
+             'error_rate': 0.0},
+    'slow': {'latency': 0.05, 'jitter': 0.02, 'size': 128,
+             'error_rate': 0.0},
+    'large': {'latency': 0.0, 'jitter': 0.0, 'size': 1024 * 1024,
+              'error_rate': 0.0},
+    'flaky': {'latency': 0.005, 'jitter': 0.005, 'size': 128,
+              'error_rate': 0.1},
+}
+"""
+Named response profiles.
+
+``latency``
+   seconds to wait before responding
+``jitter``
+   upper bound of a random amount of seconds added to ``latency``
+``size``
+   number of bytes in the response body
+``error_rate``
+   fraction of requests that fail with a ``503``
+
+"""
+
+
+class PayloadHandler(web.RequestHandler):
+
+    def initialize(self, profile):
+        self.profile = profile
+        self.body = b'x' * profile['size']
+
+    @gen.coroutine
+    def get(self, *args):
+        delay = self.profile['latency']
+        if self.profile['jitter']:
+            delay += random.uniform(0, self.profile['jitter'])
+        if delay:
+            yield gen.sleep(delay)
+        if random.random() < self.profile['error_rate']:
+            self.set_status(503)
+            return
+        self.set_header('Content-Type', 'application/octet-stream')
+        self.write(self.body)
+
+    post = put = get
+
+
+def make_application(profile):
+    """Create the upstream application for a profile."""
+    return web.Application([web.url(r'/(.*)', PayloadHandler,
+                                    {'profile': profile})])
+
+
+def _serve(profile, connection):
+    logging.getLogger('tornado.access').disabled = True
+    sockets = netutil.bind_sockets(0, '127.0.0.1')
+    server = httpserver.HTTPServer(make_application(profile))
+    server.add_sockets(sockets)
+    connection.send(sockets[0].getsockname()[1])
+    ioloop.IOLoop.current().start()
+
+
+class Upstream(object):
+    """
+    Run the upstream in a child process.
+
+    :param dict profile: one of the :data:`.PROFILES` values
+
+    .. code-block:: python
+
+       with Upstream(PROFILES['slow']) as upstream:
+           run_benchmark('127.0.0.1', upstream.port)
+
+    """
+
+    def __init__(self, profile):
+        super(Upstream, self).__init__()
+        self.profile = profile
+        self.port = None
+        self._process = None
+
+    def __enter__(self):
+        parent, child = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(
+            target=_serve, args=(self.profile, child))
+        self._process.daemon = True
+        self._process.start()
+        self.port = parent.recv()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._process.terminate()
+        self._process.join()
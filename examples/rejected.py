@@ -1,15 +1,21 @@
 from rejected import consumer
 from sprockets.clients import http
+from sprockets.clients.http import retry
 from tornado import gen
 
 
+RETRY_POLICY = retry.RetryPolicy(max_attempts=3, backoff=0.25,
+                                 budget=retry.RetryBudget(ratio=0.1))
+
+
 class Consumer(http.ClientMixin, consumer.Consumer):
     """
     Makes requests against httpbin.org.
 
     The message format that this consumer accepts is simply the
     status code to request from ``http://httpbin.org/status/:code``
-    as a plain text body.
+    as a plain text body.  Transient failures are retried in-process
+    a few times before the message is returned to the broker.
 
     """
 
@@ -18,7 +24,7 @@ class Consumer(http.ClientMixin, consumer.Consumer):
         yield self.make_http_request(
             'GET', 'http', 'httpbin.org', 'status', self.body,
             headers={'Accept': 'application/json'},
-            on_error=self.translate_http_error)
+            retry_policy=RETRY_POLICY, on_error=self.translate_http_error)
 
     def translate_http_error(self, request, error):
         """
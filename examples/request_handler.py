@@ -53,10 +53,55 @@ class HttpBinHandler(http.ClientMixin, web.RequestHandler):
         self.send_error(error.code)
 
 
+class HttpBinStreamHandler(http.ClientMixin, web.RequestHandler):
+    """Streams random bytes from httpbin.org without buffering them."""
+
+    def initialize(self):
+        super(HttpBinStreamHandler, self).initialize()
+        self.scheme = self.settings.get('scheme', 'http')
+        self.server = self.settings.get('server', 'httpbin.org')
+        self.port = self.settings.get('port', None)
+
+    @gen.coroutine
+    def get(self, num_bytes):
+        yield self.proxy_http_response(
+            'GET', self.scheme, self.server, 'stream-bytes', num_bytes,
+            port=self.port)
+        if not self._finished:
+            self.finish()
+
+
+@web.stream_request_body
+class HttpBinUploadHandler(http.ClientMixin, web.RequestHandler):
+    """Forwards uploads to httpbin.org as they are received."""
+
+    def initialize(self):
+        super(HttpBinUploadHandler, self).initialize()
+        self.scheme = self.settings.get('scheme', 'http')
+        self.server = self.settings.get('server', 'httpbin.org')
+        self.port = self.settings.get('port', None)
+
+    def prepare(self):
+        self.begin_streaming_request(
+            'POST', self.scheme, self.server, 'post', port=self.port,
+            headers={'Content-Type': self.request.headers.get(
+                'Content-Type', 'application/octet-stream')})
+
+    @gen.coroutine
+    def post(self):
+        response = yield self.finish_streaming_request()
+        if not self._finished:
+            self.set_status(200)
+            self.write(response.body)
+            self.finish()
+
+
 def make_application(**settings):
     return web.Application([
         web.url('/(?P<status_code>\d+)', HttpBinHandler),
         web.url('/post', HttpBinHandler),
+        web.url('/stream-bytes/(?P<num_bytes>\d+)', HttpBinStreamHandler),
+        web.url('/upload', HttpBinUploadHandler),
     ], **settings)
 
 
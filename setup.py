@@ -48,9 +48,11 @@ setuptools.setup(
         'Topic :: Software Development :: Libraries',
         'Topic :: Software Development :: Libraries :: Python Modules',
     ],
-    packages=setuptools.find_packages(exclude=['examples']),
+    packages=setuptools.find_packages(exclude=['benchmarks', 'examples']),
     namespace_packages=['sprockets', 'sprockets.clients'],
     install_requires=read_requirements('installation.txt'),
     tests_require=read_requirements('testing.txt'),
+    extras_require={'brotli': ['brotli'], 'msgpack': ['msgpack'],
+                    'zstd': ['zstandard']},
     test_suite='nose.collector',
     zip_safe=True)
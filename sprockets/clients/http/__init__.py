@@ -1,18 +1,44 @@
 try:
-    from sprockets.clients.http.client import HTTPClient, HTTPError
+    from sprockets.clients.http.client import (BulkheadFullError,
+                                               CircuitOpenError,
+                                               DeadlineExceededError,
+                                               HTTPClient, HTTPError,
+                                               QueueTimeoutError,
+                                               RateLimitedError,
+                                               ResponseTooLargeError)
     from sprockets.clients.http.mixins import ClientMixin
 
 except ImportError as error:
+    def BulkheadFullError(*args, **kwargs):
+        raise error
+
+    def CircuitOpenError(*args, **kwargs):
+        raise error
+
     def ClientMixin(*args, **kwargs):
         raise error
 
+    def DeadlineExceededError(*args, **kwargs):
+        raise error
+
     def HTTPClient(*args, **kwargs):
         raise error
 
     def HTTPError(*args, **kwargs):
         raise error
 
+    def QueueTimeoutError(*args, **kwargs):
+        raise error
+
+    def RateLimitedError(*args, **kwargs):
+        raise error
+
+    def ResponseTooLargeError(*args, **kwargs):
+        raise error
+
 version_info = (0, 0, 0)
 __version__ = '.'.join(str(v) for v in version_info)
 __all__ = ['version_info', '__version__',
-           'ClientMixin', 'HTTPClient', 'HTTPError']
+           'BulkheadFullError', 'CircuitOpenError', 'ClientMixin',
+           'DeadlineExceededError', 'HTTPClient', 'HTTPError',
+           'QueueTimeoutError', 'RateLimitedError', 'ResponseTooLargeError']
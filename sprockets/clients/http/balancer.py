@@ -0,0 +1,238 @@
+import copy
+import logging
+import random
+import time
+
+
+log = logging.getLogger(__name__)
+
+EJECTION_CODES = frozenset([502, 503, 504, 599])
+"""Status codes that count against the health of an endpoint."""
+
+
+class Endpoint(object):
+    """
+    A single ``host:port`` that serves a named upstream.
+
+    .. attribute:: outstanding
+
+       Number of requests in flight to this endpoint.
+
+    .. attribute:: latency
+
+       Exponentially weighted moving average of the response time in
+       seconds or :data:`None` before the first response.
+
+    .. attribute:: ejected_until
+
+       Timestamp that the endpoint is ejected until or :data:`None`
+       when the endpoint is healthy.
+
+    """
+
+    def __init__(self, host, port):
+        super(Endpoint, self).__init__()
+        self.host = host
+        self.port = int(port)
+        self.outstanding = 0
+        self.latency = None
+        self.consecutive_failures = 0
+        self.ejected_until = None
+
+    @property
+    def netloc(self):
+        return '{}:{}'.format(self.host, self.port)
+
+    def __repr__(self):
+        return '<Endpoint {}>'.format(self.netloc)
+
+
+class RoundRobin(object):
+    """Selects endpoints in turn."""
+
+    def __init__(self):
+        super(RoundRobin, self).__init__()
+        self._next = 0
+
+    def select(self, endpoints):
+        self._next = (self._next + 1) % len(endpoints)
+        return endpoints[self._next]
+
+
+class LeastOutstanding(object):
+    """Selects the endpoint with the fewest requests in flight."""
+
+    def select(self, endpoints):
+        return min(endpoints, key=lambda endpoint: endpoint.outstanding)
+
+
+class PowerOfTwoChoices(object):
+    """
+    Picks two endpoints at random and selects the less loaded one.
+
+    Load is the observed latency scaled by the number of outstanding
+    requests, so slow endpoints receive less traffic without every
+    request converging on the single fastest endpoint.
+
+    """
+
+    @staticmethod
+    def _load(endpoint):
+        return (endpoint.latency or 0.0) * (endpoint.outstanding + 1)
+
+    def select(self, endpoints):
+        if len(endpoints) == 1:
+            return endpoints[0]
+        first, second = random.sample(endpoints, 2)
+        return first if self._load(first) <= self._load(second) else second
+
+
+STRATEGIES = {
+    'round-robin': RoundRobin,
+    'least-outstanding': LeastOutstanding,
+    'power-of-two-choices': PowerOfTwoChoices,
+}
+"""Strategy names accepted by :class:`.Upstream`."""
+
+
+class Upstream(object):
+    """
+    A named service that is served by several endpoints.
+
+    :param str name: name that is passed as the ``host`` to
+        :meth:`.HTTPClient.send_request`
+    :param endpoints: iterable of ``host:port`` strings or
+        ``(host, port)`` tuples
+    :param strategy: name of a strategy from :data:`.STRATEGIES` or
+        an object with a ``select(endpoints)`` method
+    :param int max_failures: number of consecutive failures that eject
+        an endpoint from rotation
+    :param codes: status codes that count as failures.  Defaults to
+        :data:`.EJECTION_CODES`.
+    :param float ejection_time: number of seconds that an endpoint
+        stays ejected before it is re-admitted
+    :param float max_ejected: largest fraction of endpoints that may be
+        ejected at the same time
+    :param float decay: weight of the newest sample in the latency
+        moving average
+    :param clock: function that returns the current time in seconds
+
+    Register instances with :meth:`.HTTPClient.add_upstream`.  Each
+    attempt selects an endpoint from the healthy endpoints.  Ejected
+    endpoints are re-admitted once `ejection_time` has passed; if every
+    endpoint is ejected, the strategy chooses from all of them.
+
+    """
+
+    def __init__(self, name, endpoints, strategy='round-robin',
+                 max_failures=5, codes=None, ejection_time=30.0,
+                 max_ejected=0.5, decay=0.3, clock=time.time):
+        super(Upstream, self).__init__()
+        self.name = name
+        self.endpoints = []
+        for endpoint in endpoints:
+            if not isinstance(endpoint, (list, tuple)):
+                endpoint = endpoint.rsplit(':', 1)
+            self.endpoints.append(Endpoint(*endpoint))
+        if not self.endpoints:
+            raise ValueError('upstream {} has no endpoints'.format(name))
+        self.strategy = (STRATEGIES[strategy]() if isinstance(strategy, str)
+                         else strategy)
+        self.max_failures = max_failures
+        self.codes = frozenset(EJECTION_CODES if codes is None else codes)
+        self.ejection_time = ejection_time
+        self.max_ejected = max_ejected
+        self.decay = decay
+        self.clock = clock
+        self.logger = log.getChild(self.__class__.__name__)
+
+    def healthy_endpoints(self):
+        """Endpoints that are currently in rotation."""
+        now = self.clock()
+        healthy = []
+        for endpoint in self.endpoints:
+            if endpoint.ejected_until is not None:
+                if endpoint.ejected_until > now:
+                    continue
+                self.logger.info('re-admitting %s to %s', endpoint.netloc,
+                                 self.name)
+                endpoint.ejected_until = None
+                endpoint.consecutive_failures = 0
+            healthy.append(endpoint)
+        return healthy
+
+    def select(self):
+        """
+        Choose the endpoint for the next attempt.
+
+        :rtype: Endpoint
+
+        """
+        return self.strategy.select(self.healthy_endpoints() or
+                                    self.endpoints)
+
+    def rewrite_request(self, request, scheme, endpoint):
+        """
+        Create a copy of `request` that is addressed to `endpoint`.
+
+        :param tornado.httpclient.HTTPRequest request: request that is
+            addressed to the upstream name
+        :param str scheme: URL scheme of the request
+        :param Endpoint endpoint: the selected endpoint
+
+        """
+        request = copy.copy(request)
+        request.url = '{}://{}{}'.format(
+            scheme, endpoint.netloc,
+            request.url[len(scheme) + 3 + len(self.name):])
+        return request
+
+    def request_started(self, endpoint):
+        endpoint.outstanding += 1
+
+    def request_finished(self, endpoint, code, elapsed):
+        """
+        Record the outcome of an attempt.
+
+        :param Endpoint endpoint: the endpoint that was used
+        :param int code: the resulting status code or :data:`None`
+            if the request was rejected before it was sent
+        :param float elapsed: seconds that the attempt took
+
+        """
+        endpoint.outstanding -= 1
+        if code is None:
+            return
+        if endpoint.latency is None:
+            endpoint.latency = elapsed
+        else:
+            endpoint.latency += self.decay * (elapsed - endpoint.latency)
+
+        if code not in self.codes:
+            endpoint.consecutive_failures = 0
+            return
+
+        endpoint.consecutive_failures += 1
+        if (endpoint.ejected_until is None and
+                endpoint.consecutive_failures >= self.max_failures):
+            ejected = sum(1 for e in self.endpoints
+                          if e.ejected_until is not None)
+            if ejected + 1 <= len(self.endpoints) * self.max_ejected:
+                self.logger.warning('ejecting %s from %s after %d failures',
+                                    endpoint.netloc, self.name,
+                                    endpoint.consecutive_failures)
+                endpoint.ejected_until = self.clock() + self.ejection_time
+
+    def stats(self):
+        """
+        Retrieve the state of each endpoint.
+
+        :returns: :class:`dict` mapping ``host:port`` to a :class:`dict`
+            with ``outstanding``, ``latency`` and ``ejected`` keys
+
+        """
+        return dict((endpoint.netloc,
+                     {'outstanding': endpoint.outstanding,
+                      'latency': endpoint.latency,
+                      'ejected': endpoint.ejected_until is not None})
+                    for endpoint in self.endpoints)
@@ -0,0 +1,196 @@
+import collections
+
+from tornado import concurrent, ioloop
+
+
+BatchResult = collections.namedtuple('BatchResult',
+                                     ['index', 'spec', 'response', 'error'])
+"""
+Outcome of a single request in a :class:`.RequestBatch`.
+
+.. py:attribute:: index
+
+   Position of the request specification in the input.
+
+.. py:attribute:: spec
+
+   The request specification.
+
+.. py:attribute:: response
+
+   :class:`~tornado.httpclient.HTTPResponse` or :data:`None` if the
+   request failed.
+
+.. py:attribute:: error
+
+   The exception that the request failed with or :data:`None`.
+
+"""
+
+
+def split_spec(spec):
+    """
+    Split a request specification into arguments and keywords.
+
+    :param spec: sequence of positional arguments for
+        :meth:`.HTTPClient.send_request` optionally followed by a
+        :class:`dict` of keyword arguments, for example
+        ``('GET', 'http', 'api.example.com', 'users', 1, {'port': 8000})``
+    :returns: ``(args, kwargs)`` tuple
+
+    """
+    spec = tuple(spec)
+    if spec and isinstance(spec[-1], dict):
+        return spec[:-1], spec[-1]
+    return spec, {}
+
+
+class RequestBatch(object):
+    """
+    Sends a group of requests with bounded parallelism.
+
+    :param http_client: the :class:`.HTTPClient` to send requests with
+    :param specs: iterable of request specifications as described in
+        :func:`.split_spec`.  It is consumed lazily as slots free up.
+    :param int parallelism: maximum number of requests in flight
+    :param bool fail_fast: stop sending requests after the first
+        failure
+
+    Results can be consumed as they complete:
+
+    .. code-block:: python
+
+       batch = http_client.iter_requests(specs, parallelism=5)
+       while not batch.done():
+           result = yield batch.next()
+           process(result.response)
+
+    or all at once, in input order, by yielding :meth:`.results`.
+    Requests that are in flight when the batch is cancelled are
+    abandoned and their results discarded.
+
+    """
+
+    def __init__(self, http_client, specs, parallelism=10, fail_fast=False):
+        super(RequestBatch, self).__init__()
+        if parallelism < 1:
+            raise ValueError('parallelism must be at least 1')
+        self.http_client = http_client
+        self.parallelism = parallelism
+        self.fail_fast = fail_fast
+        self.cancelled = False
+        self._specs = enumerate(specs)
+        self._exhausted = False
+        self._active = 0
+        self._results = []
+        self._completed = collections.deque()
+        self._waiter = None
+        self._first_error = None
+        self._finished = None
+        self._io_loop = ioloop.IOLoop.current()
+        self._launch()
+
+    def _launch(self):
+        while (not self.cancelled and not self._exhausted and
+               self._active < self.parallelism):
+            try:
+                index, spec = next(self._specs)
+            except StopIteration:
+                self._exhausted = True
+                break
+            args, kwargs = split_spec(spec)
+            self._active += 1
+            self._results.append(None)
+            try:
+                future = self.http_client.send_request(*args, **kwargs)
+            except Exception as error:
+                future = concurrent.Future()
+                future.set_exception(error)
+            self._io_loop.add_future(
+                future, lambda f, i=index, s=spec: self._on_done(i, s, f))
+        self._check_finished()
+
+    def _on_done(self, index, spec, future):
+        self._active -= 1
+        if self.cancelled:
+            return
+        try:
+            result = BatchResult(index, spec, future.result(), None)
+        except Exception as error:
+            result = BatchResult(index, spec, None, error)
+        self._results[index] = result
+        self._completed.append(result)
+
+        if result.error is not None and self._first_error is None:
+            self._first_error = result.error
+            if self.fail_fast:
+                self.cancel()
+
+        if self._waiter is not None and self._completed:
+            waiter, self._waiter = self._waiter, None
+            waiter.set_result(self._completed.popleft())
+        self._launch()
+
+    def _check_finished(self):
+        if self._finished is None or self._finished.done():
+            return
+        if self.cancelled and self._first_error is not None:
+            self._finished.set_exception(self._first_error)
+        elif self.cancelled or (self._exhausted and not self._active):
+            self._finished.set_result(
+                [result for result in self._results if result is not None])
+
+    def cancel(self):
+        """
+        Stop sending requests and abandon those in flight.
+
+        A pending :meth:`.next` future resolves to :data:`None`.
+
+        """
+        if not self.cancelled:
+            self.cancelled = True
+            if self._waiter is not None and not self._completed:
+                waiter, self._waiter = self._waiter, None
+                waiter.set_result(None)
+            self._check_finished()
+
+    def done(self):
+        """Have all of the results been consumed by :meth:`.next`?"""
+        if self._completed or self._waiter is not None:
+            return False
+        return self.cancelled or (self._exhausted and not self._active)
+
+    def next(self):
+        """
+        Wait for the next result to complete.
+
+        :returns: :class:`~tornado.concurrent.Future` that resolves to
+            a :class:`.BatchResult`
+        :raises: :exc:`ValueError` if the batch is :meth:`.done`
+
+        """
+        if self._waiter is not None:
+            raise ValueError('next() called while already waiting')
+        if self.done():
+            raise ValueError('no more results')
+        future = concurrent.Future()
+        if self._completed:
+            future.set_result(self._completed.popleft())
+        else:
+            self._waiter = future
+        return future
+
+    def results(self):
+        """
+        Wait for every request to complete.
+
+        :returns: :class:`~tornado.concurrent.Future` that resolves to
+            a :class:`list` of :class:`.BatchResult` instances in input
+            order.  If `fail_fast` is enabled, the future raises the
+            first failure instead.
+
+        """
+        if self._finished is None:
+            self._finished = concurrent.Future()
+            self._check_finished()
+        return self._finished
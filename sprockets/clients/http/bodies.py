@@ -0,0 +1,254 @@
+import copy
+import io
+import logging
+import mmap
+import tempfile
+
+from tornado import concurrent, httpclient, ioloop
+
+
+log = logging.getLogger(__name__)
+
+
+class SpooledBody(object):
+    """
+    Response body that moves to a temporary file once it grows large.
+
+    :param int threshold: bodies larger than this many bytes are
+        written to an anonymous temporary file instead of memory.
+        :data:`None` always keeps the body in memory.
+
+    This is used as the :attr:`~tornado.httpclient.HTTPResponse.buffer`
+    of responses received with a ``spill_threshold``.  Read a spilled
+    body with the file methods (``read``, ``seek``, ``readinto``, ...)
+    or map it with :meth:`.mmap` since accessing
+    :attr:`~tornado.httpclient.HTTPResponse.body` copies the whole
+    file into memory.  The temporary file is removed when the body is
+    closed or garbage collected.
+
+    .. attribute:: size
+
+       Number of bytes in the body.
+
+    .. attribute:: spilled
+
+       :data:`True` once the body has been moved to a temporary file.
+
+    """
+
+    def __init__(self, threshold=None):
+        super(SpooledBody, self).__init__()
+        self.threshold = threshold
+        self.size = 0
+        self.spilled = False
+        self._file = io.BytesIO()
+
+    def write(self, chunk):
+        """Append `chunk` to the body."""
+        self.size += len(chunk)
+        if (not self.spilled and self.threshold is not None and
+                self.size > self.threshold):
+            spill = tempfile.TemporaryFile(prefix='sprockets-http-')
+            spill.write(self._file.getvalue())
+            self._file = spill
+            self.spilled = True
+            log.debug('spilled response body to disk after %d bytes',
+                      self.size)
+        self._file.write(chunk)
+
+    def getvalue(self):
+        """Retrieve the whole body as :class:`bytes`."""
+        if not self.spilled:
+            return self._file.getvalue()
+        position = self._file.tell()
+        self._file.seek(0)
+        try:
+            return self._file.read()
+        finally:
+            self._file.seek(position)
+
+    def mmap(self):
+        """
+        Map the body into memory without reading it.
+
+        :returns: a read-only :class:`mmap.mmap` of a spilled body or
+            the :class:`bytes` of a body that was kept in memory
+
+        """
+        if not self.spilled:
+            return self._file.getvalue()
+        self._file.flush()
+        return mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def reset(self):
+        """Discard the body and remove the temporary file."""
+        self._file.close()
+        self._file = io.BytesIO()
+        self.size = 0
+        self.spilled = False
+
+    def __len__(self):
+        return self.size
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._file, name)
+
+
+class BodyCollector(object):
+    """
+    Enforces the size limit of a response body as it is received.
+
+    :param tornado.httpclient.HTTPRequest request: the request that
+        the response belongs to
+    :param int max_body_size: largest acceptable body in bytes or
+        :data:`None` for no limit
+    :param int spill_threshold: bodies larger than this many bytes are
+        buffered in a temporary file, see :class:`.SpooledBody`.
+        :data:`None` buffers bodies in memory.
+
+    Send :attr:`.request` instead of the original request and pass
+    the resulting future to :meth:`.watch`.  The copy routes the
+    header lines and body chunks through this collector.  Chunks are
+    passed to the original ``streaming_callback`` if it is set,
+    otherwise they are buffered in a :class:`.SpooledBody`.  Call
+    :meth:`.finish` with the response to get a response with the
+    collected body.
+
+    A ``Content-Length`` above `max_body_size` or a body that grows
+    beyond it sets :attr:`.exceeded`, releases the buffered body and
+    fails the watched future right away.  Tornado runs the callbacks
+    in the caller's stack context, so they cannot abort the transfer
+    itself.  The simple client closes the connection shortly after
+    when it is created with a ``max_body_size`` (see
+    :attr:`.HTTPClient.max_body_size`) but the curl client receives
+    the rest of the body, which is discarded as it arrives.
+
+    .. attribute:: exceeded
+
+       :data:`True` if the body was larger than `max_body_size`.
+
+    """
+
+    def __init__(self, request, max_body_size=None, spill_threshold=None):
+        super(BodyCollector, self).__init__()
+        self.original_request = request
+        self.max_body_size = max_body_size
+        self.exceeded = False
+        self._header_callback = request.header_callback
+        self._streaming_callback = request.streaming_callback
+        self._body = None
+        if self._streaming_callback is None:
+            self._body = SpooledBody(spill_threshold)
+            self._streaming_callback = self._body.write
+        self._received = 0
+        self._watched = None
+
+        self.request = copy.copy(request)
+        self.request.header_callback = self.on_header_line
+        self.request.streaming_callback = self.on_chunk
+
+    def on_header_line(self, line):
+        """Reject responses that announce an oversized body."""
+        if line.startswith('HTTP/'):
+            # a new response, for example after a redirect
+            self._received = 0
+            if self._body is not None:
+                self._body.reset()
+        elif (self.max_body_size is not None and
+              self.original_request.method != 'HEAD'):
+            name, _, value = line.partition(':')
+            if name.strip().lower() == 'content-length':
+                try:
+                    length = int(value)
+                except ValueError:
+                    length = 0
+                if length > self.max_body_size:
+                    self._abort()
+                    return
+        if self._header_callback is not None:
+            self._header_callback(line)
+
+    def on_chunk(self, chunk):
+        """Count a chunk and pass it on."""
+        if self.exceeded:
+            return
+        self._received += len(chunk)
+        if (self.max_body_size is not None and
+                self._received > self.max_body_size):
+            self._abort()
+            return
+        self._streaming_callback(chunk)
+
+    def watch(self, future):
+        """
+        Follow the transfer of :attr:`.request`.
+
+        :param tornado.concurrent.Future future: the future returned
+            when :attr:`.request` was sent
+        :returns: :class:`~tornado.concurrent.Future` that resolves
+            like `future` or raises a
+            :exc:`~tornado.httpclient.HTTPError` with a ``502`` status
+            code as soon as the body exceeds `max_body_size`
+
+        """
+        self._watched = concurrent.Future()
+        if self.exceeded:
+            self._fail()
+        ioloop.IOLoop.current().add_future(future, self._on_transferred)
+        return self._watched
+
+    def _on_transferred(self, future):
+        if self._watched.done():
+            future.exception()  # abandoned transfer
+        elif future.exception() is not None:
+            self._watched.set_exc_info(future.exc_info())
+        else:
+            self._watched.set_result(future.result())
+
+    def finish(self, response):
+        """
+        Attach the collected body to the response.
+
+        :param tornado.httpclient.HTTPResponse response: the response
+            to :attr:`.request`
+        :returns: a :class:`~tornado.httpclient.HTTPResponse` for the
+            original request whose buffer is the collected body
+
+        """
+        buffer = response.buffer
+        if self._body is not None:
+            buffer = self._body
+            buffer.seek(0)
+        return httpclient.HTTPResponse(
+            self.original_request, response.code, reason=response.reason,
+            headers=response.headers, buffer=buffer,
+            effective_url=response.effective_url,
+            request_time=response.request_time,
+            time_info=response.time_info)
+
+    def _abort(self):
+        self.exceeded = True
+        if self._body is not None:
+            self._body.reset()
+        if self._watched is not None:
+            self._fail()
+
+    def _fail(self):
+        if not self._watched.done():
+            self._watched.set_exception(
+                httpclient.HTTPError(502, 'Response Too Large'))
+
+
+def body_size(response):
+    """
+    Determine the size of a response body without reading it.
+
+    :param tornado.httpclient.HTTPResponse response: the response
+    :returns: the number of bytes in the body
+
+    """
+    if isinstance(response.buffer, SpooledBody):
+        return response.buffer.size
+    return len(response.body or b'')
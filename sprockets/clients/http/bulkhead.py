@@ -0,0 +1,167 @@
+import collections
+import logging
+
+from tornado import concurrent, ioloop
+
+
+log = logging.getLogger(__name__)
+
+
+class Bulkhead(object):
+    """
+    Limits the number of concurrent requests to a single upstream.
+
+    :param int max_concurrent: number of requests that may be in
+        flight at the same time
+    :param int max_queued: number of requests that may wait for a
+        slot.  Requests beyond this are rejected immediately.
+    :param float queue_timeout: number of seconds that a request may
+        wait for a slot before it is rejected.  :data:`None` waits
+        forever.
+
+    .. attribute:: active
+
+       Number of requests that currently hold a slot.
+
+    .. attribute:: rejected
+
+       Number of requests that did not get a slot.
+
+    """
+
+    def __init__(self, max_concurrent=10, max_queued=100, queue_timeout=1.0):
+        super(Bulkhead, self).__init__()
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.rejected = 0
+        self.acquired = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+        self._waiters = collections.deque()
+
+    @property
+    def queued(self):
+        """Number of requests waiting for a slot."""
+        return len(self._waiters)
+
+    def _record_wait(self, wait_time):
+        self.acquired += 1
+        self.total_wait_time += wait_time
+        self.max_wait_time = max(self.max_wait_time, wait_time)
+
+    def acquire(self):
+        """
+        Wait for a slot.
+
+        :returns: :class:`~tornado.concurrent.Future` that resolves to
+            :data:`True` when a slot was acquired or :data:`False` if
+            the request was rejected.  A slot must be returned by
+            calling :meth:`.release`.
+
+        """
+        future = concurrent.Future()
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+            self._record_wait(0.0)
+            future.set_result(True)
+            return future
+
+        if len(self._waiters) >= self.max_queued:
+            self.rejected += 1
+            future.set_result(False)
+            return future
+
+        io_loop = ioloop.IOLoop.current()
+        waiter = [future, io_loop.time(), None]
+        if self.queue_timeout is not None:
+            waiter[2] = io_loop.call_later(self.queue_timeout,
+                                           self._expire, waiter)
+        self._waiters.append(waiter)
+        return future
+
+    def _expire(self, waiter):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            return
+        self.rejected += 1
+        waiter[0].set_result(False)
+
+    def release(self):
+        """Return a slot acquired by :meth:`.acquire`."""
+        if self._waiters:
+            future, queued_at, timeout = self._waiters.popleft()
+            io_loop = ioloop.IOLoop.current()
+            if timeout is not None:
+                io_loop.remove_timeout(timeout)
+            self._record_wait(io_loop.time() - queued_at)
+            future.set_result(True)
+        else:
+            self.active -= 1
+
+    def stats(self):
+        """
+        Retrieve the current state of the bulkhead.
+
+        :returns: :class:`dict` with ``active``, ``queued``,
+            ``rejected``, ``mean_wait_time`` and ``max_wait_time`` keys
+
+        """
+        return {
+            'active': self.active,
+            'queued': self.queued,
+            'rejected': self.rejected,
+            'mean_wait_time': (self.total_wait_time / self.acquired
+                               if self.acquired else 0.0),
+            'max_wait_time': self.max_wait_time,
+        }
+
+
+class Bulkheads(object):
+    """
+    Collection of :class:`.Bulkhead` instances keyed by upstream.
+
+    :param dict overrides: mapping of host name to a :class:`dict`
+        of :class:`.Bulkhead` keyword arguments for that host
+    :param kwargs: default :class:`.Bulkhead` keyword arguments
+
+    Assign an instance to :attr:`.HTTPClient.bulkheads` so that a slow
+    upstream can only consume its own share of the client.
+
+    """
+
+    def __init__(self, overrides=None, **kwargs):
+        super(Bulkheads, self).__init__()
+        self.overrides = overrides or {}
+        self._bulkhead_kwargs = kwargs
+        self._bulkheads = {}
+
+    def get(self, key):
+        """
+        Retrieve the bulkhead for `key`.
+
+        :param tuple key: ``(scheme, host, port)`` of the upstream
+        :rtype: Bulkhead
+
+        """
+        try:
+            return self._bulkheads[key]
+        except KeyError:
+            kwargs = dict(self._bulkhead_kwargs)
+            kwargs.update(self.overrides.get(key[1], {}))
+            bulkhead = Bulkhead(**kwargs)
+            self._bulkheads[key] = bulkhead
+            return bulkhead
+
+    def stats(self):
+        """
+        Retrieve the state of every known upstream.
+
+        :returns: :class:`dict` mapping upstream key to
+            :meth:`.Bulkhead.stats`
+
+        """
+        return dict((key, bulkhead.stats())
+                    for key, bulkhead in self._bulkheads.items())
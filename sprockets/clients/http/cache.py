@@ -0,0 +1,423 @@
+import collections
+import email.utils
+import hashlib
+import io
+import logging
+import os
+import pickle
+import time
+
+from tornado import httpclient, httputil
+
+from sprockets.clients.http import bodies
+
+
+log = logging.getLogger(__name__)
+
+CACHEABLE_METHODS = frozenset(['GET', 'HEAD'])
+"""HTTP methods whose responses are cached."""
+
+CACHEABLE_CODES = frozenset([200, 203, 300, 301, 410])
+"""Status codes whose responses are cached."""
+
+SHARED_DIRECTIVES = frozenset(['public', 's-maxage', 'must-revalidate'])
+"""Directives that allow caching responses to authorized requests."""
+
+PRIVATE_HEADERS = ('Cookie', 'Proxy-Authorization')
+"""Request headers other than ``Authorization`` that identify the caller."""
+
+PRIVATE_ATTRIBUTES = ('auth_username', 'auth_password', 'client_cert',
+                      'client_key', 'proxy_username', 'proxy_password')
+"""Request attributes that identify the caller."""
+
+
+def parse_cache_control(value):
+    """
+    Parse a ``Cache-Control`` header value.
+
+    :param str value: the header value
+    :returns: :class:`dict` mapping lower-cased directive names to
+        their value or :data:`None` for directives without a value
+
+    """
+    directives = {}
+    for directive in (value or '').split(','):
+        name, _, argument = directive.strip().partition('=')
+        if name:
+            directives[name.strip().lower()] = (argument.strip().strip('"')
+                                                or None)
+    return directives
+
+
+def has_credentials(request):
+    """
+    Does `request` identify the caller?
+
+    :param tornado.httpclient.HTTPRequest request: the request
+    :returns: :data:`True` if the request has an ``Authorization``
+        header, one of the :data:`PRIVATE_HEADERS` or one of the
+        :data:`PRIVATE_ATTRIBUTES`
+
+    """
+    return 'Authorization' in request.headers or _is_private(request)
+
+
+def _is_private(request):
+    return (any(name in request.headers for name in PRIVATE_HEADERS) or
+            any(getattr(request, name, None) for name in PRIVATE_ATTRIBUTES))
+
+
+def _parse_http_date(value):
+    parsed = email.utils.parsedate_tz(value) if value else None
+    return None if parsed is None else email.utils.mktime_tz(parsed)
+
+
+class CacheEntry(object):
+    """
+    A cached response.
+
+    :param int code: status code of the response
+    :param str reason: reason phrase of the response
+    :param list headers: response headers as ``(name, value)`` pairs
+    :param bytes body: response body
+    :param float expires: UNIX timestamp after which the entry is stale
+    :param dict vary: request header values that the entry was
+        selected by
+
+    """
+
+    def __init__(self, code, reason, headers, body, expires, vary=None):
+        super(CacheEntry, self).__init__()
+        self.code = code
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+        self.expires = expires
+        self.vary = vary or {}
+
+    @property
+    def size(self):
+        """Approximate number of bytes that the entry occupies."""
+        return len(self.body) + sum(len(n) + len(v) for n, v in self.headers)
+
+    @property
+    def etag(self):
+        return self.get_header('ETag')
+
+    @property
+    def last_modified(self):
+        return self.get_header('Last-Modified')
+
+    def get_header(self, name):
+        name = name.lower()
+        for header_name, value in self.headers:
+            if header_name.lower() == name:
+                return value
+        return None
+
+    def is_fresh(self, now):
+        return now < self.expires
+
+    def matches(self, request_headers):
+        """Was this entry selected by the same request headers?"""
+        return all(request_headers.get(name) == value
+                   for name, value in self.vary.items())
+
+    def to_response(self, request):
+        """
+        Create a response for `request` from the cached entry.
+
+        :param tornado.httpclient.HTTPRequest request: the request
+            that the response is for
+        :rtype: tornado.httpclient.HTTPResponse
+
+        """
+        headers = httputil.HTTPHeaders()
+        for name, value in self.headers:
+            headers.add(name, value)
+        return httpclient.HTTPResponse(request, self.code, headers=headers,
+                                       buffer=io.BytesIO(self.body),
+                                       reason=self.reason, request_time=0.0)
+
+
+class MemoryStore(object):
+    """
+    In-memory least-recently-used cache store.
+
+    :param int max_bytes: upper bound on the size of the stored
+        entries.  The least recently used entries are evicted to
+        stay under this limit.
+    :param int max_entry_size: entries larger than this are not
+        stored.  Defaults to a quarter of `max_bytes`.
+
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024, max_entry_size=None):
+        super(MemoryStore, self).__init__()
+        self.max_bytes = max_bytes
+        self.max_entry_size = (max_bytes // 4 if max_entry_size is None
+                               else max_entry_size)
+        self.size = 0
+        self._entries = collections.OrderedDict()
+
+    def get(self, key):
+        try:
+            entry = self._entries.pop(key)
+        except KeyError:
+            return None
+        self._entries[key] = entry
+        return entry
+
+    def set(self, key, entry):
+        self.delete(key)
+        if entry.size > self.max_entry_size:
+            return
+        self._entries[key] = entry
+        self.size += entry.size
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.size
+
+    def delete(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskStore(object):
+    """
+    Cache store that keeps each entry in a file.
+
+    :param str directory: directory to write entries to.  It is
+        created if it does not exist.
+
+    Entries are pickled into files named after a hash of the cache
+    key.  Unreadable entries are treated as misses.
+
+    """
+
+    def __init__(self, directory):
+        super(DiskStore, self).__init__()
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _path(self, key):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest)
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as entry_file:
+                return pickle.load(entry_file)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def set(self, key, entry):
+        path = self._path(key)
+        temp_path = '{}.{}.tmp'.format(path, os.getpid())
+        try:
+            with open(temp_path, 'wb') as entry_file:
+                pickle.dump(entry, entry_file, protocol=2)
+            os.rename(temp_path, path)
+        except (IOError, OSError) as error:
+            log.warning('failed to write cache entry %s: %s', path, error)
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except (IOError, OSError):
+            pass
+
+
+class ResponseCache(object):
+    """
+    Caches ``GET`` and ``HEAD`` responses according to :rfc:`7234`.
+
+    :param store: where entries are kept.  Defaults to a
+        :class:`.MemoryStore`.
+    :param clock: function that returns the current UNIX timestamp
+
+    Assign an instance to :attr:`.HTTPClient.response_cache` to enable
+    caching.  Fresh entries are returned without sending a request.
+    Stale entries that carry an ``ETag`` or ``Last-Modified`` header
+    are revalidated with a conditional request and a ``304`` response
+    is answered from the cache.
+
+    The cache is shared by every caller of the client, so responses to
+    requests with an ``Authorization`` header are only stored when
+    they are marked ``public``, ``s-maxage`` or ``must-revalidate`` as
+    :rfc:`7234#section-3.2` requires.  Responses to requests that
+    carry other credentials, such as a ``Cookie`` header or the
+    ``auth_username`` and ``client_cert`` request attributes (see
+    :data:`PRIVATE_HEADERS` and :data:`PRIVATE_ATTRIBUTES`), are only
+    stored when they are marked ``public``.
+
+    .. attribute:: hits
+
+       Number of requests answered from a fresh entry.
+
+    .. attribute:: misses
+
+       Number of requests that were not answered from the cache.
+
+    .. attribute:: revalidations
+
+       Number of stale entries that the upstream confirmed with a
+       ``304 Not Modified``.
+
+    """
+
+    def __init__(self, store=None, clock=time.time):
+        super(ResponseCache, self).__init__()
+        self.store = MemoryStore() if store is None else store
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    @staticmethod
+    def make_key(request):
+        return '{} {}'.format(request.method, request.url)
+
+    def lookup(self, request):
+        """
+        Find the cache entry for `request`.
+
+        :param tornado.httpclient.HTTPRequest request: the request
+        :returns: a ``(response, entry)`` tuple.  `response` is a
+            :class:`~tornado.httpclient.HTTPResponse` when a fresh entry
+            was found.  Otherwise `response` is :data:`None` and `entry`
+            is the stale :class:`.CacheEntry` to revalidate, if any.
+
+        """
+        request_directives = parse_cache_control(
+            request.headers.get('Cache-Control'))
+        if 'no-store' in request_directives:
+            self.misses += 1
+            return None, None
+
+        entry = self.store.get(self.make_key(request))
+        if entry is None or not entry.matches(request.headers):
+            self.misses += 1
+            return None, None
+
+        if ('no-cache' not in request_directives and
+                entry.is_fresh(self.clock())):
+            self.hits += 1
+            return entry.to_response(request), entry
+
+        self.misses += 1
+        if entry.etag is None and entry.last_modified is None:
+            return None, None
+        return None, entry
+
+    def add_validators(self, request, entry):
+        """Add conditional request headers for revalidating `entry`."""
+        request.headers = request.headers.copy()
+        if entry.etag is not None:
+            request.headers['If-None-Match'] = entry.etag
+        if entry.last_modified is not None:
+            request.headers['If-Modified-Since'] = entry.last_modified
+
+    def revalidated(self, request, entry, not_modified):
+        """
+        Refresh `entry` from a ``304`` response.
+
+        :returns: a :class:`~tornado.httpclient.HTTPResponse` built
+            from the refreshed entry
+
+        """
+        self.revalidations += 1
+        headers = dict((name.lower(), (name, value))
+                       for name, value in entry.headers)
+        for name, value in not_modified.headers.get_all():
+            headers[name.lower()] = (name, value)
+        refreshed = CacheEntry(entry.code, entry.reason,
+                               list(headers.values()), entry.body,
+                               self._compute_expiry(not_modified.headers),
+                               entry.vary)
+        self.store.set(self.make_key(request), refreshed)
+        return refreshed.to_response(request)
+
+    def _compute_expiry(self, headers):
+        now = self.clock()
+        directives = parse_cache_control(headers.get('Cache-Control'))
+        if 'no-cache' in directives:
+            return now
+        for directive in ('s-maxage', 'max-age'):
+            if directives.get(directive):
+                try:
+                    return now + max(0, int(directives[directive]) -
+                                     int(headers.get('Age', 0)))
+                except ValueError:
+                    pass
+        expires = _parse_http_date(headers.get('Expires'))
+        if expires is not None:
+            date = _parse_http_date(headers.get('Date')) or now
+            return now + max(0, expires - date)
+        return now
+
+    def store_response(self, request, response):
+        """
+        Store `response` if it is cacheable.
+
+        :param tornado.httpclient.HTTPRequest request: the request
+            that was sent
+        :param tornado.httpclient.HTTPResponse response: the response
+            that was received
+
+        """
+        if (request.method not in CACHEABLE_METHODS or
+                response.code not in CACHEABLE_CODES):
+            return
+        if (isinstance(response.buffer, bodies.SpooledBody) and
+                response.buffer.spilled):
+            return  # caching would read the whole file into memory
+
+        request_directives = parse_cache_control(
+            request.headers.get('Cache-Control'))
+        if 'no-store' in request_directives:
+            return
+
+        headers = response.headers
+        directives = parse_cache_control(headers.get('Cache-Control'))
+        if 'no-store' in directives or 'private' in directives:
+            return
+        if ('Authorization' in request.headers and
+                not SHARED_DIRECTIVES.intersection(directives)):
+            return  # the entry would be served to other callers
+        if 'public' not in directives and _is_private(request):
+            return
+
+        vary = {}
+        for name in (headers.get('Vary') or '').split(','):
+            name = name.strip()
+            if name == '*':
+                return
+            if name:
+                vary[name] = request.headers.get(name)
+
+        expires = self._compute_expiry(headers)
+        if (expires <= self.clock() and headers.get('ETag') is None and
+                headers.get('Last-Modified') is None):
+            return
+
+        entry = CacheEntry(response.code, response.reason,
+                           list(headers.get_all()), response.body or b'',
+                           expires, vary)
+        self.store.set(self.make_key(request), entry)
+
+    def stats(self):
+        """
+        Retrieve the cache counters.
+
+        :returns: :class:`dict` with ``hits``, ``misses`` and
+            ``revalidations`` keys
+
+        """
+        return {'hits': self.hits, 'misses': self.misses,
+                'revalidations': self.revalidations}
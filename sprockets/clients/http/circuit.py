@@ -0,0 +1,185 @@
+import collections
+import logging
+import time
+
+
+log = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+FAILURE_CODES = frozenset([500, 502, 503, 504, 599])
+"""Status codes that count as upstream failures."""
+
+
+class CircuitBreaker(object):
+    """
+    Tracks the health of a single upstream.
+
+    :param float failure_rate: fraction of failed requests in the
+        window that opens the circuit
+    :param int minimum_requests: number of requests that must be seen
+        in the window before the failure rate is considered
+    :param float window: length of the rolling window in seconds
+    :param int buckets: number of buckets that the window is divided
+        into.  Old buckets are discarded as time moves on.
+    :param float open_timeout: number of seconds that the circuit
+        stays open before probe requests are allowed through
+    :param int probes: number of concurrent probe requests allowed
+        while the circuit is half-open.  The circuit closes once this
+        many probes have succeeded.
+    :param clock: function that returns the current time in seconds
+
+    The circuit starts out *closed* and lets every request through.
+    When the failure rate within the window reaches `failure_rate`,
+    it *opens* and :meth:`.allow_request` returns :data:`False` until
+    `open_timeout` elapses.  Then the circuit is *half-open* and a
+    limited number of probe requests are let through.  A failed probe
+    re-opens the circuit; successful probes close it.
+
+    """
+
+    def __init__(self, failure_rate=0.5, minimum_requests=10, window=10.0,
+                 buckets=10, open_timeout=30.0, probes=1, clock=time.time):
+        super(CircuitBreaker, self).__init__()
+        self.failure_rate = failure_rate
+        self.minimum_requests = minimum_requests
+        self.bucket_width = float(window) / buckets
+        self.open_timeout = open_timeout
+        self.probes = probes
+        self.clock = clock
+        self.state = CLOSED
+        self.opened_at = None
+        self._buckets = collections.deque(maxlen=buckets)
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+
+    def _current_bucket(self, now):
+        start = now - (now % self.bucket_width)
+        if not self._buckets or self._buckets[-1][0] != start:
+            self._buckets.append([start, 0, 0])
+        return self._buckets[-1]
+
+    def _counts(self, now):
+        oldest = now - self.bucket_width * self._buckets.maxlen
+        total = failures = 0
+        for start, bucket_total, bucket_failures in self._buckets:
+            if start > oldest:
+                total += bucket_total
+                failures += bucket_failures
+        return total, failures
+
+    def _open(self, now):
+        self.state = OPEN
+        self.opened_at = now
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+
+    def allow_request(self):
+        """
+        Should a request be sent to the upstream?
+
+        :rtype: bool
+
+        A :data:`True` result must be followed by a call to either
+        :meth:`.record_success`, :meth:`.record_failure` or
+        :meth:`.cancel_request`.
+
+        """
+        if self.state == CLOSED:
+            return True
+
+        if self.state == OPEN:
+            if self.clock() < self.opened_at + self.open_timeout:
+                return False
+            self.state = HALF_OPEN
+
+        if self._probes_in_flight < self.probes:
+            self._probes_in_flight += 1
+            return True
+        return False
+
+    def cancel_request(self):
+        """Record that an allowed request was never sent."""
+        if self.state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def record_success(self):
+        """Record a request that the upstream handled."""
+        now = self.clock()
+        if self.state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            self._probe_successes += 1
+            if self._probe_successes >= self.probes:
+                self.state = CLOSED
+                self.opened_at = None
+                self._buckets.clear()
+            return
+        self._current_bucket(now)[1] += 1
+
+    def record_failure(self):
+        """Record a request that the upstream failed."""
+        now = self.clock()
+        if self.state == HALF_OPEN:
+            self._open(now)
+            return
+        bucket = self._current_bucket(now)
+        bucket[1] += 1
+        bucket[2] += 1
+        if self.state == CLOSED:
+            total, failures = self._counts(now)
+            if (total >= self.minimum_requests and
+                    failures >= total * self.failure_rate):
+                self._open(now)
+
+
+class CircuitBreakers(object):
+    """
+    Collection of :class:`.CircuitBreaker` instances keyed by upstream.
+
+    :param codes: status codes that count as failures.  Defaults to
+        :data:`.FAILURE_CODES`.
+    :param kwargs: passed to the :class:`.CircuitBreaker` initializer
+        when a new upstream is seen
+
+    Assign an instance to :attr:`.HTTPClient.circuit_breakers` to
+    enable circuit breaking for each ``(scheme, host, port)`` that the
+    client sends requests to.
+
+    """
+
+    def __init__(self, codes=None, **kwargs):
+        super(CircuitBreakers, self).__init__()
+        self.codes = frozenset(FAILURE_CODES if codes is None else codes)
+        self._breaker_kwargs = kwargs
+        self._breakers = {}
+
+    def get(self, key):
+        """
+        Retrieve the circuit breaker for `key`.
+
+        :param tuple key: ``(scheme, host, port)`` of the upstream
+        :rtype: CircuitBreaker
+
+        """
+        try:
+            return self._breakers[key]
+        except KeyError:
+            breaker = CircuitBreaker(**self._breaker_kwargs)
+            self._breakers[key] = breaker
+            return breaker
+
+    def is_failure(self, code):
+        """Does `code` count as an upstream failure?"""
+        return code in self.codes
+
+    def states(self):
+        """
+        Retrieve the state of every known upstream.
+
+        :returns: :class:`dict` mapping upstream key to state name
+
+        """
+        return dict((key, breaker.state)
+                    for key, breaker in self._breakers.items())
@@ -1,11 +1,20 @@
+import functools
 import logging
+import socket
+import ssl
 try:
     from urllib import parse
 except ImportError:
     import urllib as parse
 
 
-from tornado import concurrent, httpclient, httputil, web
+from tornado import (concurrent, gen, httpclient, httputil, iostream,
+                     simple_httpclient, web)
+
+from sprockets.clients.http import (balancer, batch, bodies, cache,
+                                    compression, content, deadline, hedge,
+                                    pagination, pools, producers, ratelimit,
+                                    retry, scheduler, streaming, templates)
 
 
 log = logging.getLogger(__name__)
@@ -39,6 +48,21 @@ class HTTPError(httpclient.HTTPError):
 
        :class:`tornado.httpclient.HTTPResponse` or :data:`None`
 
+    .. py:attribute:: attempts
+
+       :class:`list` of :class:`~sprockets.clients.http.retry.Attempt`
+       instances describing each attempt that was made before giving
+       up.  This is empty when the request was not sent.
+
+    .. py:attribute:: cause
+
+       The exception raised by the transport when the request failed
+       without a response, such as a refused connection or a failed
+       DNS lookup.  These failures are reported with a ``599`` status
+       code.  This is :data:`None` for other failures.  Only
+       :data:`TRANSPORT_ERRORS` are reported this way, other
+       exceptions are raised as they are.
+
     """
 
     def __init__(self, request, code, reason=None, response=None):
@@ -46,6 +70,8 @@ class HTTPError(httpclient.HTTPError):
         super(HTTPError, self).__init__(code, message=reason,
                                         response=response)
         self.request = request
+        self.attempts = []
+        self.cause = None
 
     @classmethod
     def from_tornado_error(cls, http_request, http_error):
@@ -58,7 +84,18 @@ class HTTPError(httpclient.HTTPError):
             the underlying Tornado failure
         :return: a compatible instance of :class:`.HTTPError`
 
+        If `http_error` is already a :class:`.HTTPError`, then a copy
+        of the same type that refers to `http_request` is returned.
+
         """
+        if isinstance(http_error, HTTPError):
+            error_class = http_error.__class__
+            error = error_class.__new__(error_class, *http_error.args)
+            error.__dict__.update(http_error.__dict__)
+            error.request = http_request
+            error.attempts = list(http_error.attempts)
+            return error
+
         response = http_error.response
         return HTTPError(http_request, http_error.code, response=response,
                          reason=None if response is None else response.reason)
@@ -78,6 +115,118 @@ class HTTPError(httpclient.HTTPError):
         return exc
 
 
+class CircuitOpenError(HTTPError):
+    """
+    Raised when a request is rejected by an open circuit breaker.
+
+    The request was never sent.  This is reported as a ``503`` with a
+    reason of ``Circuit Open`` so that :meth:`.to_server_error` maps
+    it to a ``503`` response.
+
+    """
+
+    def __init__(self, request, response=None):
+        super(CircuitOpenError, self).__init__(request, 503,
+                                               reason='Circuit Open',
+                                               response=response)
+
+
+class BulkheadFullError(HTTPError):
+    """
+    Raised when a request cannot get a slot in an upstream's bulkhead.
+
+    The request was never sent.  It uses the non-standard ``598``
+    status code so that it can be told apart from upstream failures.
+    :meth:`.to_server_error` reports it as a ``503``.
+
+    """
+
+    def __init__(self, request, response=None):
+        super(BulkheadFullError, self).__init__(request, 598,
+                                                reason='Bulkhead Full',
+                                                response=response)
+
+    def to_server_error(self):
+        return web.HTTPError(503, reason='Upstream Busy')
+
+
+class QueueTimeoutError(HTTPError):
+    """
+    Raised when a request waits too long in the client's priority queue.
+
+    The request was never sent, so it is neither retried nor held
+    against the upstream by the circuit breakers, bulkheads, load
+    balancer or metrics.  This is reported as a ``599`` with a reason
+    of ``Timeout in priority queue`` like Tornado's own queue timeout.
+
+    """
+
+    def __init__(self, request, response=None):
+        super(QueueTimeoutError, self).__init__(
+            request, 599, reason='Timeout in priority queue',
+            response=response)
+
+
+class RateLimitedError(HTTPError):
+    """
+    Raised when a request is rejected by the client-side rate limiter.
+
+    The request was never sent.  This is reported as a ``429`` with a
+    reason of ``Rate Limited``.  :meth:`.to_server_error` reports it
+    as a ``503`` since the caller is not the one exceeding the quota.
+
+    """
+
+    def __init__(self, request, response=None):
+        super(RateLimitedError, self).__init__(request, 429,
+                                               reason='Rate Limited',
+                                               response=response)
+
+    def to_server_error(self):
+        return web.HTTPError(503, reason='Upstream Rate Limited')
+
+
+class DeadlineExceededError(HTTPError):
+    """
+    Raised when the deadline of a request has passed.
+
+    The request is not sent (or retried) once its
+    :class:`~sprockets.clients.http.deadline.Deadline` has expired
+    since nobody is waiting for the response.  This is reported as a
+    ``504`` with a reason of ``Deadline Exceeded``.
+
+    """
+
+    def __init__(self, request, response=None):
+        super(DeadlineExceededError, self).__init__(
+            request, 504, reason='Deadline Exceeded', response=response)
+
+
+class ResponseTooLargeError(HTTPError):
+    """
+    Raised when a response body is larger than the ``max_body_size``.
+
+    The request fails as soon as the ``Content-Length`` header or the
+    received body exceeds the limit.  This is reported as a
+    ``502`` with a reason of ``Response Too Large`` and is not retried
+    since the upstream is likely to send the same body again.
+
+    """
+
+    def __init__(self, request, response=None):
+        super(ResponseTooLargeError, self).__init__(
+            request, 502, reason='Response Too Large', response=response)
+
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+COALESCABLE_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+
+TRANSPORT_ERRORS = (IOError, OSError, socket.error, socket.gaierror,
+                    ssl.SSLError, iostream.StreamClosedError)
+"""Exceptions that are reported as a ``599`` when sending a request."""
+
+
 class HTTPClient(object):
     """
     HTTP client connector.
@@ -92,11 +241,180 @@ class HTTPClient(object):
     underlying ``AsyncHTTPClient`` instance using the :attr:`.client`
     attribute if need be.
 
+    Unless ``force_instance=True`` is passed, the underlying client is
+    the ``AsyncHTTPClient`` that is shared by everything on the
+    :class:`~tornado.ioloop.IOLoop`.  The :attr:`.resolver`,
+    :attr:`.connection_pools` and :attr:`.max_body_size` settings of
+    the underlying client are only applied to a client of its own.
+
     .. attribute:: headers
 
        :class:`tornado.httputil.HTTPHeaders` instance that is sent with
        each HTTP Request.
 
+    .. attribute:: retry_policy
+
+       :class:`~sprockets.clients.http.retry.RetryPolicy` that is
+       applied to each request or :data:`None` to make a single
+       attempt.  This can be overridden per request by passing the
+       ``retry_policy`` keyword to :meth:`.send_request`.
+
+    .. attribute:: hedging_policy
+
+       :class:`~sprockets.clients.http.hedge.HedgingPolicy` that sends
+       a duplicate of slow idempotent requests or :data:`None` to
+       disable hedging.  This can be overridden per request by passing
+       the ``hedging_policy`` keyword to :meth:`.send_request`.
+
+    .. attribute:: circuit_breakers
+
+       :class:`~sprockets.clients.http.circuit.CircuitBreakers` that
+       tracks the health of each upstream or :data:`None` to disable
+       circuit breaking.  Requests to an upstream with an open circuit
+       fail immediately with a :class:`.CircuitOpenError`.
+
+    .. attribute:: bulkheads
+
+       :class:`~sprockets.clients.http.bulkhead.Bulkheads` that limits
+       the number of concurrent requests to each upstream or
+       :data:`None` to only use the ``max_clients`` limit of the
+       underlying client.  Requests that do not get a slot in time
+       fail with a :class:`.BulkheadFullError`.
+
+    .. attribute:: metrics
+
+       :class:`~sprockets.clients.http.metrics.MetricsRecorder` that
+       records counts, latency histograms, transfer sizes and in-flight
+       gauges for every attempt or :data:`None` to disable metrics.
+
+    .. attribute:: response_cache
+
+       :class:`~sprockets.clients.http.cache.ResponseCache` that
+       ``GET`` and ``HEAD`` responses are cached in or :data:`None`
+       to disable caching.  Pass ``use_cache=False`` to
+       :meth:`.send_request` to bypass the cache for a single request.
+
+    .. attribute:: coalesce_requests
+
+       Set this to :data:`True` to share a single upstream request
+       between concurrent ``GET``, ``HEAD`` and ``OPTIONS`` requests for
+       the same URL.  Each caller receives the response or its own
+       :class:`.HTTPError`.  This can be overridden per request by
+       passing the ``coalesce`` keyword to :meth:`.send_request`.
+       Requests that carry credentials (see
+       :func:`~sprockets.clients.http.cache.has_credentials`) are never
+       coalesced since the response may be specific to the caller.
+
+    .. attribute:: coalesce_headers
+
+       Names of the request headers that must match for requests
+       to be coalesced.
+
+    .. attribute:: upstreams
+
+       :class:`dict` that maps a name to a
+       :class:`~sprockets.clients.http.balancer.Upstream`.  Requests
+       whose ``host`` is one of these names are load balanced across
+       the upstream's endpoints.  Use :meth:`.add_upstream` to register
+       an upstream.
+
+    .. attribute:: adaptive_timeouts
+
+       :class:`~sprockets.clients.http.timeouts.AdaptiveTimeouts` that
+       sets the ``request_timeout`` of requests that do not set one
+       from the observed latency of the upstream or :data:`None` to
+       use the configured timeouts.
+
+    .. attribute:: rate_limiter
+
+       :class:`~sprockets.clients.http.ratelimit.RateLimiter` that paces
+       requests to each host or :data:`None` to send requests as soon as
+       possible.  Requests that cannot get a token in time fail with a
+       :class:`.RateLimitedError`.
+
+    .. attribute:: resolver
+
+       :class:`~sprockets.clients.http.resolver.CachingResolver` or
+       other :class:`tornado.netutil.Resolver` that is installed on the
+       underlying client when it is created with
+       ``force_instance=True`` or :data:`None` to use the default
+       resolver.
+
+    .. attribute:: transport
+
+       Object that sends requests instead of the underlying
+       :class:`~tornado.httpclient.AsyncHTTPClient` or :data:`None` to
+       use the underlying client.  Set this to a
+       :class:`~sprockets.clients.http.transports.LoopbackTransport`
+       to dispatch requests directly into a co-located application.
+
+    .. attribute:: compression
+
+       :class:`~sprockets.clients.http.compression.Compression` that
+       compresses large request bodies and decodes response bodies as
+       they arrive or :data:`None` to leave bodies alone.  Pass
+       ``compress=False`` to :meth:`.send_request` to send a single
+       request body uncompressed.
+
+    .. attribute:: content_negotiation
+
+       :class:`~sprockets.clients.http.content.ContentNegotiation` that
+       encodes :class:`dict`, :class:`list` and :class:`tuple` request
+       bodies, sets the ``Accept`` header and wraps responses in a
+       :class:`~sprockets.clients.http.content.ContentResponse` or
+       :data:`None` to send and return bodies as they are.
+
+    .. attribute:: connection_pools
+
+       :class:`~sprockets.clients.http.pools.ConnectionPools` that lists
+       the upstreams that :meth:`.warm_up` connects to, configures
+       keep-alive connections and tracks pool statistics for each
+       upstream or :data:`None` to use the client's defaults.  This
+       must be set before the underlying client is created and only
+       configures keep-alive connections of a client created with
+       ``force_instance=True``.
+
+    .. attribute:: scheduler
+
+       :class:`~sprockets.clients.http.scheduler.PriorityScheduler` that
+       dispatches requests by their ``priority`` once the client is
+       saturated or :data:`None` to send requests in the order that
+       they are made.
+
+    .. attribute:: max_body_size
+
+       Largest acceptable response body in bytes or :data:`None` for
+       no limit.  Larger responses are aborted with a
+       :class:`.ResponseTooLargeError`.  This can be overridden per
+       request by passing the ``max_body_size`` keyword to
+       :meth:`.send_request`.
+
+       When the underlying client is a
+       :class:`~tornado.simple_httpclient.SimpleAsyncHTTPClient`
+       created with ``force_instance=True``, it is created with a
+       ``max_body_size`` of twice this limit so that it closes the
+       connection of an oversized response instead of downloading the
+       rest of it.  The margin lets the client detect the oversized
+       body (and raise :class:`.ResponseTooLargeError`) before Tornado,
+       which checks the announced size of each chunk, closes the
+       connection with a ``599``.  Set this before the first request
+       since it has no effect on a client that already exists.  Tornado
+       cannot raise its limit per request, so per-request limits above
+       the limit that the client was created with (including
+       :data:`None`) raise :exc:`ValueError`.  The curl client has no
+       such limit: the rest of an oversized body is still received
+       (and discarded) before the connection is released.
+
+    .. attribute:: spill_threshold
+
+       Response bodies larger than this many bytes are buffered in a
+       temporary file instead of memory or :data:`None` to buffer
+       every body in memory.  The response's ``buffer`` is then a
+       :class:`~sprockets.clients.http.bodies.SpooledBody`.  This can
+       be overridden per request by passing the ``spill_threshold``
+       keyword to :meth:`.send_request`.  Note that Tornado's simple
+       client also limits bodies to its own ``max_body_size``.
+
     """
 
     def __init__(self, *args, **kwargs):
@@ -104,17 +422,185 @@ class HTTPClient(object):
         self._client_args = args
         self._client_kwargs = kwargs
         self._client = None
+        self._client_body_limit = None
         self.headers = httputil.HTTPHeaders()
+        self.retry_policy = None
+        self.hedging_policy = None
+        self.circuit_breakers = None
+        self.bulkheads = None
+        self.metrics = None
+        self.response_cache = None
+        self.coalesce_requests = False
+        self.coalesce_headers = ('Accept', 'Accept-Encoding',
+                                 'Accept-Language', 'Authorization')
+        self.upstreams = {}
+        self.resolver = None
+        self.adaptive_timeouts = None
+        self.rate_limiter = None
+        self.transport = None
+        self.compression = None
+        self.content_negotiation = None
+        self.connection_pools = None
+        self.scheduler = None
+        self.max_body_size = None
+        self.spill_threshold = None
+        self._in_flight = {}
         self.logger = log.getChild(self.__class__.__name__)
 
     @property
     def client(self):
         """Underlying :class:`tornado.httpclient.AsyncHTTPClient` instance"""
         if self._client is None:
-            self._client = httpclient.AsyncHTTPClient(*self._client_args,
-                                                      **self._client_kwargs)
+            kwargs = self._client_kwargs
+            settings = {}
+            if self.resolver is not None and 'resolver' not in kwargs:
+                settings['resolver'] = self.resolver
+            if (self.max_body_size is not None and
+                    'max_body_size' not in kwargs and
+                    issubclass(httpclient.AsyncHTTPClient.configured_class(),
+                               simple_httpclient.SimpleAsyncHTTPClient)):
+                settings['max_body_size'] = 2 * self.max_body_size
+            if self.connection_pools is not None:
+                defaults = dict(kwargs.get('defaults') or {})
+                defaults.setdefault('prepare_curl_callback',
+                                    self.connection_pools.prepare_curl)
+                settings['defaults'] = defaults
+            if settings and not kwargs.get('force_instance'):
+                # the shared client may already exist and is used by
+                # everybody else on the IOLoop as well
+                self.logger.warning(
+                    'not configuring %s of the shared AsyncHTTPClient, '
+                    'pass force_instance=True to create a client of its own',
+                    ', '.join(sorted(settings)))
+                settings = {}
+            self._client_body_limit = (self.max_body_size
+                                       if 'max_body_size' in settings
+                                       else None)
+            self._client = httpclient.AsyncHTTPClient(
+                *self._client_args, **dict(kwargs, **settings))
         return self._client
 
+    @property
+    def _transport(self):
+        return self.client if self.transport is None else self.transport
+
+    def _transport_body_limit(self):
+        # the largest limit that the underlying client lets through
+        if self.transport is not None or self.client is None:
+            return None
+        return self._client_body_limit
+
+    @property
+    def _streams_bodies(self):
+        # curl_httpclient silently ignores the body_producer
+        transport = self._transport
+        return (not isinstance(transport, httpclient.AsyncHTTPClient) or
+                isinstance(transport, simple_httpclient.SimpleAsyncHTTPClient))
+
+    def close(self):
+        """
+        Close the underlying :class:`~tornado.httpclient.AsyncHTTPClient`.
+
+        This releases pooled connections, flushes buffered
+        :attr:`.metrics` and closes the :attr:`.transport` if one is
+        set.  The underlying client is re-created if the instance is
+        used after it has been closed.
+
+        """
+        if self.metrics is not None:
+            self.metrics.flush()
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+        if self.transport is not None:
+            self.transport.close()
+
+    def add_upstream(self, name, endpoints, **kwargs):
+        """
+        Load balance requests for `name` across several endpoints.
+
+        :param str name: name that is passed as the ``host`` to
+            :meth:`.send_request` instead of a real host
+        :param endpoints: iterable of ``host:port`` strings or
+            ``(host, port)`` tuples
+        :param kwargs: passed to the
+            :class:`~sprockets.clients.http.balancer.Upstream`
+            initializer
+        :returns: the new :class:`~.balancer.Upstream` instance
+
+        """
+        upstream = balancer.Upstream(name, endpoints, **kwargs)
+        self.upstreams[name] = upstream
+        return upstream
+
+    @gen.coroutine
+    def warm_up(self, upstreams=None):
+        """
+        Open connections to known upstreams.
+
+        :param list upstreams: URLs or names of :attr:`.upstreams` to
+            connect to.  Defaults to the upstreams of
+            :attr:`.connection_pools`.
+        :returns: :class:`dict` that maps each ``(scheme, host, port)``
+            to the number of connections that were established
+
+        :attr:`.connection_pools` determines how many connections are
+        opened to each host and which request is used to open them.  A
+        name without a scheme is treated as a ``http`` host.  Every
+        endpoint of a named upstream is connected to.  Failures are
+        logged and do not stop the other connections.
+
+        """
+        settings = self.connection_pools or pools.ConnectionPools()
+        if upstreams is None:
+            upstreams = settings.upstreams
+
+        keys = []
+        for upstream in upstreams:
+            if '://' not in upstream:
+                upstream = 'http://' + upstream
+            scheme, _, netloc = upstream.partition('://')
+            host, port = httputil.split_host_and_port(netloc.split('/')[0])
+            balanced = self.upstreams.get(host)
+            if balanced is not None:
+                keys.extend((scheme, endpoint.host, endpoint.port)
+                            for endpoint in balanced.endpoints)
+            else:
+                keys.append((scheme, host, port or DEFAULT_PORTS.get(scheme)))
+
+        futures = []
+        for key in keys:
+            url = '{}://{}:{}{}'.format(key[0], key[1], key[2],
+                                        settings.warm_up_path)
+            for _ in range(settings.idle_connections):
+                request = httpclient.HTTPRequest(
+                    url, method=settings.warm_up_method,
+                    headers=self.headers)
+                futures.append(self._warm_up_connection(request, key))
+
+        established = yield futures
+        results = dict((key, 0) for key in keys)
+        for index, connected in enumerate(established):
+            if connected:
+                results[keys[index // settings.idle_connections]] += 1
+        raise gen.Return(results)
+
+    @gen.coroutine
+    def _warm_up_connection(self, request, upstream):
+        try:
+            yield self._scheduled(request, None, functools.partial(
+                self._fetch_now, request, upstream, None))
+        except httpclient.HTTPError as error:
+            if error.response is None:
+                self.logger.warning('failed to warm up %s: %s', request.url,
+                                    error)
+                raise gen.Return(False)
+        except Exception as error:
+            self.logger.warning('failed to warm up %s: %s', request.url,
+                                error)
+            raise gen.Return(False)
+        raise gen.Return(True)
+
     def send_request(self, method, scheme, host, *path, **kwargs):
         """
         Send a HTTP request.
@@ -122,12 +608,59 @@ class HTTPClient(object):
         :param str method: HTTP method to invoke
         :param str scheme: URL scheme for the request
         :param str host: host to send the request to.  This can be
-            a formatted IP address literal or DNS name.
+            a formatted IP address literal, DNS name or the name of one
+            of the :attr:`.upstreams`.  Each attempt to a named upstream
+            is sent to an endpoint chosen by the upstream's strategy.
         :param path: resource path to request.  Elements of the path
             are quoted as URL path segments and then joined by a ``/``
             to form the resource path.
         :keyword port: port to send the request to.  If omitted, the
             port will be chosen based on the scheme.
+        :keyword retry_policy: :class:`~.retry.RetryPolicy` to use
+            instead of :attr:`.retry_policy`.  Pass :data:`None` to
+            disable retries for this request.
+        :keyword hedging_policy: :class:`~.hedge.HedgingPolicy` to use
+            instead of :attr:`.hedging_policy`.  Pass :data:`None` to
+            disable hedging for this request.
+        :keyword bool use_cache: set this to :data:`False` to bypass
+            :attr:`.response_cache` for this request.
+        :keyword bool coalesce: share an identical in-flight request
+            instead of sending a new one.  Defaults to
+            :attr:`.coalesce_requests`.
+        :keyword deadline: :class:`~.deadline.Deadline` that the
+            response is needed by.  The connect and request timeouts of
+            each attempt are clamped to the remaining budget, the
+            remaining budget is sent in the
+            :data:`~.deadline.DEADLINE_HEADER` and the request fails
+            with a :class:`.DeadlineExceededError` once the budget is
+            spent.
+        :keyword rate_limit_key: key that :attr:`.rate_limiter` paces
+            the request under.  Defaults to `host`.
+        :keyword bool compress: set this to :data:`False` to send the
+            body uncompressed when :attr:`.compression` is set
+        :keyword str priority: priority that :attr:`.scheduler`
+            dispatches the request with.  An unknown priority raises
+            :exc:`ValueError` before anything is sent.
+        :keyword int max_body_size: largest acceptable response body.
+            Defaults to :attr:`.max_body_size`.
+        :keyword int spill_threshold: size above which the response
+            body is buffered in a temporary file.  Defaults to
+            :attr:`.spill_threshold`.
+        :keyword body: the request body.  In addition to :class:`bytes`,
+            :class:`bytearray`, :class:`memoryview` and :class:`str`,
+            this can be an object that :attr:`.content_negotiation`
+            encodes or a streaming body as determined by
+            :func:`~.producers.is_streaming_body`: a file object, an
+            iterator, an asynchronous iterator or a
+            :class:`~.producers.BodyPipe`.  These are streamed to the
+            upstream without being copied into a single buffer and are
+            never retried or hedged.  Files are read with blocking
+            calls, see :func:`~.producers.make_body_producer`.  A
+            :class:`memoryview` is sent in slices without being copied
+            (or compressed).  ``curl_httpclient`` cannot stream bodies:
+            it copies a :class:`memoryview` and raises
+            :exc:`ValueError` for streaming bodies before anything is
+            sent.
         :param kwargs: additional keyword arguments are passed to the
             :class:`tornado.httpclient.HTTPRequest` initializer.
 
@@ -136,33 +669,679 @@ class HTTPClient(object):
         :raises: :class:`.HTTPError`
 
         """
+        port, origin = self._prepare_request(scheme, host, kwargs)
+        target = origin + self._quote_path(path)
+        return self._send_request(method, scheme, host, port, target, kwargs)
+
+    def _prepare_request(self, scheme, host, kwargs):
         port = kwargs.pop('port', None)
+        if host in self.upstreams:
+            port = None
         netloc = host if port is None else '{}:{}'.format(host, port)
-        target = '{}://{}/{}'.format(scheme, netloc,
-                                     '/'.join(parse.quote(str(s), safe='')
-                                              for s in path))
         if 'headers' in kwargs:
             headers = self.headers.copy()
             headers.update(kwargs.pop('headers'))
             kwargs['headers'] = headers
         else:
             kwargs['headers'] = self.headers
+        return port, '{}://{}'.format(scheme, netloc)
+
+    @staticmethod
+    def _quote_path(path):
+        return '/' + '/'.join(parse.quote(str(s), safe='') for s in path)
+
+    def paginate(self, method, scheme, host, *path, **kwargs):
+        """
+        Iterate over the items of a paginated resource.
+
+        :param str method: HTTP method to invoke
+        :param str scheme: URL scheme for the request
+        :param str host: host to send the request to
+        :param path: resource path of the first page
+        :keyword items: function that is called with each page's
+            response and returns the items on the page.  Defaults to
+            :func:`~.pagination.json_items` which expects a JSON array.
+        :keyword next_page: function that is called with each page's
+            response and returns the URL of the next page, a
+            :class:`dict` of query parameters that replace those of
+            the current page's URL (for cursors found in the body) or
+            :data:`None` after the last page.  Defaults to
+            :func:`~.pagination.next_link` which follows the
+            ``rel="next"`` link of the ``Link`` header.
+        :keyword int read_ahead: number of pages that are requested
+            before their items are needed.  Defaults to ``1``.
+        :keyword int max_pages: stop after this many pages
+        :param kwargs: additional keyword arguments are passed to
+            :meth:`.send_request` for every page
+
+        :returns: a :class:`~.pagination.PageIterator` instance
+
+        Links to the same scheme and host are sent to the requested
+        `host` so that the pages of a named upstream are load balanced
+        and every page benefits from the retries, caching and other
+        policies of the client.  Links to another origin are followed
+        without credentials: the ``Authorization``, ``Cookie`` and
+        ``Proxy-Authorization`` headers and the ``auth_*`` and client
+        certificate keywords are only sent to the requested origin.
+
+        """
+        items = kwargs.pop('items', None) or pagination.json_items
+        next_page = kwargs.pop('next_page', None) or pagination.next_link
+        read_ahead = kwargs.pop('read_ahead', 1)
+        max_pages = kwargs.pop('max_pages', None)
+        port, origin = self._prepare_request(scheme, host, kwargs)
+        foreign_kwargs = pagination.without_credentials(kwargs)
+
+        def send(target):
+            if target.startswith('/'):
+                return self._send_request(method, scheme, host, port,
+                                          origin + target, dict(kwargs))
+            page_scheme, page_host, page_port = pagination.split_url(target)
+            return self._send_request(method, page_scheme, page_host,
+                                      page_port, target,
+                                      dict(foreign_kwargs))
+
+        return pagination.PageIterator(send, self._quote_path(path), items,
+                                       next_page, read_ahead, max_pages)
+
+    def template(self, method, scheme, host, *path_pattern, **defaults):
+        """
+        Prepare a request that is sent repeatedly.
+
+        :param str method: HTTP method to invoke
+        :param str scheme: URL scheme for the request
+        :param str host: host to send the request to
+        :param path_pattern: resource path elements.  Elements that
+            contain replacement fields such as ``'{user_id}'`` are
+            formatted and quoted when the request is sent; the others
+            are quoted once.
+        :param defaults: keyword arguments for :meth:`.send_request`
+            that are used unless they are overridden when the request
+            is sent
+        :returns: a :class:`~.templates.RequestTemplate` instance
+
+        """
+        return templates.RequestTemplate(self, method, scheme, host,
+                                         path_pattern, defaults)
+
+    def _send_request(self, method, scheme, host, port, target, kwargs,
+                      stream=None):
+        # kwargs['headers'] may be shared and must not be modified
+        retry_policy = kwargs.pop('retry_policy', self.retry_policy)
+        hedging_policy = kwargs.pop('hedging_policy', self.hedging_policy)
+        use_cache = kwargs.pop('use_cache', True)
+        coalesce = kwargs.pop('coalesce', self.coalesce_requests)
+        request_deadline = kwargs.pop('deadline', None)
+        rate_limit_key = kwargs.pop('rate_limit_key', None)
+        compress = kwargs.pop('compress', True)
+        priority = kwargs.pop('priority', None)
+        if priority is not None and self.scheduler is not None:
+            self.scheduler.check_priority(priority)
+        max_body_size = kwargs.pop('max_body_size', self.max_body_size)
+        limit = self._transport_body_limit()
+        if limit is not None and (max_body_size is None or
+                                  max_body_size > limit):
+            raise ValueError('max_body_size of {} exceeds the limit of {} '
+                             'that the client was created with'.format(
+                                 max_body_size, limit))
+        spill_threshold = kwargs.pop('spill_threshold', self.spill_threshold)
+        body_limits = None
+        if max_body_size is not None or spill_threshold is not None:
+            body_limits = (max_body_size, spill_threshold)
+        if self.rate_limiter is None:
+            rate_limit_key = None
+        elif rate_limit_key is None:
+            rate_limit_key = host
+
+        negotiation = self.content_negotiation
+        if negotiation is not None:
+            encode = negotiation.should_encode(kwargs.get('body'))
+            if encode or 'Accept' not in kwargs['headers']:
+                headers = kwargs['headers'] = kwargs['headers'].copy()
+                headers.setdefault('Accept', negotiation.accept)
+                if encode:
+                    kwargs['body'] = negotiation.encode(kwargs['body'],
+                                                        headers)
+
+        body = kwargs.get('body')
+        streams = self._streams_bodies
+        if isinstance(body, memoryview) and streams:
+            # the producer writes slices of the view and can be replayed
+            producer, length = producers.make_body_producer(
+                kwargs.pop('body'))
+            kwargs['body_producer'] = producer
+            if 'Content-Length' not in kwargs['headers']:
+                kwargs['headers'] = kwargs['headers'].copy()
+                kwargs['headers']['Content-Length'] = str(length)
+        elif isinstance(body, memoryview):
+            kwargs['body'] = body.tobytes()
+        elif isinstance(body, bytearray):
+            kwargs['body'] = bytes(body)
+        elif producers.is_streaming_body(body):
+            if not streams:
+                raise ValueError('{} cannot send streaming bodies'.format(
+                    self._transport.__class__.__name__))
+            producer, length = producers.make_body_producer(
+                kwargs.pop('body'))
+            kwargs['body_producer'] = producer
+            if (length is not None and
+                    'Content-Length' not in kwargs['headers']):
+                kwargs['headers'] = kwargs['headers'].copy()
+                kwargs['headers']['Content-Length'] = str(length)
+            # a streamed body can only be sent once
+            retry_policy = hedging_policy = None
+            coalesce = use_cache = False
 
         request = httpclient.HTTPRequest(target, method=method, **kwargs)
-        self.logger.debug('sending %s %s', request.method, request.url)
+        if stream is not None:
+            stream.make_error = functools.partial(HTTPError, request)
+        if compress and self.compression is not None:
+            self.compression.compress_request(request, host)
+        if host in self.upstreams:
+            upstream = (scheme, host, None)
+        else:
+            upstream = (scheme, host, port or DEFAULT_PORTS.get(scheme))
 
-        future = concurrent.TracebackFuture()
+        if (use_cache and self.response_cache is not None and
+                request.method in cache.CACHEABLE_METHODS):
+            response, entry = self.response_cache.lookup(request)
+            if response is not None:
+                self.logger.debug('cache hit for %s %s', request.method,
+                                  request.url)
+                if negotiation is not None:
+                    response = content.ContentResponse(response, negotiation)
+                future = concurrent.Future()
+                future.set_result(response)
+                return future
+            if entry is not None:
+                self.response_cache.add_validators(request, entry)
+            send = functools.partial(self._send_cached, request, upstream,
+                                     retry_policy, hedging_policy,
+                                     request_deadline, rate_limit_key,
+                                     priority, body_limits, entry)
+        else:
+            send = functools.partial(self._send, request, upstream,
+                                     retry_policy, hedging_policy,
+                                     request_deadline, rate_limit_key,
+                                     priority, body_limits)
+
+        if (coalesce and request.method in COALESCABLE_METHODS and
+                not cache.has_credentials(request)):
+            future = self._coalesce(request, send)
+        else:
+            future = send()
+        if negotiation is not None:
+            return self._wrap_content(future, negotiation)
+        return future
+
+    def _coalesce(self, request, send):
+        key = (request.method, request.url) + tuple(
+            request.headers.get(name) for name in self.coalesce_headers)
+        shared = self._in_flight.get(key)
+        if shared is None:
+            def forget(_):
+                del self._in_flight[key]
+
+            shared = send()
+            self._in_flight[key] = shared
+            self._transport.io_loop.add_future(shared, forget)
+        else:
+            self.logger.debug('joining in-flight %s %s', request.method,
+                              request.url)
 
-        def handle_response(f):
+        future = concurrent.Future()
+
+        def copy_result(f):
             try:
                 future.set_result(f.result())
-            except httpclient.HTTPError as error:
+            except HTTPError as error:
                 future.set_exception(HTTPError.from_tornado_error(request,
                                                                   error))
             except Exception as exception:
                 future.set_exception(exception)
 
-        coro = self.client.fetch(request)
-        self.client.io_loop.add_future(coro, handle_response)
+        self._transport.io_loop.add_future(shared, copy_result)
+        return future
+
+    def _wrap_content(self, future, negotiation):
+        wrapped = concurrent.Future()
+
+        def on_done(f):
+            try:
+                response = f.result()
+            except HTTPError as error:
+                if error.response is not None:
+                    error.response = content.ContentResponse(error.response,
+                                                             negotiation)
+                wrapped.set_exc_info(f.exc_info())
+            except Exception:
+                wrapped.set_exc_info(f.exc_info())
+            else:
+                wrapped.set_result(content.ContentResponse(response,
+                                                           negotiation))
+
+        self._transport.io_loop.add_future(future, on_done)
+        return wrapped
+
+    def stream_request(self, method, scheme, host, *path, **kwargs):
+        """
+        Send a HTTP request and stream the response body.
+
+        :param str method: HTTP method to invoke
+        :param str scheme: URL scheme for the request
+        :param str host: host to send the request to
+        :param path: resource path to request
+        :keyword chunk_callback: optional function that is called with
+            each body chunk instead of buffering chunks in the stream
+        :keyword int max_buffer_size: the stream fails with a ``599``
+            :class:`.HTTPError` when more than this many received bytes
+            have not been consumed.  Defaults to
+            :data:`~.streaming.DEFAULT_MAX_BUFFER_SIZE`.
+        :param kwargs: additional keyword arguments are passed to
+            :meth:`.send_request`
+
+        :returns: a :class:`~.streaming.ResponseStream` instance
+
+        The response body is never buffered as a whole.  Since chunks
+        cannot be replayed, the request is not retried, hedged, cached
+        or coalesced.
+
+        """
+        stream = streaming.ResponseStream(
+            kwargs.pop('chunk_callback', None),
+            kwargs.pop('max_buffer_size', streaming.DEFAULT_MAX_BUFFER_SIZE))
+        kwargs.update(header_callback=stream.on_header_line,
+                      streaming_callback=stream.on_chunk,
+                      retry_policy=None, hedging_policy=None,
+                      use_cache=False, coalesce=False)
+        port, origin = self._prepare_request(scheme, host, kwargs)
+        target = origin + self._quote_path(path)
+        stream.attach(self._send_request(method, scheme, host, port, target,
+                                         kwargs, stream))
+        return stream
+
+    def send_requests(self, specs, parallelism=10, fail_fast=False):
+        """
+        Send a group of requests with bounded parallelism.
+
+        :param specs: iterable of request specifications.  Each is a
+            sequence of :meth:`.send_request` positional arguments
+            optionally followed by a :class:`dict` of keyword arguments.
+        :param int parallelism: maximum number of requests in flight
+        :param bool fail_fast: stop sending requests and fail as soon
+            as one request fails
+
+        :returns: :class:`tornado.concurrent.Future` that resolves to a
+            :class:`list` of :class:`~.batch.BatchResult` instances in
+            the same order as `specs`.  Failures are captured in
+            :attr:`~.batch.BatchResult.error` unless `fail_fast` is set,
+            in which case the future raises the first failure.
+
+        """
+        return batch.RequestBatch(self, specs, parallelism,
+                                  fail_fast).results()
+
+    def iter_requests(self, specs, parallelism=10, fail_fast=False):
+        """
+        Send a group of requests and consume results as they complete.
+
+        The parameters are the same as :meth:`.send_requests`.
+
+        :returns: a :class:`~.batch.RequestBatch` instance
+
+        """
+        return batch.RequestBatch(self, specs, parallelism, fail_fast)
+
+    @gen.coroutine
+    def _send_cached(self, request, upstream, retry_policy, hedging_policy,
+                     request_deadline, rate_limit_key, priority, body_limits,
+                     entry):
+        try:
+            response = yield self._send(request, upstream, retry_policy,
+                                        hedging_policy, request_deadline,
+                                        rate_limit_key, priority,
+                                        body_limits)
+        except HTTPError as error:
+            if entry is None or error.code != 304:
+                raise
+            self.logger.debug('revalidated %s %s', request.method,
+                              request.url)
+            raise gen.Return(self.response_cache.revalidated(
+                request, entry, error.response))
+
+        self.response_cache.store_response(request, response)
+        raise gen.Return(response)
+
+    @gen.coroutine
+    def _send(self, request, upstream, retry_policy, hedging_policy,
+              request_deadline, rate_limit_key, priority, body_limits):
+        io_loop = self._transport.io_loop
+        attempts = []
+        start = io_loop.time()
+        if request_deadline is not None:
+            request.headers = request.headers.copy()
+        adaptive_timeouts = self.adaptive_timeouts
+        if adaptive_timeouts is not None and request.request_timeout is None:
+            request.request_timeout = adaptive_timeouts.get_timeout(
+                request.method, upstream)
+        if request_deadline is not None:
+            timeouts = self._get_timeouts(request)
+        if retry_policy is not None:
+            retry_policy.request_started()
+        if hedging_policy is not None and not hedging_policy.applies_to(
+                request):
+            hedging_policy = None
+
+        while True:
+            if rate_limit_key is not None:
+                allowed = yield self.rate_limiter.acquire(
+                    rate_limit_key, None if request_deadline is None
+                    else request_deadline.remaining())
+                if not allowed:
+                    self.logger.debug('rate limited, rejecting %s %s',
+                                      request.method, request.url)
+                    error = RateLimitedError(request)
+                    error.attempts = attempts
+                    raise error
+
+            if request_deadline is not None:
+                if request_deadline.expired():
+                    self.logger.debug('deadline exceeded for %s %s',
+                                      request.method, request.url)
+                    error = DeadlineExceededError(request)
+                    error.attempts = attempts
+                    raise error
+                self._apply_deadline(request, request_deadline, timeouts)
 
+            attempt_start = io_loop.time()
+            try:
+                if hedging_policy is None:
+                    response = yield self._attempt(request, upstream,
+                                                   priority, body_limits)
+                else:
+                    response = yield self._hedged_attempt(
+                        request, upstream, priority, body_limits,
+                        hedging_policy)
+            except HTTPError as failure:
+                error = failure
+            else:
+                if rate_limit_key is not None:
+                    self.rate_limiter.observe(rate_limit_key, response)
+                if adaptive_timeouts is not None:
+                    adaptive_timeouts.record(request.method, upstream,
+                                             io_loop.time() - attempt_start)
+                raise gen.Return(response)
+
+            if isinstance(error, (BulkheadFullError, CircuitOpenError,
+                                  QueueTimeoutError)):
+                error.attempts = attempts
+                raise error
+
+            if rate_limit_key is not None and error.response is not None:
+                self.rate_limiter.observe(rate_limit_key, error.response)
+            now = io_loop.time()
+            if adaptive_timeouts is not None:
+                elapsed = now - attempt_start
+                request_timeout = self._get_timeouts(request)[1]
+                if error.code != 599:
+                    adaptive_timeouts.record(request.method, upstream,
+                                             elapsed)
+                elif request_timeout and elapsed >= request_timeout:
+                    adaptive_timeouts.record_timeout(request.method,
+                                                     upstream, elapsed)
+            delay = None
+            if (retry_policy is not None and
+                    not isinstance(error, ResponseTooLargeError)):
+                delay = retry_policy.get_retry_delay(
+                    request, error, len(attempts) + 1, now - start)
+                if (delay is not None and request_deadline is not None and
+                        delay >= request_deadline.remaining()):
+                    delay = None
+            attempts.append(retry.Attempt(error.code, error.reason,
+                                          now - attempt_start, delay))
+            if delay is None:
+                error.attempts = attempts
+                raise error
+
+            self.logger.info('%s %s failed with %s, retrying in %.3fs',
+                             request.method, request.url, error.code, delay)
+            yield gen.sleep(delay)
+
+    def _get_timeouts(self, request):
+        defaults = self._transport.defaults
+        return (request.connect_timeout or defaults.get('connect_timeout'),
+                request.request_timeout or defaults.get('request_timeout'))
+
+    @staticmethod
+    def _apply_deadline(request, request_deadline, timeouts):
+        remaining = request_deadline.remaining()
+        header = request_deadline.to_header()
+        connect_timeout, request_timeout = timeouts
+        request.connect_timeout = min(connect_timeout or remaining,
+                                      remaining)
+        request.request_timeout = min(request_timeout or remaining,
+                                      remaining)
+        request.headers[deadline.DEADLINE_HEADER] = header
+
+    def _hedged_attempt(self, request, upstream, priority, body_limits,
+                        hedging_policy):
+        io_loop = self._transport.io_loop
+        future = concurrent.Future()
+        failures = []
+        state = {'outstanding': 0, 'timeout': None}
+
+        def on_done(hedged, started, attempt):
+            state['outstanding'] -= 1
+            if future.done():
+                attempt.exception()  # abandoned request
+                return
+            if attempt.exception() is None:
+                if state['timeout'] is not None:
+                    io_loop.remove_timeout(state['timeout'])
+                hedging_policy.record_success(
+                    upstream, io_loop.time() - started, hedged)
+                future.set_result(attempt.result())
+                return
+            failures.append(attempt.exc_info())
+            if state['outstanding'] == 0:
+                if state['timeout'] is not None:
+                    io_loop.remove_timeout(state['timeout'])
+                future.set_exc_info(failures[0])
+
+        def launch(hedged):
+            state['outstanding'] += 1
+            io_loop.add_future(
+                self._attempt(request, upstream, priority, body_limits),
+                functools.partial(on_done, hedged, io_loop.time()))
+
+        def send_hedge():
+            state['timeout'] = None
+            if not future.done() and hedging_policy.allow_hedge():
+                self.logger.debug('hedging %s %s', request.method,
+                                  request.url)
+                launch(True)
+
+        state['timeout'] = io_loop.call_later(
+            hedging_policy.get_delay(upstream), send_hedge)
+        launch(False)
         return future
+
+    def _attempt(self, request, upstream, priority, body_limits):
+        # wait in the priority queue before anything else so that the
+        # time spent there is not held against the upstream
+        return self._scheduled(request, priority, functools.partial(
+            self._attempt_upstream, request, upstream, body_limits))
+
+    @gen.coroutine
+    def _scheduled(self, request, priority, send):
+        scheduler = self.scheduler
+        if scheduler is None:
+            response = yield send()
+            raise gen.Return(response)
+
+        timeouts = [timeout for timeout in self._get_timeouts(request)
+                    if timeout]
+        acquired = yield scheduler.acquire(
+            priority, min(timeouts) if timeouts else None)
+        if not acquired:
+            self.logger.debug('timed out in priority queue, rejecting %s %s',
+                              request.method, request.url)
+            raise QueueTimeoutError(request)
+        try:
+            response = yield send()
+        finally:
+            scheduler.release()
+        raise gen.Return(response)
+
+    @gen.coroutine
+    def _attempt_upstream(self, request, upstream, body_limits):
+        balanced = None
+        if upstream[2] is None:
+            balanced = self.upstreams.get(upstream[1])
+        if balanced is None:
+            response = yield self._attempt_endpoint(request, upstream,
+                                                    body_limits)
+            raise gen.Return(response)
+
+        endpoint = balanced.select()
+        request = balanced.rewrite_request(request, upstream[0], endpoint)
+        balanced.request_started(endpoint)
+        started = self._transport.io_loop.time()
+        code = None
+        try:
+            response = yield self._attempt_endpoint(
+                request, (upstream[0], endpoint.host, endpoint.port),
+                body_limits)
+            code = response.code
+        except (BulkheadFullError, CircuitOpenError):
+            raise  # the request was never sent
+        except HTTPError as error:
+            code = error.code
+            raise
+        finally:
+            balanced.request_finished(endpoint, code,
+                                      self._transport.io_loop.time() - started)
+        raise gen.Return(response)
+
+    @gen.coroutine
+    def _attempt_endpoint(self, request, upstream, body_limits):
+        # check the circuit first so that requests to an open circuit
+        # fail fast instead of waiting for (and holding) a bulkhead slot
+        breaker = None
+        if self.circuit_breakers is not None:
+            breaker = self.circuit_breakers.get(upstream)
+            if not breaker.allow_request():
+                self.logger.debug('circuit open, rejecting %s %s',
+                                  request.method, request.url)
+                raise CircuitOpenError(request)
+
+        bulkhead = None
+        if self.bulkheads is not None:
+            bulkhead = self.bulkheads.get(upstream)
+            acquired = yield bulkhead.acquire()
+            if not acquired:
+                if breaker is not None:
+                    breaker.cancel_request()
+                self.logger.debug('bulkhead full, rejecting %s %s',
+                                  request.method, request.url)
+                raise BulkheadFullError(request)
+
+        try:
+            self.logger.debug('sending %s %s', request.method, request.url)
+            metrics = self.metrics
+            if metrics is not None:
+                metrics.request_started(request, upstream)
+                started = self._transport.io_loop.time()
+            try:
+                response = yield self._fetch_now(request, upstream,
+                                                 body_limits)
+            except httpclient.HTTPError as error:
+                if metrics is not None:
+                    metrics.request_finished(
+                        request, upstream, error.code,
+                        self._transport.io_loop.time() - started,
+                        error.response)
+                if breaker is not None:
+                    if self.circuit_breakers.is_failure(error.code):
+                        breaker.record_failure()
+                    else:
+                        breaker.record_success()
+                raise HTTPError.from_tornado_error(request, error)
+            except TRANSPORT_ERRORS as exception:
+                if metrics is not None:
+                    metrics.request_finished(
+                        request, upstream, 599,
+                        self._transport.io_loop.time() - started)
+                if breaker is not None:
+                    breaker.record_failure()
+                self.logger.debug('%s %s failed: %r', request.method,
+                                  request.url, exception)
+                error = HTTPError(request, 599,
+                                  reason=str(exception) or
+                                  exception.__class__.__name__)
+                error.cause = exception
+                raise error
+            except Exception:
+                # a bug rather than an upstream failure, so it is
+                # raised as is and not held against the upstream
+                if metrics is not None:
+                    metrics.request_finished(
+                        request, upstream, 599,
+                        self._transport.io_loop.time() - started)
+                if breaker is not None:
+                    breaker.cancel_request()
+                raise
+
+            if metrics is not None:
+                metrics.request_finished(
+                    request, upstream, response.code,
+                    self._transport.io_loop.time() - started, response)
+            if breaker is not None:
+                breaker.record_success()
+            raise gen.Return(response)
+
+        finally:
+            if bulkhead is not None:
+                bulkhead.release()
+
+    @gen.coroutine
+    def _fetch_now(self, request, upstream, body_limits):
+        pool = None
+        if self.connection_pools is not None and self.transport is None:
+            pool = self.connection_pools.get(upstream)
+            pool.request_started()
+        collector = None
+        if body_limits is not None:
+            collector = bodies.BodyCollector(request, *body_limits)
+            request = collector.request
+        decoder = None
+        if self.compression is not None:
+            decoder = self.compression.decoder(
+                request, upstream[1],
+                None if body_limits is None else body_limits[0])
+        if decoder is not None:
+            request = decoder.request
+
+        response = None
+        try:
+            transfer = self._transport.fetch(request)
+            if collector is not None:
+                transfer = collector.watch(transfer)
+            response = yield transfer
+        except httpclient.HTTPError as error:
+            response = error.response
+            if collector is not None and collector.exceeded:
+                raise ResponseTooLargeError(collector.original_request)
+            if response is None or (decoder is None and collector is None):
+                raise
+        finally:
+            if pool is not None:
+                pool.request_finished(response)
+
+        if decoder is not None:
+            response = decoder.finish(response)
+        if collector is not None:
+            response = collector.finish(response)
+        if response.error is not None:
+            raise response.error
+        raise gen.Return(response)
@@ -0,0 +1,464 @@
+import copy
+import io
+import logging
+import time
+import zlib
+
+from tornado import httpclient
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+
+log = logging.getLogger(__name__)
+
+try:
+    _cpu_time = time.process_time
+except AttributeError:  # pragma: no cover -- Python 2
+    _cpu_time = time.clock
+
+
+def _gzip_compress(data, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _brotli_compress(data, level):
+    return brotli.compress(data, quality=level)
+
+
+def _zstd_compress(data, level):
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+class _ZlibDecoder(object):
+
+    def __init__(self, wbits):
+        self._decompressor = zlib.decompressobj(wbits)
+
+    def decompress(self, chunk, max_length):
+        return self._decompressor.decompress(chunk, max_length)
+
+    @property
+    def unconsumed_tail(self):
+        return self._decompressor.unconsumed_tail
+
+    def flush(self):
+        return self._decompressor.flush()
+
+
+class _BrotliDecoder(object):
+
+    unconsumed_tail = b''
+
+    def __init__(self):
+        decompressor = brotli.Decompressor()
+        self._process = getattr(decompressor, 'process',
+                                getattr(decompressor, 'decompress', None))
+
+    def decompress(self, chunk, max_length):
+        return self._process(chunk)
+
+    def flush(self):
+        return b''
+
+
+class _ZstdDecoder(object):
+
+    unconsumed_tail = b''
+
+    def __init__(self):
+        self._decompressor = zstandard.ZstdDecompressor().decompressobj()
+
+    def decompress(self, chunk, max_length):
+        return self._decompressor.decompress(chunk)
+
+    def flush(self):
+        return b''
+
+
+COMPRESSORS = {'gzip': (_gzip_compress, 6)}
+"""Request body encodings mapped to a compress function and level."""
+
+DECODERS = {
+    'gzip': lambda: _ZlibDecoder(16 + zlib.MAX_WBITS),
+    'deflate': lambda: _ZlibDecoder(zlib.MAX_WBITS),
+}
+"""Response content encodings mapped to a decoder factory."""
+
+DECODE_CHUNK_SIZE = 64 * 1024
+"""Largest number of bytes that a single decompression step produces."""
+
+if brotli is not None:  # pragma: no branch
+    COMPRESSORS['br'] = (_brotli_compress, 4)
+    DECODERS['br'] = _BrotliDecoder
+if zstandard is not None:  # pragma: no branch
+    COMPRESSORS['zstd'] = (_zstd_compress, 3)
+    DECODERS['zstd'] = _ZstdDecoder
+
+
+class CompressionStats(object):
+    """
+    Compression totals for a single host.
+
+    .. attribute:: requests
+
+       Number of request bodies that were compressed.
+
+    .. attribute:: request_bytes
+
+       Size of the request bodies before compression.
+
+    .. attribute:: request_compressed_bytes
+
+       Size of the request bodies that were sent.
+
+    .. attribute:: compress_time
+
+       CPU seconds spent compressing request bodies.
+
+    .. attribute:: responses
+
+       Number of encoded response bodies that were decoded.
+
+    .. attribute:: response_bytes
+
+       Size of the decoded response bodies.
+
+    .. attribute:: response_compressed_bytes
+
+       Size of the response bodies that were received.
+
+    .. attribute:: decompress_time
+
+       CPU seconds spent decoding response bodies.
+
+    """
+
+    __slots__ = ('requests', 'request_bytes', 'request_compressed_bytes',
+                 'compress_time', 'responses', 'response_bytes',
+                 'response_compressed_bytes', 'decompress_time')
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+    def as_dict(self):
+        """
+        Summarize the totals.
+
+        :returns: :class:`dict` with an item for each attribute plus
+            ``request_ratio`` and ``response_ratio``, the uncompressed
+            size divided by the compressed size or :data:`None` if
+            nothing was compressed
+
+        """
+        summary = dict((name, getattr(self, name)) for name in self.__slots__)
+        summary['request_ratio'] = _ratio(self.request_bytes,
+                                          self.request_compressed_bytes)
+        summary['response_ratio'] = _ratio(self.response_bytes,
+                                           self.response_compressed_bytes)
+        return summary
+
+
+def _ratio(size, compressed_size):
+    if not compressed_size:
+        return None
+    return float(size) / compressed_size
+
+
+class Compression(object):
+    """
+    Compresses request bodies and decodes response bodies.
+
+    :param str encoding: content coding used for request bodies.
+        ``gzip`` is always available, ``br`` requires the `brotli`_
+        package and ``zstd`` requires the `zstandard`_ package.
+    :param int threshold: request bodies smaller than this many bytes
+        are sent uncompressed
+    :param int level: compression level.  The default depends on
+        the encoding and favours speed.
+    :param bool decompress: decode response bodies as they arrive.
+        The ``Accept-Encoding`` header advertises every encoding that
+        can be decoded unless the request sets it explicitly.
+    :raises: :exc:`ValueError` if `encoding` is not available
+
+    Assign an instance to :attr:`.HTTPClient.compression` to compress
+    request bodies that are at least `threshold` bytes long and do not
+    already have a ``Content-Encoding`` header.  Streamed request
+    bodies are never compressed.  Pass ``compress=False`` to
+    :meth:`.HTTPClient.send_request` to send a single body as-is.
+
+    Response bodies are decoded chunk by chunk, so the encoded body is
+    never buffered.  The ``Content-Encoding`` header of a decoded
+    response is renamed to ``X-Consumed-Content-Encoding`` as Tornado
+    does.  Requests that set ``decompress_response=False`` receive the
+    encoded body.
+
+    The sizes and CPU time of both directions are recorded for each
+    host so that the benefit can be judged, see :meth:`.stats`.
+
+    .. _brotli: https://pypi.python.org/pypi/Brotli
+    .. _zstandard: https://pypi.python.org/pypi/zstandard
+
+    """
+
+    def __init__(self, encoding='gzip', threshold=1024, level=None,
+                 decompress=True):
+        super(Compression, self).__init__()
+        try:
+            self._compress, default_level = COMPRESSORS[encoding]
+        except KeyError:
+            raise ValueError('compression encoding {!r} is not '
+                             'available'.format(encoding))
+        self.encoding = encoding
+        self.threshold = threshold
+        self.level = default_level if level is None else level
+        self.decompress = decompress
+        self.accept_encoding = ', '.join(sorted(DECODERS))
+        self._stats = {}
+        self.logger = log.getChild(self.__class__.__name__)
+
+    def get_stats(self, host):
+        """Retrieve the :class:`.CompressionStats` for `host`."""
+        try:
+            return self._stats[host]
+        except KeyError:
+            stats = self._stats[host] = CompressionStats()
+            return stats
+
+    def compress_request(self, request, host):
+        """
+        Compress the body of `request` if it is large enough.
+
+        :param tornado.httpclient.HTTPRequest request: the request to
+            compress.  Its body and headers are replaced.
+        :param str host: host that the request is sent to
+        :returns: :data:`True` if the body was compressed
+
+        """
+        body = request.body
+        if (not body or len(body) < self.threshold or
+                'Content-Encoding' in request.headers):
+            return False
+
+        started = _cpu_time()
+        compressed = self._compress(body, self.level)
+        elapsed = _cpu_time() - started
+
+        stats = self.get_stats(host)
+        stats.requests += 1
+        stats.request_bytes += len(body)
+        stats.request_compressed_bytes += len(compressed)
+        stats.compress_time += elapsed
+
+        request.headers = request.headers.copy()
+        request.headers['Content-Encoding'] = self.encoding
+        request.headers.pop('Content-Length', None)
+        request.body = compressed
+        return True
+
+    def decoder(self, request, host, max_body_size=None):
+        """
+        Create a :class:`.ResponseDecoder` for a single attempt.
+
+        :param tornado.httpclient.HTTPRequest request: the request
+            that is about to be sent
+        :param str host: host that the request is sent to
+        :param int max_body_size: stop decoding once the decoded body
+            is larger than this many bytes
+        :returns: a :class:`.ResponseDecoder` or :data:`None` if the
+            response should not be decoded
+
+        """
+        if not self.decompress or request.decompress_response is False:
+            return None
+        return ResponseDecoder(request, self.get_stats(host),
+                               self.accept_encoding, max_body_size)
+
+    def stats(self):
+        """
+        Retrieve compression statistics.
+
+        :returns: :class:`dict` mapping each host to the
+            :meth:`.CompressionStats.as_dict` summary
+
+        """
+        return dict((host, stats.as_dict())
+                    for host, stats in self._stats.items())
+
+
+class ResponseDecoder(object):
+    """
+    Decodes a response body as it is received.
+
+    :param tornado.httpclient.HTTPRequest request: the request that
+        the response belongs to
+    :param CompressionStats stats: where decoding totals are recorded
+    :param str accept_encoding: ``Accept-Encoding`` value to send if
+        the request does not set one
+    :param int max_body_size: largest decoded body in bytes or
+        :data:`None` for no limit
+
+    Send :attr:`.request` instead of the original request.  It is a
+    copy that disables Tornado's own decompression and routes the
+    header lines and body chunks through this decoder.  The decoded
+    chunks are passed to the original ``streaming_callback`` or
+    buffered.  Call :meth:`.finish` with the response to get a response
+    with the decoded body.
+
+    ``gzip`` and ``deflate`` bodies are decoded in steps of at most
+    :data:`DECODE_CHUNK_SIZE` bytes, and decoding stops as soon as
+    more than `max_body_size` bytes have been passed on, so a small,
+    highly compressed chunk cannot expand into a huge buffer.  The
+    ``br`` and ``zstd`` decoders cannot limit their output and decode
+    each chunk as a whole.
+
+    .. attribute:: exceeded
+
+       :data:`True` if the decoded body was larger than
+       `max_body_size`.
+
+    """
+
+    def __init__(self, request, stats, accept_encoding, max_body_size=None):
+        super(ResponseDecoder, self).__init__()
+        self.original_request = request
+        self.stats = stats
+        self.max_body_size = max_body_size
+        self.exceeded = False
+        self._header_callback = request.header_callback
+        self._streaming_callback = request.streaming_callback
+        self._buffer = None
+        if self._streaming_callback is None:
+            self._buffer = io.BytesIO()
+            self._streaming_callback = self._buffer.write
+        self._encoding = None
+        self._decoder = None
+        self._received = 0
+        self._decoded = 0
+        self._cpu = 0.0
+        self.error = None
+
+        self.request = copy.copy(request)
+        self.request.decompress_response = False
+        self.request.header_callback = self.on_header_line
+        self.request.streaming_callback = self.on_chunk
+        if 'Accept-Encoding' not in request.headers:
+            self.request.headers = request.headers.copy()
+            self.request.headers['Accept-Encoding'] = accept_encoding
+
+    def on_header_line(self, line):
+        """Track the ``Content-Encoding`` of the response."""
+        if line.startswith('HTTP/'):
+            # a new response, for example after a redirect
+            self._reset()
+        else:
+            name, _, value = line.partition(':')
+            if name.strip().lower() == 'content-encoding':
+                value = value.strip().lower()
+                if value in DECODERS:
+                    self._encoding = value
+                    line = 'X-Consumed-Content-Encoding: {}\r\n'.format(
+                        value)
+        if self._header_callback is not None:
+            self._header_callback(line)
+
+    def on_chunk(self, chunk):
+        """Decode a chunk and pass it on."""
+        if self._encoding is None:
+            self._streaming_callback(chunk)
+            return
+        if self.error is not None or self.exceeded:
+            return
+        self._received += len(chunk)
+        while chunk:
+            max_length = DECODE_CHUNK_SIZE
+            if self.max_body_size is not None:
+                # one byte more than the budget reveals an oversized body
+                max_length = min(max_length,
+                                 self.max_body_size - self._decoded + 1)
+            started = _cpu_time()
+            try:
+                if self._decoder is None:
+                    self._decoder = DECODERS[self._encoding]()
+                decoded = self._decoder.decompress(chunk, max_length)
+                chunk = self._decoder.unconsumed_tail
+            except Exception as error:
+                self.error = error
+                return
+            finally:
+                self._cpu += _cpu_time() - started
+            self._decoded += len(decoded)
+            if decoded:
+                self._streaming_callback(decoded)
+            if (self.max_body_size is not None and
+                    self._decoded > self.max_body_size):
+                self.exceeded = True
+                return
+
+    def finish(self, response):
+        """
+        Complete decoding and record the totals.
+
+        :param tornado.httpclient.HTTPResponse response: the response
+            to :attr:`.request`
+        :returns: a :class:`~tornado.httpclient.HTTPResponse` for the
+            original request with the decoded body
+        :raises: :exc:`tornado.httpclient.HTTPError` with a ``502``
+            status code if the body could not be decoded
+
+        """
+        if (self._encoding is not None and self.error is None and
+                not self.exceeded):
+            started = _cpu_time()
+            try:
+                tail = self._decoder.flush() if self._decoder else b''
+            except Exception as error:
+                self.error = error
+            else:
+                self._decoded += len(tail)
+                if tail:
+                    self._streaming_callback(tail)
+            self._cpu += _cpu_time() - started
+
+        headers = response.headers
+        if self._encoding is not None:
+            headers = copy.copy(headers)
+            headers['X-Consumed-Content-Encoding'] = headers.pop(
+                'Content-Encoding', self._encoding)
+            self.stats.responses += 1
+            self.stats.response_bytes += self._decoded
+            self.stats.response_compressed_bytes += self._received
+            self.stats.decompress_time += self._cpu
+
+        buffer = response.buffer
+        if self._buffer is not None:
+            buffer = self._buffer
+            buffer.seek(0)
+        decoded = httpclient.HTTPResponse(
+            self.original_request, response.code, reason=response.reason,
+            headers=headers, buffer=buffer,
+            effective_url=response.effective_url,
+            request_time=response.request_time,
+            time_info=response.time_info)
+
+        if self.error is not None:
+            raise httpclient.HTTPError(502, 'Undecodable Response', decoded)
+        return decoded
+
+    def _reset(self):
+        self._encoding = None
+        self._decoder = None
+        self.exceeded = False
+        self._received = self._decoded = 0
+        if self._buffer is not None:
+            self._buffer.seek(0)
+            self._buffer.truncate()
@@ -0,0 +1,293 @@
+import json
+try:
+    from urllib.parse import parse_qs, urlencode
+except ImportError:
+    from urllib import urlencode
+    from urlparse import parse_qs
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover
+    ujson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+
+def _stdlib_dumps(obj):
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+def _stdlib_loads(data):
+    return json.loads(data.decode('utf-8'))
+
+
+def _ujson_dumps(obj):
+    return ujson.dumps(obj).encode('utf-8')
+
+
+if orjson is not None:  # pragma: no cover
+    JSON_BACKEND = 'orjson'
+    _json_dumps, _json_loads = orjson.dumps, orjson.loads
+elif ujson is not None:  # pragma: no cover
+    JSON_BACKEND = 'ujson'
+    _json_dumps, _json_loads = _ujson_dumps, ujson.loads
+else:
+    JSON_BACKEND = 'json'
+    _json_dumps, _json_loads = _stdlib_dumps, _stdlib_loads
+
+
+class JSONCodec(object):
+    """
+    Encodes bodies as JSON.
+
+    The fastest available implementation is used: `orjson`_, then
+    `ujson`_ and finally the standard library :mod:`json` module.
+    :data:`JSON_BACKEND` names the one in use.  The standard library
+    is always used for bodies that are not UTF-8 encoded.
+
+    .. _orjson: https://pypi.python.org/pypi/orjson
+    .. _ujson: https://pypi.python.org/pypi/ujson
+
+    """
+
+    content_type = 'application/json'
+    suffix = '+json'
+
+    @staticmethod
+    def encode(obj):
+        return _json_dumps(obj)
+
+    @staticmethod
+    def decode(data, charset='utf-8'):
+        if charset.lower().replace('-', '') != 'utf8':
+            return json.loads(data.decode(charset))
+        return _json_loads(data)
+
+
+class MsgPackCodec(object):
+    """
+    Encodes bodies as MessagePack.
+
+    This requires the `msgpack`_ package.
+
+    .. _msgpack: https://pypi.python.org/pypi/msgpack
+
+    """
+
+    content_type = 'application/msgpack'
+    suffix = '+msgpack'
+
+    @staticmethod
+    def encode(obj):
+        return msgpack.packb(obj, use_bin_type=True)
+
+    @staticmethod
+    def decode(data, charset=None):
+        return msgpack.unpackb(data, raw=False)
+
+
+class FormCodec(object):
+    """
+    Encodes bodies as HTML form data.
+
+    Sequence values are encoded as repeated fields.  Decoded bodies
+    are a :class:`dict` that maps each field name to a :class:`list`
+    of values, as :func:`urllib.parse.parse_qs` returns.
+
+    """
+
+    content_type = 'application/x-www-form-urlencoded'
+    suffix = None
+
+    @staticmethod
+    def encode(obj):
+        return urlencode(obj, doseq=True).encode('ascii')
+
+    @staticmethod
+    def decode(data, charset='utf-8'):
+        return parse_qs(data.decode(charset), keep_blank_values=True)
+
+
+def default_codecs():
+    """Codecs that are available in this environment, in preference order."""
+    codecs = [JSONCodec()]
+    if msgpack is not None:  # pragma: no branch
+        codecs.append(MsgPackCodec())
+    codecs.append(FormCodec())
+    return codecs
+
+
+def _split_content_type(value):
+    content_type, _, params = value.partition(';')
+    charset = None
+    for param in params.split(';'):
+        name, _, param_value = param.partition('=')
+        if name.strip().lower() == 'charset':
+            charset = param_value.strip().strip('"')
+    return content_type.strip().lower(), charset
+
+
+class ContentNegotiation(object):
+    """
+    Encodes request bodies and decodes response bodies by content type.
+
+    :param list codecs: codecs to use in order of preference.  Defaults
+        to :func:`.default_codecs`.
+    :param str default_content_type: content type that bodies are
+        encoded as when the request does not set a ``Content-Type``
+
+    Assign an instance to :attr:`.HTTPClient.content_negotiation` to
+    pass :class:`dict`, :class:`list` and :class:`tuple` bodies to
+    :meth:`.HTTPClient.send_request`.  They are encoded with the codec
+    for the ``Content-Type`` header of the request, which is set to
+    `default_content_type` if it is missing.  Use a generator or
+    iterator to stream a body in chunks.  The ``Accept`` header lists
+    every codec in preference order unless the request sets it.
+
+    Responses are wrapped in a :class:`.ContentResponse` whose
+    :attr:`~.ContentResponse.data` attribute is the decoded body.
+
+    A codec is any object with ``content_type`` and ``suffix``
+    attributes plus ``encode(obj)`` and ``decode(data, charset)``
+    methods.  The ``suffix`` is used to match structured syntax
+    content types such as ``application/problem+json``.
+
+    """
+
+    def __init__(self, codecs=None, default_content_type='application/json'):
+        super(ContentNegotiation, self).__init__()
+        self.codecs = default_codecs() if codecs is None else list(codecs)
+        self._by_type = {}
+        self._by_suffix = {}
+        for codec in reversed(self.codecs):
+            self._by_type[codec.content_type] = codec
+            if codec.suffix:
+                self._by_suffix[codec.suffix] = codec
+        if default_content_type not in self._by_type:
+            raise ValueError('no codec for default content type '
+                             '{!r}'.format(default_content_type))
+        self.default_content_type = default_content_type
+        self.accept = ', '.join(
+            codec.content_type if index == 0 else '{};q={:.1f}'.format(
+                codec.content_type, max(0.1, 1.0 - index / 10.0))
+            for index, codec in enumerate(self.codecs))
+
+    @staticmethod
+    def should_encode(body):
+        """Is `body` an object that is encoded by a codec?"""
+        return isinstance(body, (dict, list, tuple))
+
+    def get_codec(self, content_type):
+        """
+        Find the codec for a ``Content-Type`` header value.
+
+        :param str content_type: the header value, parameters such as
+            ``charset`` are ignored
+        :returns: the codec or :data:`None` if there is no codec for
+            the content type
+
+        """
+        content_type = _split_content_type(content_type)[0]
+        codec = self._by_type.get(content_type)
+        if codec is None and '+' in content_type:
+            suffix = content_type[content_type.rfind('+'):]
+            codec = self._by_suffix.get(suffix)
+        return codec
+
+    def encode(self, body, headers):
+        """
+        Encode a request body.
+
+        :param body: the object to encode
+        :param tornado.httputil.HTTPHeaders headers: request headers.
+            ``Content-Type`` is added if it is missing.
+        :returns: the encoded body as :class:`bytes`
+        :raises: :exc:`ValueError` if there is no codec for the
+            ``Content-Type`` of the request
+
+        """
+        content_type = headers.get('Content-Type')
+        if content_type is None:
+            content_type = headers['Content-Type'] = self.default_content_type
+        codec = self.get_codec(content_type)
+        if codec is None:
+            raise ValueError('cannot encode body as {}'.format(content_type))
+        return codec.encode(body)
+
+    def decode(self, response):
+        """
+        Decode a response body.
+
+        :param tornado.httpclient.HTTPResponse response: the response
+        :returns: the decoded body or :data:`None` if the response
+            does not have a body
+        :raises: :exc:`ValueError` if there is no codec for the
+            ``Content-Type`` of the response or the body is malformed
+
+        """
+        body = response.body
+        if not body:
+            return None
+        content_type = response.headers.get('Content-Type',
+                                            'application/octet-stream')
+        codec = self.get_codec(content_type)
+        if codec is None:
+            raise ValueError('cannot decode body of type {}'.format(
+                content_type))
+        charset = _split_content_type(content_type)[1]
+        if charset is None:
+            return codec.decode(body)
+        return codec.decode(body, charset)
+
+
+_UNSET = object()
+
+
+class ContentResponse(object):
+    """
+    Wraps a :class:`~tornado.httpclient.HTTPResponse` to decode its body.
+
+    :param tornado.httpclient.HTTPResponse response: the response
+    :param ContentNegotiation negotiation: decodes the body
+
+    Every attribute of the underlying response is available from the
+    wrapper.  The body is decoded the first time that :attr:`.data`
+    is accessed and the result is kept, so inspecting a response in
+    several places decodes it once.
+
+    .. attribute:: response
+
+       The wrapped :class:`~tornado.httpclient.HTTPResponse`.
+
+    """
+
+    def __init__(self, response, negotiation):
+        self.response = response
+        self._negotiation = negotiation
+        self._data = _UNSET
+
+    @property
+    def data(self):
+        """
+        The decoded body.
+
+        :raises: :exc:`ValueError` if the body cannot be decoded
+
+        """
+        if self._data is _UNSET:
+            self._data = self._negotiation.decode(self.response)
+        return self._data
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+    def __repr__(self):
+        return '<{} {!r}>'.format(self.__class__.__name__, self.response)
@@ -0,0 +1,69 @@
+import time
+
+
+DEADLINE_HEADER = 'X-Request-Deadline'
+"""
+Header that carries the remaining budget of a request.
+
+The value is the number of milliseconds that the caller is willing to
+wait, measured from when the request was sent.  A relative value is
+used so that clock skew between hosts does not matter.
+
+"""
+
+
+class Deadline(object):
+    """
+    Point in time after which nobody is waiting for a response.
+
+    :param float budget: number of seconds until the deadline
+    :param float start: when the budget started.  Defaults to now.
+    :param clock: function that returns the current time in seconds
+
+    Pass an instance as the ``deadline`` keyword of
+    :meth:`.HTTPClient.send_request` to clamp the timeouts of each
+    attempt to the remaining budget, to fail with a
+    :class:`.DeadlineExceededError` once the budget is spent and to
+    forward the remaining budget in the :data:`.DEADLINE_HEADER`.
+
+    """
+
+    def __init__(self, budget, start=None, clock=time.time):
+        super(Deadline, self).__init__()
+        self.clock = clock
+        self.expires_at = (clock() if start is None else start) + budget
+
+    @classmethod
+    def from_header(cls, value, start=None, clock=time.time):
+        """
+        Create a deadline from a :data:`.DEADLINE_HEADER` value.
+
+        :param str value: the header value
+        :param float start: when the request was received
+        :param clock: function that returns the current time in seconds
+        :returns: a :class:`.Deadline` or :data:`None` if `value` is
+            missing or malformed
+
+        """
+        try:
+            milliseconds = float(value)
+        except (TypeError, ValueError):
+            return None
+        if milliseconds != milliseconds:  # NaN
+            return None
+        return cls(max(0.0, milliseconds) / 1000.0, start, clock)
+
+    def remaining(self):
+        """Number of seconds left.  This is never negative."""
+        return max(0.0, self.expires_at - self.clock())
+
+    def expired(self):
+        """Has the budget been spent?"""
+        return self.clock() >= self.expires_at
+
+    def to_header(self):
+        """Format the remaining budget as a :data:`.DEADLINE_HEADER`."""
+        return str(int(self.remaining() * 1000))
+
+    def __repr__(self):
+        return '<Deadline {:.3f}s remaining>'.format(self.remaining())
@@ -0,0 +1,110 @@
+from sprockets.clients.http import retry, stats
+
+
+class HedgingPolicy(object):
+    """
+    Decides when a duplicate request is sent to cut tail latency.
+
+    :param float delay: number of seconds to wait for a response
+        before sending a hedge request.  When `percentile` is set,
+        this is used until enough latency samples have been observed.
+    :param float percentile: derive the delay from this percentile of
+        the observed latency of each upstream instead of using a fixed
+        delay
+    :param int min_samples: number of samples that must be observed
+        for an upstream before `percentile` is used
+    :param float min_delay: lower bound on the derived delay
+    :param methods: HTTP methods that may be hedged.  Defaults to
+        :data:`~sprockets.clients.http.retry.IDEMPOTENT_METHODS`.
+    :param budget: :class:`~sprockets.clients.http.retry.RetryBudget`
+        that caps the number of hedge requests.  Defaults to a budget
+        that allows one hedge for every ten requests.
+
+    The first successful response wins and the other request is
+    abandoned.
+
+    .. attribute:: requests
+
+       Number of requests that were eligible for hedging.
+
+    .. attribute:: hedges_sent
+
+       Number of hedge requests that were sent.
+
+    .. attribute:: hedges_won
+
+       Number of hedge requests that responded before the original.
+
+    """
+
+    def __init__(self, delay=0.05, percentile=None, min_samples=100,
+                 min_delay=0.001, methods=None, budget=None):
+        super(HedgingPolicy, self).__init__()
+        self.delay = delay
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.methods = frozenset(m.upper() for m in
+                                 (retry.IDEMPOTENT_METHODS if methods is None
+                                  else methods))
+        self.budget = (retry.RetryBudget(ratio=0.1, capacity=10.0)
+                       if budget is None else budget)
+        self.requests = 0
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        self._latencies = {}
+
+    def applies_to(self, request):
+        """Can `request` be hedged?"""
+        return request.method.upper() in self.methods
+
+    def get_delay(self, upstream):
+        """
+        Number of seconds to wait before hedging a request.
+
+        :param tuple upstream: ``(scheme, host, port)`` of the upstream
+
+        """
+        self.requests += 1
+        self.budget.deposit()
+        if self.percentile is not None:
+            window = self._latencies.get(upstream)
+            if window is not None and len(window) >= self.min_samples:
+                return max(self.min_delay,
+                           window.percentile(self.percentile))
+        return self.delay
+
+    def allow_hedge(self):
+        """Withdraw from the budget for a hedge request."""
+        if self.budget.withdraw():
+            self.hedges_sent += 1
+            return True
+        return False
+
+    def record_success(self, upstream, latency, hedged):
+        """
+        Record the latency of a successful request.
+
+        :param tuple upstream: ``(scheme, host, port)`` of the upstream
+        :param float latency: seconds that the winning request took
+        :param bool hedged: was the winning request a hedge?
+
+        """
+        if hedged:
+            self.hedges_won += 1
+        try:
+            window = self._latencies[upstream]
+        except KeyError:
+            window = self._latencies[upstream] = stats.LatencyWindow()
+        window.add(latency)
+
+    def stats(self):
+        """
+        Retrieve the hedging counters.
+
+        :returns: :class:`dict` with ``requests``, ``hedges_sent`` and
+            ``hedges_won`` keys
+
+        """
+        return {'requests': self.requests, 'hedges_sent': self.hedges_sent,
+                'hedges_won': self.hedges_won}
@@ -0,0 +1,309 @@
+import logging
+import math
+import socket
+
+from tornado import ioloop
+
+from sprockets.clients.http import bodies
+
+
+log = logging.getLogger(__name__)
+
+
+class Histogram(object):
+    """
+    Log-linear histogram of durations.
+
+    :param int sub_buckets: number of linear buckets in each power
+        of two.  The relative error of a percentile is roughly
+        ``1 / sub_buckets``.
+
+    Values are recorded in microseconds into buckets whose width
+    grows with the magnitude of the value, in the spirit of HDR
+    histograms.  Recording a value is constant time and the memory
+    used only depends on the range of the values.
+
+    """
+
+    def __init__(self, sub_buckets=16):
+        super(Histogram, self).__init__()
+        self.sub_buckets = sub_buckets
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self._buckets = {}
+
+    def _bucket(self, micros):
+        if micros < self.sub_buckets:
+            return 0, micros
+        mantissa, exponent = math.frexp(micros)
+        return exponent, int((mantissa - 0.5) * 2 * self.sub_buckets)
+
+    def _upper_bound(self, bucket):
+        exponent, sub_bucket = bucket
+        if exponent == 0:
+            return sub_bucket / 1e6
+        return ((0.5 + (sub_bucket + 1) / (2.0 * self.sub_buckets)) *
+                (2 ** exponent) / 1e6)
+
+    def record(self, value):
+        """Record a duration in seconds."""
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        bucket = self._bucket(int(value * 1e6))
+        self._buckets[bucket] = self._buckets.get(bucket, 0) + 1
+
+    def percentile(self, percent):
+        """
+        Estimate a percentile of the recorded values.
+
+        :param float percent: the percentile, for example ``99``
+        :returns: the upper bound of the bucket that holds the
+            percentile in seconds or :data:`None` if nothing has been
+            recorded
+
+        """
+        if not self.count:
+            return None
+        rank = max(1, int(math.ceil(percent / 100.0 * self.count)))
+        seen = 0
+        for bucket in sorted(self._buckets):
+            seen += self._buckets[bucket]
+            if seen >= rank:
+                return min(self.max, self._upper_bound(bucket))
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def summary(self):
+        """
+        Summarize the histogram.
+
+        :returns: :class:`dict` with ``count``, ``min``, ``max``,
+            ``mean``, ``p50``, ``p90``, ``p99`` and ``p999`` keys
+
+        """
+        return {'count': self.count, 'min': self.min, 'max': self.max,
+                'mean': self.mean, 'p50': self.percentile(50),
+                'p90': self.percentile(90), 'p99': self.percentile(99),
+                'p999': self.percentile(99.9)}
+
+
+class InMemorySink(object):
+    """
+    Metrics sink that aggregates in process.
+
+    Counters and gauges are kept as numbers and timings are recorded
+    in :class:`.Histogram` instances.  Use :meth:`.snapshot` to read
+    the current values.
+
+    """
+
+    def __init__(self):
+        super(InMemorySink, self).__init__()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def increment(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name, value):
+        self.gauges[name] = value
+
+    def timing(self, name, seconds):
+        try:
+            histogram = self.histograms[name]
+        except KeyError:
+            histogram = self.histograms[name] = Histogram()
+        histogram.record(seconds)
+
+    def flush(self):
+        pass
+
+    def snapshot(self):
+        """
+        Retrieve the current values.
+
+        :returns: :class:`dict` with ``counters``, ``gauges`` and
+            ``timings`` keys.  Timings are :meth:`.Histogram.summary`
+            dictionaries.
+
+        """
+        return {
+            'counters': dict(self.counters),
+            'gauges': dict(self.gauges),
+            'timings': dict((name, histogram.summary())
+                            for name, histogram in self.histograms.items()),
+        }
+
+
+class StatsdSink(object):
+    """
+    Metrics sink that sends statsd datagrams over UDP.
+
+    :param str host: statsd host
+    :param int port: statsd port
+    :param int max_packet_size: metrics are buffered until
+        :meth:`.flush` is called or the buffer would exceed this
+        many bytes
+
+    Send failures are logged and otherwise ignored.
+
+    """
+
+    def __init__(self, host='127.0.0.1', port=8125, max_packet_size=512):
+        super(StatsdSink, self).__init__()
+        self.address = (host, port)
+        self.max_packet_size = max_packet_size
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+        self._buffer = []
+        self._buffer_size = 0
+
+    def _add(self, line):
+        if self._buffer_size + len(line) + 1 > self.max_packet_size:
+            self.flush()
+        self._buffer.append(line)
+        self._buffer_size += len(line) + 1
+
+    def increment(self, name, value=1):
+        self._add('{}:{}|c'.format(name, value))
+
+    def gauge(self, name, value):
+        self._add('{}:{}|g'.format(name, value))
+
+    def timing(self, name, seconds):
+        self._add('{}:{:.3f}|ms'.format(name, seconds * 1000.0))
+
+    def flush(self):
+        if not self._buffer:
+            return
+        payload = '\n'.join(self._buffer).encode('ascii')
+        self._buffer = []
+        self._buffer_size = 0
+        try:
+            self.socket.sendto(payload, self.address)
+        except socket.error as error:
+            log.debug('failed to send metrics to %s:%s: %s',
+                      self.address[0], self.address[1], error)
+
+
+class MetricsRecorder(object):
+    """
+    Records outbound request metrics to a sink.
+
+    :param sink: where metrics are sent.  This is any object with
+        ``increment``, ``gauge``, ``timing`` and ``flush`` methods such
+        as :class:`.InMemorySink` or :class:`.StatsdSink`.  Defaults
+        to a new :class:`.InMemorySink`.
+    :param str prefix: prefix for every metric name
+    :param float flush_interval: the sink is flushed at most this
+        many seconds after an attempt is recorded so that a
+        :class:`.StatsdSink` can batch the metrics of many requests
+        into a datagram.  :data:`None` flushes after every attempt.
+
+    Assign an instance to :attr:`.HTTPClient.metrics` to record each
+    attempt that is sent.  Metric names are formed as
+    ``prefix.host.METHOD.metric`` and request metrics additionally
+    include the status class (e.g., ``http.api_example_com.GET.2xx``):
+
+    - ``requests`` counter
+    - ``request_time`` timing from :attr:`~tornado.httpclient.HTTPResponse.request_time`
+    - ``queue_time`` timing from the ``queue`` entry of
+      :attr:`~tornado.httpclient.HTTPResponse.time_info` when the
+      client implementation reports it
+    - ``bytes_in`` and ``bytes_out`` counters
+    - ``in_flight`` gauge (without a status class)
+
+    :meth:`.HTTPClient.close` flushes the metrics that are still
+    buffered.
+
+    """
+
+    def __init__(self, sink=None, prefix='http', flush_interval=1.0):
+        super(MetricsRecorder, self).__init__()
+        self.sink = InMemorySink() if sink is None else sink
+        self.prefix = prefix
+        self.flush_interval = flush_interval
+        self._in_flight = {}
+        self._names = {}
+        self._flush_timeout = None
+
+    def flush(self):
+        """Send the buffered metrics to the sink now."""
+        if self._flush_timeout is not None:
+            io_loop, timeout = self._flush_timeout
+            io_loop.remove_timeout(timeout)
+            self._flush_timeout = None
+        self.sink.flush()
+
+    def _schedule_flush(self):
+        if self.flush_interval is None:
+            self.sink.flush()
+        elif self._flush_timeout is None:
+            io_loop = ioloop.IOLoop.current()
+            self._flush_timeout = (
+                io_loop, io_loop.call_later(self.flush_interval, self._flush))
+
+    def _flush(self):
+        self._flush_timeout = None
+        self.sink.flush()
+
+    def _base_name(self, method, upstream):
+        key = (method, upstream[1])
+        try:
+            return self._names[key]
+        except KeyError:
+            name = '{}.{}.{}'.format(self.prefix,
+                                     upstream[1].replace('.', '_'), method)
+            self._names[key] = name
+            return name
+
+    def request_started(self, request, upstream):
+        """Record that an attempt for `request` was sent."""
+        name = self._base_name(request.method, upstream)
+        in_flight = self._in_flight.get(name, 0) + 1
+        self._in_flight[name] = in_flight
+        self.sink.gauge(name + '.in_flight', in_flight)
+
+    def request_finished(self, request, upstream, code, elapsed,
+                         response=None):
+        """
+        Record the outcome of an attempt.
+
+        :param tornado.httpclient.HTTPRequest request: the request
+        :param tuple upstream: ``(scheme, host, port)`` of the upstream
+        :param int code: the resulting status code
+        :param float elapsed: seconds that the attempt took.  This is
+            used when the response does not include a request time.
+        :param tornado.httpclient.HTTPResponse response: the response
+            if one was received
+
+        """
+        name = self._base_name(request.method, upstream)
+        in_flight = self._in_flight.get(name, 1) - 1
+        self._in_flight[name] = in_flight
+        self.sink.gauge(name + '.in_flight', in_flight)
+
+        name = '{}.{}xx'.format(name, code // 100)
+        self.sink.increment(name + '.requests')
+        request_time = elapsed
+        if response is not None:
+            if response.request_time is not None:
+                request_time = response.request_time
+            queue_time = response.time_info.get('queue')
+            if queue_time is not None:
+                self.sink.timing(name + '.queue_time', queue_time)
+            size = bodies.body_size(response)
+            if size:
+                self.sink.increment(name + '.bytes_in', size)
+        self.sink.timing(name + '.request_time', request_time)
+        if request.body:
+            self.sink.increment(name + '.bytes_out', len(request.body))
+        self._schedule_flush()
@@ -1,6 +1,8 @@
 import logging
+import time
 
-from sprockets.clients.http import client
+from sprockets.clients.http import (batch, client, deadline, producers,
+                                    registry, streaming)
 from tornado import gen
 
 
@@ -30,16 +32,71 @@ class ClientMixin(object):
     .. attribute:: http_client
 
        The :class:`~sprockets.clients.http.client.HTTPClient` instance
-       that :meth:`.make_http_request` uses.
+       that :meth:`.make_http_request` uses.  This is a long-lived
+       client that is shared by every handler of the application
+       running on the same IO loop with the same
+       :attr:`.http_client_name`.  See
+       :class:`~sprockets.clients.http.registry.ClientRegistry` for
+       details on how it is configured.  The client is not closed
+       automatically; call
+       :func:`~sprockets.clients.http.registry.close_clients` when the
+       application shuts down.
+
+    .. attribute:: http_client_name
+
+       Name of the client configuration in the ``http_clients``
+       application setting to use.  Defaults to ``default``.
+
+    .. attribute:: request_budget
+
+       Number of seconds that the handler has to produce a response or
+       :data:`None` for no limit.  Outbound requests are bound by this
+       budget and by the budget in the inbound
+       :data:`~sprockets.clients.http.deadline.DEADLINE_HEADER`,
+       whichever ends first.  See :attr:`.request_deadline`.
 
     """
 
+    http_client_name = 'default'
+    request_budget = None
+    _request_body_pipe = None
+    _request_deadline = False
+
     def initialize(self):
         super(ClientMixin, self).initialize()
-        self.http_client = client.HTTPClient()
+        self.http_client = registry.get_client(
+            self.http_client_name, getattr(self, 'settings', None))
         if not hasattr(self, 'logger'):
             self.logger = logging.getLogger(self.__class__.__name__)
 
+    @property
+    def request_deadline(self):
+        """
+        :class:`~sprockets.clients.http.deadline.Deadline` of the inbound
+        request or :data:`None` if it does not have one.
+
+        The deadline is measured from when the inbound request was
+        received.  It is passed to every request that this mixin makes
+        so that requests stop once the caller has given up.  This is
+        always :data:`None` when the mixin is not used with a
+        :class:`~tornado.web.RequestHandler`.
+
+        """
+        if not hasattr(getattr(self, 'request', None), 'request_time'):
+            return None
+        if self._request_deadline is False:
+            start = time.time() - self.request.request_time()
+            deadlines = [deadline.Deadline.from_header(
+                self.request.headers.get(deadline.DEADLINE_HEADER), start)]
+            if self.request_budget is not None:
+                deadlines.append(deadline.Deadline(self.request_budget,
+                                                   start))
+            deadlines = [d for d in deadlines if d is not None]
+            self._request_deadline = (
+                min(deadlines, key=lambda d: d.expires_at)
+                if deadlines else None)
+        return self._request_deadline
+
     @gen.coroutine
     def make_http_request(self, method, scheme, host, *path, **kwargs):
         """
@@ -56,8 +113,9 @@ class ClientMixin(object):
             unspecified, :func:`.default_error_handler` is called.
         :keyword port: port to send the request to.  If omitted, the
             port will be chosen based on the scheme.
-        :param kwargs: additional keyword arguments are passed to the
-            :class:`tornado.httpclient.HTTPRequest` initializer.
+        :keyword deadline: defaults to :attr:`.request_deadline`
+        :param kwargs: additional keyword arguments are passed to
+            :meth:`.HTTPClient.send_request`.
 
         The ``on_error`` function is called with three parameters: the
         handler (i.e., ``self``), the :class:`~tornado.httpclient.HTTPRequest`
@@ -66,20 +124,188 @@ class ClientMixin(object):
         """
         port = kwargs.pop('port', None)
         on_error = kwargs.pop('on_error', None) or default_error_handler
+        kwargs.setdefault('deadline', self.request_deadline)
         try:
             response = yield self.http_client.send_request(
                 method, scheme, host, *path, port=port, **kwargs)
             raise gen.Return(response)
 
         except client.HTTPError as error:
-            if error.code < 500:
-                log = self.logger.error
-            else:
-                log = self.logger.warn
-            log('%s %s resulted in %s %s', error.request.method,
-                error.request.url, error.code, error.reason)
+            self._log_http_error(error)
             on_error(self, error.request, error)
 
+    @gen.coroutine
+    def make_http_requests(self, specs, parallelism=10, fail_fast=False,
+                           on_error=None):
+        """
+        Make a group of HTTP requests with bounded parallelism.
+
+        :param specs: iterable of request specifications.  Each is a
+            sequence of :meth:`.make_http_request` positional arguments
+            optionally followed by a :class:`dict` of keyword arguments.
+        :param int parallelism: maximum number of requests in flight
+        :param bool fail_fast: stop making requests as soon as one
+            fails and call `on_error` for the failure
+        :param on_error: function to call for the first failure when
+            `fail_fast` is enabled.  If unspecified,
+            :func:`.default_error_handler` is called.
+
+        :returns: :class:`list` of
+            :class:`~sprockets.clients.http.batch.BatchResult` instances
+            in the same order as `specs`.  Failed requests are logged
+            and their error is captured in the result.
+
+        """
+        on_error = on_error or default_error_handler
+        if self.request_deadline is not None:
+            specs = self._add_deadline(specs)
+        try:
+            results = yield self.http_client.send_requests(
+                specs, parallelism=parallelism, fail_fast=fail_fast)
+        except client.HTTPError as error:
+            self._log_http_error(error)
+            on_error(self, error.request, error)
+            return
+
+        for result in results:
+            if isinstance(result.error, client.HTTPError):
+                self._log_http_error(result.error)
+        raise gen.Return(results)
+
+    def _add_deadline(self, specs):
+        for spec in specs:
+            args, kwargs = batch.split_spec(spec)
+            if 'deadline' not in kwargs:
+                kwargs = dict(kwargs, deadline=self.request_deadline)
+            yield args + (kwargs,)
+
+    @gen.coroutine
+    def proxy_http_response(self, method, scheme, host, *path, **kwargs):
+        """
+        Stream an upstream response through to the client.
+
+        :param str method: HTTP method to invoke
+        :param str scheme: URL scheme for the request
+        :param str host: host to send the request to
+        :param path: resource path to request
+        :keyword on_error: function to call if the request fails before
+            a response is received.  If unspecified,
+            :func:`.default_error_handler` is called.
+        :param kwargs: additional keyword arguments are passed to
+            :meth:`.HTTPClient.stream_request`.
+
+        :returns: the upstream :class:`~tornado.httpclient.HTTPResponse`
+            without a body
+        :raises: :class:`.HTTPError` if the request fails, or the
+            buffer overflows, after the response has been started
+
+        The upstream status and headers (other than hop-by-hop headers)
+        are copied to this handler and each body chunk is written and
+        flushed as it arrives.  The next chunk is not written until the
+        client has received the previous one, so a slow client holds at
+        most ``max_buffer_size`` bytes of the body in memory (see
+        :meth:`.HTTPClient.stream_request`).  Upstream error responses
+        are proxied as-is.  The response is not decompressed so that it
+        can be passed through unchanged.
+
+        """
+        on_error = kwargs.pop('on_error', None) or default_error_handler
+        kwargs.setdefault('decompress_response', False)
+        kwargs.setdefault('deadline', self.request_deadline)
+        started = False
+
+        stream = self.http_client.stream_request(method, scheme, host,
+                                                 *path, **kwargs)
+        try:
+            while not stream.done():
+                chunk = yield stream.next()
+                if chunk is None:
+                    continue
+                if not started:
+                    self._start_proxied_response(stream)
+                    started = True
+                self.write(chunk)
+                yield self.flush()
+            response = yield stream.complete()
+        except client.HTTPError as error:
+            if stream.code is None or error.code != stream.code:
+                self._log_http_error(error)
+                if started:
+                    raise
+                on_error(self, error.request, error)
+                return
+            response = error.response
+
+        if not started:
+            self._start_proxied_response(stream)
+        raise gen.Return(response)
+
+    def _start_proxied_response(self, stream):
+        self.set_status(stream.code, stream.reason)
+        self.clear_header('Content-Type')
+        for name, value in stream.headers.get_all():
+            if name.lower() not in streaming.HOP_BY_HOP_HEADERS:
+                self.add_header(name, value)
+
+    def begin_streaming_request(self, method, scheme, host, *path, **kwargs):
+        """
+        Start a request whose body is streamed from the inbound request.
+
+        :param str method: HTTP method to invoke
+        :param str scheme: URL scheme for the request
+        :param str host: host to send the request to
+        :param path: resource path to request
+        :param kwargs: additional keyword arguments are passed to
+            :meth:`.make_http_request`
+
+        Use this from ``prepare`` in a handler that is decorated with
+        :func:`tornado.web.stream_request_body`.  Each chunk that the
+        handler receives is forwarded to the upstream as it arrives and
+        the handler stops reading from the client while the upstream
+        is catching up.  The inbound ``Content-Length`` is forwarded so
+        that the upstream request is not chunked unnecessarily.  Call
+        :meth:`.finish_streaming_request` from the HTTP method handler
+        to retrieve the response.
+
+        """
+        self._request_body_pipe = producers.BodyPipe()
+        headers = kwargs.pop('headers', None) or {}
+        content_length = self.request.headers.get('Content-Length')
+        if content_length is not None and 'Content-Length' not in headers:
+            headers = dict(headers)
+            headers['Content-Length'] = content_length
+        self._streaming_response = self.make_http_request(
+            method, scheme, host, *path, body=self._request_body_pipe,
+            headers=headers, **kwargs)
+        self.http_client._transport.io_loop.add_future(
+            self._streaming_response,
+            lambda _: self._request_body_pipe.abandon())
+
+    def data_received(self, chunk):
+        if self._request_body_pipe is None:
+            return super(ClientMixin, self).data_received(chunk)
+        return self._request_body_pipe.write(chunk)
+
+    @gen.coroutine
+    def finish_streaming_request(self):
+        """
+        Finish a request started by :meth:`.begin_streaming_request`.
+
+        :returns: the response from :meth:`.make_http_request`
+
+        """
+        yield self._request_body_pipe.close()
+        response = yield self._streaming_response
+        raise gen.Return(response)
+
+    def _log_http_error(self, error):
+        if error.code < 500:
+            log = self.logger.error
+        else:
+            log = self.logger.warn
+        log('%s %s resulted in %s %s', error.request.method,
+            error.request.url, error.code, error.reason)
+
     def set_status(self, status_code, reason=None):
         # Overridden to remove the raising of ValueError when
         # reason is None and status is a custom code.
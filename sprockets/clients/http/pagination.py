@@ -0,0 +1,316 @@
+import collections
+import functools
+import json
+import logging
+import re
+import sys
+import weakref
+try:
+    from urllib.parse import (parse_qsl, urlencode, urljoin, urlsplit,
+                              urlunsplit)
+except ImportError:
+    from urllib import urlencode
+    from urlparse import parse_qsl, urljoin, urlsplit, urlunsplit
+
+from tornado import concurrent, gen, httputil, ioloop
+
+try:
+    import builtins
+except ImportError:
+    import __builtin__ as builtins
+
+
+log = logging.getLogger(__name__)
+
+_StopAsyncIteration = getattr(builtins, 'StopAsyncIteration', None)
+
+_LINK_VALUE = re.compile(r'<([^>]*)>((?:\s*;\s*[^;,]+)*)')
+
+CREDENTIAL_HEADERS = frozenset(['authorization', 'cookie',
+                                'proxy-authorization'])
+"""Headers that are not sent when a link leads to another origin."""
+
+CREDENTIAL_KEYWORDS = ('auth_username', 'auth_password', 'auth_mode',
+                       'client_cert', 'client_key')
+"""Request keywords that are not used when a link leads to another origin."""
+
+
+def parse_link_header(value):
+    """
+    Parse a ``Link`` header as described in :rfc:`8288`.
+
+    :param str value: the header value
+    :returns: :class:`list` of ``(url, parameters)`` tuples where
+        `parameters` is a :class:`dict` with lower-cased names
+
+    """
+    links = []
+    for match in _LINK_VALUE.finditer(value):
+        parameters = {}
+        for parameter in match.group(2).split(';'):
+            name, _, param_value = parameter.partition('=')
+            name = name.strip().lower()
+            if name:
+                parameters[name] = param_value.strip().strip('"')
+        links.append((match.group(1), parameters))
+    return links
+
+
+def next_link(response):
+    """
+    Find the ``rel="next"`` link of a response.
+
+    :param tornado.httpclient.HTTPResponse response: the page
+    :returns: the absolute URL of the next page or :data:`None`
+
+    This is the default ``next_page`` function of
+    :meth:`.HTTPClient.paginate`.
+
+    """
+    for value in response.headers.get_list('Link'):
+        for url, parameters in parse_link_header(value):
+            if 'next' in parameters.get('rel', '').lower().split():
+                return urljoin(response.effective_url, url)
+    return None
+
+
+def json_items(response):
+    """
+    Retrieve the items of a page whose body is a JSON array.
+
+    This is the default ``items`` function of
+    :meth:`.HTTPClient.paginate`.  The decoded body of a
+    :class:`~sprockets.clients.http.content.ContentResponse` is used
+    when content negotiation is enabled.
+
+    :raises: :exc:`ValueError` if the body is not an array
+
+    """
+    data = getattr(response, 'data', None)
+    if data is None:
+        data = json.loads(response.body.decode('utf-8'))
+    if not isinstance(data, list):
+        raise ValueError('page body is not a list, use the items '
+                         'keyword to extract the items')
+    return data
+
+
+def _relative_url(url, response):
+    # keep links to the same origin relative so that the following
+    # pages are sent to the host (or upstream) that was requested
+    parts = urlsplit(url)
+    if parts[:2] != urlsplit(response.effective_url)[:2]:
+        return url
+    target = urlunsplit(('', '', parts.path, parts.query, ''))
+    return target if target.startswith('/') else '/' + target
+
+
+def without_credentials(kwargs):
+    """
+    Remove the credentials from the keyword arguments of a request.
+
+    :param dict kwargs: :meth:`.HTTPClient.send_request` keyword
+        arguments
+    :returns: a copy of `kwargs` without :data:`CREDENTIAL_KEYWORDS`
+        and whose ``headers`` do not include :data:`CREDENTIAL_HEADERS`
+
+    """
+    kwargs = dict((name, value) for name, value in kwargs.items()
+                  if name not in CREDENTIAL_KEYWORDS)
+    headers = kwargs.get('headers')
+    if headers:
+        kwargs['headers'] = httputil.HTTPHeaders()
+        for name, value in headers.get_all():
+            if name.lower() not in CREDENTIAL_HEADERS:
+                kwargs['headers'].add(name, value)
+    return kwargs
+
+
+def _merge_query(url, parameters):
+    parts = urlsplit(url)
+    query = [(name, value) for name, value in parse_qsl(parts.query, True)
+             if name not in parameters]
+    query.extend(sorted(parameters.items()))
+    return urlunsplit(parts[:3] + (urlencode(query),) + parts[4:])
+
+
+class PageIterator(object):
+    """
+    Iterates over the items of a paginated resource.
+
+    Instances are created by :meth:`.HTTPClient.paginate`.  Pages are
+    requested in order: as soon as a page arrives, the next one is
+    requested while the items are consumed, until `read_ahead` pages
+    are waiting to be consumed.  At most `read_ahead` pages plus the
+    one being consumed are held in memory.
+
+    Iterate with :attr:`.fetch_next` and :meth:`.next_item`:
+
+    .. code-block:: python
+
+       pages = http_client.paginate('GET', 'https', 'api.example.com',
+                                    'users', read_ahead=2)
+       while (yield pages.fetch_next):
+           user = pages.next_item()
+
+    or with ``async for`` on Python 3.5 and later.  Call :meth:`.cancel`
+    when stopping early so that no further pages are requested.  An
+    iterator that is abandoned, for example by breaking out of an
+    ``async for`` loop, stops as soon as it is garbage collected: the
+    page that is in flight is discarded and no further pages are
+    requested.  A failed page request is raised by :attr:`.fetch_next`
+    once the items before it have been consumed.
+
+    .. attribute:: pages
+
+       Number of pages that have been requested.
+
+    """
+
+    def __init__(self, send, target, items, next_page, read_ahead,
+                 max_pages):
+        super(PageIterator, self).__init__()
+        self._send = send
+        self._items = items
+        self._next_page = next_page
+        self.read_ahead = max(1, read_ahead)
+        self.max_pages = max_pages
+        self.pages = 0
+        self._current = collections.deque()
+        self._ready = collections.deque()
+        self._error = None
+        self._next_url = None
+        self._in_flight = None
+        self._in_flight_target = None
+        self._waiter = None
+        self.cancelled = False
+        self.logger = log.getChild(self.__class__.__name__)
+        self._request(target)
+
+    @property
+    def fetch_next(self):
+        """
+        :class:`~tornado.concurrent.Future` that resolves to
+        :data:`True` when an item is available from :meth:`.next_item`
+        or :data:`False` when there are no more items.
+        """
+        future = concurrent.Future()
+        if not self._resolve(future):
+            self._waiter = future
+        return future
+
+    def next_item(self):
+        """
+        Retrieve the next item.
+
+        :raises: :exc:`IndexError` unless :attr:`.fetch_next` resolved
+            to :data:`True`
+
+        """
+        return self._current.popleft()
+
+    def cancel(self):
+        """Stop requesting pages and discard the buffered items."""
+        self.cancelled = True
+        self._current.clear()
+        self._ready.clear()
+        self._next_url = None
+        if self._waiter is not None:
+            self._waiter.set_result(False)
+            self._waiter = None
+
+    def __aiter__(self):
+        return self
+
+    @gen.coroutine
+    def __anext__(self):
+        more = yield self.fetch_next
+        if not more:
+            raise _StopAsyncIteration()
+        raise gen.Return(self.next_item())
+
+    def _resolve(self, future):
+        while not self._current and self._ready:
+            self._current.extend(self._ready.popleft())
+            self._request_next()
+        if self._current:
+            future.set_result(True)
+        elif self._error is not None:
+            error, self._error = self._error, None
+            future.set_exc_info(error)
+        elif self.cancelled or (self._in_flight is None and
+                              self._next_url is None):
+            future.set_result(False)
+        else:
+            return False
+        return True
+
+    def _request(self, target):
+        self.pages += 1
+        self._in_flight_target = target
+        try:
+            self._in_flight = self._send(target)
+        except Exception:
+            self._in_flight = concurrent.Future()
+            self._in_flight.set_exc_info(sys.exc_info())
+        # a weak reference lets an abandoned iterator be collected
+        # while its page is in flight
+        ioloop.IOLoop.current().add_future(
+            self._in_flight, functools.partial(_deliver_page,
+                                               weakref.ref(self)))
+
+    def _request_next(self):
+        if (self.cancelled or self._in_flight is not None or
+                self._next_url is None or
+                len(self._ready) >= self.read_ahead):
+            return
+        target, self._next_url = self._next_url, None
+        self.logger.debug('requesting page %d: %s', self.pages + 1, target)
+        self._request(target)
+
+    def _on_page(self, future):
+        self._in_flight = None
+        if self.cancelled:
+            future.exception()  # nobody is interested any longer
+            return
+        try:
+            response = future.result()
+            items = list(self._items(response))
+            url = self._next_page(response)
+            if isinstance(url, dict):
+                url = _merge_query(response.effective_url, url)
+            if url is not None and self._in_flight_target.startswith('/'):
+                # only pages of the requested origin link to it
+                url = _relative_url(url, response)
+        except Exception:
+            self._error = sys.exc_info()
+            self._next_url = None
+        else:
+            self._ready.append(items)
+            if self.max_pages is None or self.pages < self.max_pages:
+                self._next_url = url
+
+        if self._waiter is not None and self._resolve(self._waiter):
+            self._waiter = None
+        self._request_next()
+
+
+def _deliver_page(iterator_ref, future):
+    iterator = iterator_ref()
+    if iterator is None:
+        future.exception()  # the iterator was abandoned
+        return
+    iterator._on_page(future)
+
+
+def split_url(url):
+    """
+    Split an absolute URL into the pieces that a request is sent with.
+
+    :returns: ``(scheme, host, port)`` tuple where `port` is
+        :data:`None` when the URL does not include it
+
+    """
+    parts = urlsplit(url)
+    host, port = httputil.split_host_and_port(parts.netloc)
+    return parts.scheme, host, port
@@ -0,0 +1,192 @@
+import collections
+import logging
+import time
+
+try:
+    import pycurl
+except ImportError:  # pragma: no cover
+    pycurl = None
+
+
+log = logging.getLogger(__name__)
+
+
+class ConnectionPool(object):
+    """
+    Tracks the keep-alive connections to a single upstream.
+
+    :param int idle_connections: number of idle connections to keep
+    :param float idle_timeout: seconds that an idle connection is kept
+    :param clock: function that returns the current time in seconds
+
+    The underlying client owns the sockets, so the pool is accounted
+    for from the requests that are sent.  A response is assumed to
+    return its connection to the pool when the client reports
+    connection timings (as the curl client does) and the upstream did
+    not send ``Connection: close``.  Connections that exceed the idle
+    target or sit idle for longer than `idle_timeout` are counted as
+    evicted.  A response whose connect time is zero was sent on a
+    reused connection.
+
+    """
+
+    def __init__(self, idle_connections=2, idle_timeout=60.0,
+                 clock=time.time):
+        super(ConnectionPool, self).__init__()
+        self.idle_connections = idle_connections
+        self.idle_timeout = idle_timeout
+        self.clock = clock
+        self.active = 0
+        self.created = 0
+        self.reused = 0
+        self.evicted = 0
+        self._idle = collections.deque()
+
+    @property
+    def idle(self):
+        """Number of idle connections that are expected to be open."""
+        self._evict_expired()
+        return len(self._idle)
+
+    def request_started(self):
+        """Record that a request is being sent."""
+        self._evict_expired()
+        if self._idle:
+            self._idle.pop()  # most recently used, as curl does
+        self.active += 1
+
+    def request_finished(self, response):
+        """
+        Record that a request is complete.
+
+        :param tornado.httpclient.HTTPResponse response: the response
+            or :data:`None` if the request failed without one
+
+        """
+        self.active = max(0, self.active - 1)
+        if response is None:
+            return
+        time_info = response.time_info or {}
+        if time_info.get('connect', None) == 0:
+            self.reused += 1
+        else:
+            self.created += 1
+        connection = response.headers.get('Connection', '')
+        if 'connect' in time_info and connection.lower() != 'close':
+            self._idle.append(self.clock())
+            while len(self._idle) > self.idle_connections:
+                self._idle.popleft()
+                self.evicted += 1
+
+    def _evict_expired(self):
+        expires = self.clock() - self.idle_timeout
+        while self._idle and self._idle[0] <= expires:
+            self._idle.popleft()
+            self.evicted += 1
+
+    def stats(self):
+        """
+        Retrieve the state of the pool.
+
+        :returns: :class:`dict` with ``open``, ``idle``, ``active``,
+            ``created``, ``reused`` and ``evicted`` keys
+
+        """
+        idle = self.idle
+        return {
+            'open': self.active + idle,
+            'idle': idle,
+            'active': self.active,
+            'created': self.created,
+            'reused': self.reused,
+            'evicted': self.evicted,
+        }
+
+
+class ConnectionPools(object):
+    """
+    Warm-up and keep-alive settings for known upstreams.
+
+    :param list upstreams: URLs such as ``https://api.example.com`` or
+        names of upstreams registered with :meth:`.HTTPClient.add_upstream`
+        that :meth:`.HTTPClient.warm_up` connects to
+    :param int idle_connections: number of idle keep-alive connections
+        to keep for each host.  This is also the number of connections
+        that are opened to each host when warming up.
+    :param float idle_timeout: seconds after which an idle connection
+        is closed
+    :param str warm_up_path: resource path that is requested to open
+        a connection
+    :param str warm_up_method: HTTP method used to open a connection
+    :param clock: function that returns the current time in seconds
+
+    Assign an instance to :attr:`.HTTPClient.connection_pools` and call
+    :meth:`.HTTPClient.warm_up` at startup so that the first requests
+    after a deployment do not pay for TCP and TLS handshakes.  Any
+    response, including an error status, counts as a successful warm-up
+    since the connection was established.
+
+    Only the curl client keeps connections alive in Tornado 4; the
+    simple client closes each connection after a single request.  For
+    curl, idle connections are closed after `idle_timeout` seconds and
+    TCP keep-alive probes are enabled.  With the simple client, warming
+    up still primes the :attr:`.HTTPClient.resolver` cache and the
+    statistics report every connection as newly created.
+
+    """
+
+    def __init__(self, upstreams=None, idle_connections=2, idle_timeout=60.0,
+                 warm_up_path='/', warm_up_method='HEAD', clock=time.time):
+        super(ConnectionPools, self).__init__()
+        self.upstreams = list(upstreams or [])
+        self.idle_connections = idle_connections
+        self.idle_timeout = idle_timeout
+        self.warm_up_path = warm_up_path
+        self.warm_up_method = warm_up_method
+        self.clock = clock
+        self._pools = {}
+        self.logger = log.getChild(self.__class__.__name__)
+
+    def get(self, key):
+        """
+        Retrieve the pool for `key`.
+
+        :param tuple key: ``(scheme, host, port)`` of the upstream
+        :rtype: ConnectionPool
+
+        """
+        try:
+            return self._pools[key]
+        except KeyError:
+            pool = ConnectionPool(self.idle_connections, self.idle_timeout,
+                                  self.clock)
+            self._pools[key] = pool
+            return pool
+
+    def prepare_curl(self, curl):
+        """
+        Apply the keep-alive settings to a curl handle.
+
+        This is installed as the default ``prepare_curl_callback`` of
+        the underlying client.  Options that the installed libcurl does
+        not support are skipped.
+
+        """
+        if pycurl is None:  # pragma: no cover
+            return
+        options = ((getattr(pycurl, 'MAXAGE_CONN', None),
+                    int(self.idle_timeout)),
+                   (getattr(pycurl, 'TCP_KEEPALIVE', None), 1))
+        for option, value in options:
+            if option is not None:
+                curl.setopt(option, value)
+
+    def stats(self):
+        """
+        Retrieve the state of every known upstream.
+
+        :returns: :class:`dict` mapping upstream key to
+            :meth:`.ConnectionPool.stats`
+
+        """
+        return dict((key, pool.stats()) for key, pool in self._pools.items())
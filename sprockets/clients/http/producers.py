@@ -0,0 +1,185 @@
+import os
+
+import tornado
+from tornado import concurrent, gen, queues
+
+try:
+    import builtins
+except ImportError:
+    import __builtin__ as builtins
+
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_STRING_TYPES = (bytes, type(u''))
+_StopAsyncIteration = getattr(builtins, 'StopAsyncIteration', None)
+
+# IOStream.write accepts memoryview slices since Tornado 4.5
+_WRITES_MEMORYVIEW = tornado.version_info >= (4, 5)
+
+
+class BodyPipe(object):
+    """
+    Forwards chunks that are pushed into it as a request body.
+
+    :param int max_chunks: number of chunks that may be waiting to be
+        sent before :meth:`.write` blocks
+
+    Pass an instance as the ``body`` of a request and then
+    :meth:`.write` chunks into it as they become available.  Call
+    :meth:`.close` after the last chunk.  The future returned by
+    :meth:`.write` resolves once there is room for the chunk, which
+    lets a producer slow down to the pace of the upstream.
+
+    """
+
+    def __init__(self, max_chunks=4):
+        super(BodyPipe, self).__init__()
+        self._queue = queues.Queue(maxsize=max_chunks)
+        self._abandoned = False
+        self.bytes_written = 0
+
+    def write(self, chunk):
+        """
+        Queue `chunk` to be sent.
+
+        :returns: :class:`~tornado.concurrent.Future` that resolves when
+            the chunk is queued
+
+        """
+        if self._abandoned:
+            future = concurrent.Future()
+            future.set_result(None)
+            return future
+        return self._queue.put(chunk)
+
+    def abandon(self):
+        """
+        Discard queued and future chunks.
+
+        Call this when the request fails so that writers are not
+        blocked waiting for a consumer that has gone away.
+
+        """
+        self._abandoned = True
+        while not self._queue.empty():
+            self._queue.get_nowait()
+
+    def close(self):
+        """Mark the end of the body."""
+        return self.write(None)
+
+    @gen.coroutine
+    def produce(self, write):
+        """``body_producer`` for :class:`tornado.httpclient.HTTPRequest`"""
+        while True:
+            chunk = yield self._queue.get()
+            if chunk is None:
+                break
+            self.bytes_written += len(chunk)
+            yield write(chunk)
+
+
+def _file_length(body):
+    try:
+        size = os.fstat(body.fileno()).st_size
+        return max(0, size - body.tell())
+    except (AttributeError, IOError, OSError, ValueError):
+        return None
+
+
+def make_body_producer(body, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Create a ``body_producer`` for a streaming request body.
+
+    :param body: the body to send.  This can be a :class:`BodyPipe`,
+        a :class:`memoryview`, a file-like object with a ``read``
+        method, an asynchronous iterator of :class:`bytes` (on Python
+        3.5 and newer), or an iterable of :class:`bytes`.
+    :param int chunk_size: number of bytes to send at a time when
+        reading from a file or slicing a memoryview
+    :returns: ``(body_producer, content_length)`` tuple.  The length
+        is :data:`None` when it is not known in advance, in which case
+        the body is sent with chunked transfer encoding.
+    :raises: :exc:`TypeError` if `body` cannot be streamed
+
+    A memoryview is written in slices of the view, so the body is
+    never copied, and the producer can be called again to resend it.
+
+    Files are read with blocking ``read`` calls on the
+    :class:`~tornado.ioloop.IOLoop`, one `chunk_size` at a time.  This
+    is fine for local files but a slow file system (or a pipe) stalls
+    every other request on the loop.  Read those in a thread and
+    :meth:`~.BodyPipe.write` the chunks to a :class:`.BodyPipe`
+    instead.
+
+    Only :class:`~tornado.simple_httpclient.SimpleAsyncHTTPClient`
+    sends a ``body_producer``: ``curl_httpclient`` silently ignores
+    it.
+
+    """
+    if isinstance(body, BodyPipe):
+        return body.produce, None
+
+    if isinstance(body, memoryview):
+        view = body.cast('B') if hasattr(body, 'cast') else body
+
+        @gen.coroutine
+        def produce_view(write):
+            for offset in range(0, len(view), chunk_size):
+                chunk = view[offset:offset + chunk_size]
+                yield write(chunk if _WRITES_MEMORYVIEW else chunk.tobytes())
+
+        return produce_view, len(view)
+
+    if hasattr(body, 'read'):
+        @gen.coroutine
+        def produce_file(write):
+            while True:
+                chunk = body.read(chunk_size)
+                if not chunk:
+                    break
+                yield write(chunk)
+
+        return produce_file, _file_length(body)
+
+    if hasattr(body, '__anext__'):
+        @gen.coroutine
+        def produce_async(write):
+            while True:
+                try:
+                    chunk = yield body.__anext__()
+                except _StopAsyncIteration:
+                    break
+                yield write(chunk)
+
+        return produce_async, None
+
+    if not isinstance(body, _STRING_TYPES) and hasattr(body, '__iter__'):
+        chunks = iter(body)
+
+        @gen.coroutine
+        def produce_iterable(write):
+            for chunk in chunks:
+                yield write(chunk)
+
+        return produce_iterable, None
+
+    raise TypeError('cannot stream body of type {}'.format(
+        body.__class__.__name__))
+
+
+def is_streaming_body(body):
+    """
+    Should `body` be sent with :func:`.make_body_producer`?
+
+    This is true for a :class:`.BodyPipe`, a file-like object with a
+    ``read`` method, an asynchronous iterator and an iterator such as
+    a generator.  In-memory values (:class:`bytes`, :class:`str`,
+    :class:`bytearray`, :class:`memoryview`, containers such as
+    :class:`dict` and :class:`list`) are plain bodies.
+
+    """
+    return (isinstance(body, BodyPipe) or hasattr(body, 'read') or
+            hasattr(body, '__anext__') or
+            hasattr(body, '__next__') or hasattr(body, 'next'))
@@ -0,0 +1,278 @@
+import logging
+import time
+
+from tornado import concurrent, ioloop
+
+from sprockets.clients.http import retry
+
+
+log = logging.getLogger(__name__)
+
+THROTTLED_CODES = frozenset([429, 503])
+"""Status codes whose ``Retry-After`` header pauses a bucket."""
+
+_HEADER_PREFIXES = ('RateLimit-', 'X-RateLimit-')
+
+
+def _parse_number(value):
+    # RateLimit-* values may carry parameters: "100, 100;w=60"
+    try:
+        return float(value.split(',')[0].split(';')[0].strip())
+    except (AttributeError, ValueError):
+        return None
+
+
+class TokenBucket(object):
+    """
+    Token bucket that paces requests to a single key.
+
+    :param float rate: number of tokens added per second
+    :param float burst: maximum number of tokens that can accumulate.
+        Defaults to `rate` (or one token, whichever is larger).
+    :param clock: function that returns the current time in seconds
+
+    Each request takes a token.  When the bucket is empty a request
+    reserves a future token and waits until it is available, so waiting
+    requests are released at `rate` instead of all at once.
+
+    """
+
+    def __init__(self, rate, burst=None, clock=time.time):
+        super(TokenBucket, self).__init__()
+        self.base_rate = float(rate)
+        self.burst = float(max(1.0, rate) if burst is None else burst)
+        self._configured_burst = self.burst
+        self.clock = clock
+        self.tokens = self.burst
+        self.paused_until = 0.0
+        self._updated = clock()
+        self._learned_rate = None
+        self._learned_until = 0.0
+
+    @property
+    def rate(self):
+        """The current refill rate, including limits that were learned."""
+        if (self._learned_rate is not None and
+                self.clock() < self._learned_until):
+            return self._learned_rate
+        return self.base_rate
+
+    def _refill(self, now):
+        if now > self._updated:
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def reserve(self, max_wait=None):
+        """
+        Take a token.
+
+        :param float max_wait: largest number of seconds that the caller
+            is willing to wait.  :data:`None` waits as long as necessary.
+        :returns: number of seconds to wait before sending or
+            :data:`None` if the wait would exceed `max_wait`, in which
+            case no token is taken
+
+        """
+        now = self.clock()
+        self._refill(now)
+        # tokens are only added once the pause is over
+        wait = max(0.0, self.paused_until - now)
+        if self.tokens < 1.0:
+            wait += (1.0 - self.tokens) / self.rate
+        if max_wait is not None and wait > max_wait:
+            return None
+        self.tokens -= 1.0
+        return wait
+
+    def pause(self, seconds):
+        """
+        Stop releasing tokens for `seconds`.
+
+        The bucket is drained to a single token that is released when
+        the pause ends and no tokens are added during the pause, so
+        requests resume at `rate` instead of in a burst.
+
+        """
+        now = self.clock()
+        self._refill(now)
+        self.tokens = min(self.tokens, 1.0)
+        self.paused_until = max(self.paused_until, now + seconds)
+        self._updated = max(self._updated, self.paused_until)
+
+    def learn(self, limit=None, remaining=None, reset=None):
+        """
+        Adjust the bucket to a quota reported by the upstream.
+
+        :param float limit: size of the quota
+        :param float remaining: requests left in the current window
+        :param float reset: seconds until the window resets
+
+        The burst is lowered to `limit`, but never raised above the
+        configured burst, and outstanding tokens are capped at
+        `remaining`.  The remaining quota is spread across the rest
+        of the window, without ever exceeding the configured rate, and
+        an exhausted quota pauses the bucket until the window resets.
+
+        """
+        now = self.clock()
+        self._refill(now)
+        if limit is not None:
+            self.burst = max(1.0, min(self._configured_burst, limit))
+            self.tokens = min(self.tokens, self.burst)
+        if remaining is None:
+            return
+        if reset is not None and reset > 0:
+            if remaining < 1:
+                self.pause(reset)
+                return
+            self._learned_rate = min(self.base_rate, remaining / reset)
+            self._learned_until = now + reset
+        self.tokens = min(self.tokens, remaining)
+
+    def stats(self):
+        """
+        Retrieve the state of the bucket.
+
+        :returns: :class:`dict` with ``tokens``, ``rate`` and
+            ``paused`` keys
+
+        """
+        now = self.clock()
+        self._refill(now)
+        return {'tokens': self.tokens, 'rate': self.rate,
+                'paused': self.paused_until > now}
+
+
+class RateLimiter(object):
+    """
+    Collection of :class:`.TokenBucket` instances keyed by host or key.
+
+    :param float rate: default number of requests per second for a key
+    :param float burst: default burst size for a key
+    :param float max_wait: number of seconds that a request may wait
+        for a token before it is rejected.  :data:`None` waits as long
+        as necessary and ``0`` never waits.
+    :param dict overrides: mapping of key to a :class:`dict` with
+        ``rate`` and ``burst`` items for that key
+    :param clock: function that returns the current time in seconds
+
+    Assign an instance to :attr:`.HTTPClient.rate_limiter` to pace
+    requests.  Requests are keyed by host unless the ``rate_limit_key``
+    keyword is passed to :meth:`.HTTPClient.send_request`, for example
+    to share a quota between hosts that accept the same API key.
+    Rejected requests fail with a :class:`.RateLimitedError`.
+
+    Responses teach the limiter about upstream quotas.  A
+    ``Retry-After`` header on a ``429`` or ``503`` response pauses the
+    key and the ``RateLimit-Limit``, ``RateLimit-Remaining`` and
+    ``RateLimit-Reset`` headers (or their ``X-RateLimit-`` variants)
+    are passed to :meth:`.TokenBucket.learn`.
+
+    .. attribute:: waits
+
+       Number of requests that waited for a token.
+
+    .. attribute:: rejected
+
+       Number of requests that were rejected.
+
+    """
+
+    def __init__(self, rate=10.0, burst=None, max_wait=1.0, overrides=None,
+                 clock=time.time):
+        super(RateLimiter, self).__init__()
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self.overrides = overrides or {}
+        self.clock = clock
+        self.waits = 0
+        self.rejected = 0
+        self._buckets = {}
+        self.logger = log.getChild(self.__class__.__name__)
+
+    def get(self, key):
+        """
+        Retrieve the bucket for `key`.
+
+        :rtype: TokenBucket
+
+        """
+        try:
+            return self._buckets[key]
+        except KeyError:
+            kwargs = {'rate': self.rate, 'burst': self.burst}
+            kwargs.update(self.overrides.get(key, {}))
+            bucket = TokenBucket(clock=self.clock, **kwargs)
+            self._buckets[key] = bucket
+            return bucket
+
+    def acquire(self, key, max_wait=None):
+        """
+        Wait for a token.
+
+        :param key: the host or caller-supplied key
+        :param float max_wait: additional limit on the number of seconds
+            to wait, for example the remaining budget of a deadline
+        :returns: :class:`~tornado.concurrent.Future` that resolves to
+            :data:`True` once the request may be sent or :data:`False`
+            if it was rejected
+
+        """
+        if max_wait is None:
+            max_wait = self.max_wait
+        elif self.max_wait is not None:
+            max_wait = min(max_wait, self.max_wait)
+
+        future = concurrent.Future()
+        wait = self.get(key).reserve(max_wait)
+        if wait is None:
+            self.rejected += 1
+            self.logger.debug('rate limit exceeded for %s', key)
+            future.set_result(False)
+        elif wait > 0:
+            self.waits += 1
+            ioloop.IOLoop.current().call_later(wait, future.set_result, True)
+        else:
+            future.set_result(True)
+        return future
+
+    def observe(self, key, response):
+        """
+        Learn from the headers of a response.
+
+        :param key: the host or caller-supplied key
+        :param tornado.httpclient.HTTPResponse response: the response
+
+        """
+        headers = response.headers
+        if response.code in THROTTLED_CODES:
+            delay = retry.parse_retry_after(headers.get('Retry-After'),
+                                            self.clock())
+            if delay:
+                self.logger.info('pausing requests for %s for %.3fs', key,
+                                 delay)
+                self.get(key).pause(delay)
+
+        for prefix in _HEADER_PREFIXES:
+            remaining = _parse_number(headers.get(prefix + 'Remaining'))
+            if remaining is None:
+                continue
+            limit = _parse_number(headers.get(prefix + 'Limit'))
+            reset = _parse_number(headers.get(prefix + 'Reset'))
+            if reset is not None and reset > 1e9:  # UNIX timestamp
+                reset -= self.clock()
+            self.get(key).learn(limit, remaining, reset)
+            break
+
+    def stats(self):
+        """
+        Retrieve the state of every known key.
+
+        :returns: :class:`dict` mapping key to
+            :meth:`.TokenBucket.stats`
+
+        """
+        return dict((key, bucket.stats())
+                    for key, bucket in self._buckets.items())
@@ -0,0 +1,275 @@
+import logging
+
+from tornado import gen, ioloop
+
+from sprockets.clients.http import (bulkhead, cache, circuit, client,
+                                    compression, content, hedge, metrics,
+                                    pools, ratelimit, resolver, retry,
+                                    scheduler, timeouts)
+
+
+log = logging.getLogger(__name__)
+
+SETTINGS_KEY = 'http_clients'
+"""Application setting that holds the named client configurations."""
+
+POLICIES = (
+    ('retry_policy', retry.RetryPolicy),
+    ('hedging_policy', hedge.HedgingPolicy),
+    ('circuit_breakers', circuit.CircuitBreakers),
+    ('bulkheads', bulkhead.Bulkheads),
+    ('rate_limiter', ratelimit.RateLimiter),
+    ('adaptive_timeouts', timeouts.AdaptiveTimeouts),
+    ('response_cache', cache.ResponseCache),
+    ('metrics', metrics.MetricsRecorder),
+)
+"""Configuration keys that install a policy and the class that is created."""
+
+
+class ClientRegistry(object):
+    """
+    Process-wide cache of long-lived :class:`.HTTPClient` instances.
+
+    Clients are keyed by the :class:`~tornado.ioloop.IOLoop` that they
+    are bound to, a configuration name and the ``dict`` of named
+    configurations that the configuration is read from, usually the
+    ``http_clients`` entry in :attr:`tornado.web.Application.settings`.
+    Applications that share an IO loop therefore get separate clients
+    even if their configurations have the same name:
+
+    .. code-block:: python
+
+       app = web.Application(handlers, http_clients={
+           'default': {'max_clients': 100,
+                       'headers': {'User-Agent': 'my-service/1.0'}},
+           'slow-api': {'max_clients': 5,
+                        'defaults': {'request_timeout': 60}},
+       })
+
+    The ``headers`` value is copied into :attr:`.HTTPClient.headers`.
+    A ``dns_cache`` value installs a
+    :class:`~sprockets.clients.http.resolver.CachingResolver` created
+    with its items as keyword arguments (use ``{}`` for the defaults).
+    ``compression``, ``connection_pools`` and ``content_negotiation``
+    values install a
+    :class:`~sprockets.clients.http.compression.Compression`, a
+    :class:`~sprockets.clients.http.pools.ConnectionPools` and a
+    :class:`~sprockets.clients.http.content.ContentNegotiation`
+    created the same way.  A ``transport`` value is installed as
+    :attr:`.HTTPClient.transport`, for example a
+    :class:`~sprockets.clients.http.transports.LoopbackTransport` that
+    calls a co-located application.  A ``scheduler`` value installs a
+    :class:`~sprockets.clients.http.scheduler.PriorityScheduler` whose
+    ``max_concurrent`` defaults to the configured ``max_clients``.
+    ``max_body_size`` and ``spill_threshold`` set the
+    :attr:`.HTTPClient.max_body_size` and
+    :attr:`.HTTPClient.spill_threshold` limits.
+
+    The request policies are configured the same way: the items of a
+    ``retry_policy``, ``hedging_policy``, ``circuit_breakers``,
+    ``bulkheads``, ``rate_limiter``, ``adaptive_timeouts``,
+    ``response_cache`` or ``metrics`` value are the keyword arguments
+    of the class listed in :data:`POLICIES`, which is installed as
+    the :class:`.HTTPClient` attribute of the same name.  Values that
+    are objects, such as the ``budget`` of a retry policy or the
+    ``sink`` of a metrics recorder, are passed as they are.
+    ``coalesce_requests`` sets :attr:`.HTTPClient.coalesce_requests`.
+
+    .. code-block:: python
+
+       app = web.Application(handlers, http_clients={
+           'default': {
+               'retry_policy': {'max_attempts': 5, 'backoff': 0.2},
+               'circuit_breakers': {'failure_rate': 0.25},
+               'metrics': {'sink': metrics.StatsdSink(), 'prefix': 'api'},
+           },
+       })
+
+    Every other key is passed to the
+    :class:`~tornado.httpclient.AsyncHTTPClient` initializer.  Each
+    named client gets its own ``AsyncHTTPClient`` instance so that
+    connection limits are not shared between configurations.  Since
+    the clients are shared by every handler, configure them here
+    rather than by changing the attributes of a client that is in use.
+
+    Clients are never closed automatically.  The application must call
+    :meth:`.close` (or :func:`.close_clients`) when it shuts down.
+
+    """
+
+    def __init__(self):
+        super(ClientRegistry, self).__init__()
+        self._clients = {}
+        self.logger = log.getChild(self.__class__.__name__)
+
+    def get_client(self, name='default', configurations=None, io_loop=None):
+        """
+        Retrieve the shared client for `name`, creating it if necessary.
+
+        :param str name: name of the client configuration to use
+        :param dict configurations: mapping of configuration name to
+            client configuration.  Each mapping gets its own clients
+            and the configuration is only read when the client is
+            created, so changes to the mapping are not applied to a
+            client that exists.
+        :param tornado.ioloop.IOLoop io_loop: the IO loop that the
+            client is bound to.  If omitted, the current IO loop is
+            used.
+        :returns: a :class:`.HTTPClient` instance
+        :raises: :exc:`ValueError` if `name` is not ``default`` and
+            is not present in `configurations`
+
+        """
+        io_loop = io_loop or ioloop.IOLoop.current()
+        source = None if configurations is None else id(configurations)
+        key = (io_loop, name, source)
+        try:
+            return self._clients[key][0]
+        except KeyError:
+            pass
+
+        configurations = configurations or {}
+        if name not in configurations and name != 'default':
+            raise ValueError('unknown HTTP client configuration '
+                             '{!r}'.format(name))
+
+        config = dict(configurations.get(name) or {})
+        headers = config.pop('headers', None) or {}
+        dns_cache = config.pop('dns_cache', None)
+        transport = config.pop('transport', None)
+        compress = config.pop('compression', None)
+        negotiation = config.pop('content_negotiation', None)
+        connection_pools = config.pop('connection_pools', None)
+        priorities = config.pop('scheduler', None)
+        max_body_size = config.pop('max_body_size', None)
+        spill_threshold = config.pop('spill_threshold', None)
+        coalesce = config.pop('coalesce_requests', False)
+        policies = [(attribute, factory, config.pop(attribute))
+                    for attribute, factory in POLICIES
+                    if attribute in config]
+        self.logger.debug('creating HTTP client %r for %r', name, io_loop)
+        http_client = client.HTTPClient(io_loop=io_loop, force_instance=True,
+                                        **config)
+        http_client.headers.update(headers)
+        if dns_cache is not None:
+            http_client.resolver = resolver.CachingResolver(**dns_cache)
+        if compress is not None:
+            http_client.compression = compression.Compression(**compress)
+        if connection_pools is not None:
+            http_client.connection_pools = pools.ConnectionPools(
+                **connection_pools)
+        if negotiation is not None:
+            http_client.content_negotiation = content.ContentNegotiation(
+                **negotiation)
+        if priorities is not None:
+            priorities = dict(priorities)
+            priorities.setdefault('max_concurrent',
+                                  config.get('max_clients', 10))
+            http_client.scheduler = scheduler.PriorityScheduler(
+                **priorities)
+        http_client.transport = transport
+        http_client.max_body_size = max_body_size
+        http_client.spill_threshold = spill_threshold
+        http_client.coalesce_requests = coalesce
+        for attribute, factory, kwargs in policies:
+            setattr(http_client, attribute, factory(**kwargs))
+        # the configurations are kept so that their id is not reused
+        self._clients[key] = (http_client, configurations)
+        return http_client
+
+    @gen.coroutine
+    def warm_up(self, configurations=None, io_loop=None):
+        """
+        Create the clients that have connection pools and warm them up.
+
+        :param dict configurations: mapping of configuration name to
+            client configuration
+        :param tornado.ioloop.IOLoop io_loop: the IO loop that the
+            clients are bound to.  If omitted, the current IO loop is
+            used.
+        :returns: :class:`dict` that maps each configuration name to
+            the result of :meth:`.HTTPClient.warm_up`
+
+        """
+        names = [name for name, config in (configurations or {}).items()
+                 if config and config.get('connection_pools') is not None]
+        results = yield [
+            self.get_client(name, configurations, io_loop).warm_up()
+            for name in names]
+        raise gen.Return(dict(zip(names, results)))
+
+    def close(self, io_loop=None):
+        """
+        Close and forget clients.
+
+        :param tornado.ioloop.IOLoop io_loop: only close clients that
+            are bound to this IO loop.  If omitted, every client is
+            closed.
+
+        Nothing calls this automatically.  The application must call
+        it when it shuts down, and before an IO loop is closed, so that
+        pooled connections are released.
+
+        """
+        for key in list(self._clients):
+            if io_loop is None or key[0] is io_loop:
+                self.logger.debug('closing HTTP client %r', key[1])
+                self._clients.pop(key)[0].close()
+
+    def __len__(self):
+        return len(self._clients)
+
+
+registry = ClientRegistry()
+"""The process-wide :class:`.ClientRegistry` used by :class:`.ClientMixin`."""
+
+
+def get_client(name='default', settings=None, io_loop=None):
+    """
+    Retrieve a shared client from the process-wide registry.
+
+    :param str name: name of the client configuration to use
+    :param dict settings: application settings that hold the
+        named configurations in the ``http_clients`` key
+    :param tornado.ioloop.IOLoop io_loop: the IO loop that the
+        client is bound to.  Defaults to the current IO loop.
+    :returns: a :class:`.HTTPClient` instance
+
+    """
+    return registry.get_client(name, (settings or {}).get(SETTINGS_KEY),
+                               io_loop=io_loop)
+
+
+def close_clients(io_loop=None):
+    """
+    Close clients in the process-wide registry.
+
+    :param tornado.ioloop.IOLoop io_loop: only close clients that
+        are bound to this IO loop.  If omitted, every client is
+        closed.
+
+    Clients are not closed automatically, so call this when the
+    application shuts down.
+
+    """
+    registry.close(io_loop)
+
+
+def warm_up_clients(settings=None, io_loop=None):
+    """
+    Warm up the clients in the process-wide registry.
+
+    :param dict settings: application settings that hold the
+        named configurations in the ``http_clients`` key
+    :param tornado.ioloop.IOLoop io_loop: the IO loop that the
+        clients are bound to.  Defaults to the current IO loop.
+    :returns: :class:`~tornado.concurrent.Future` that resolves to
+        the result of :meth:`.ClientRegistry.warm_up`
+
+    Call this while an application starts so that connections to the
+    upstreams listed in each ``connection_pools`` configuration are
+    open before the first request arrives.
+
+    """
+    return registry.warm_up((settings or {}).get(SETTINGS_KEY),
+                            io_loop=io_loop)
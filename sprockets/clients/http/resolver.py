@@ -0,0 +1,203 @@
+import collections
+import logging
+import socket
+import time
+
+from tornado import concurrent, gen, ioloop, netutil
+
+
+log = logging.getLogger(__name__)
+
+
+class ResolverEntry(object):
+    """
+    Cached outcome of a single lookup.
+
+    .. attribute:: addresses
+
+       :class:`list` of ``(family, address)`` tuples or :data:`None`
+       when the lookup failed.
+
+    .. attribute:: error
+
+       The exception that the lookup failed with or :data:`None`.
+
+    """
+
+    __slots__ = ('addresses', 'error', 'expires', 'refresh_at')
+
+    def __init__(self, addresses, error, expires, refresh_at):
+        self.addresses = addresses
+        self.error = error
+        self.expires = expires
+        self.refresh_at = refresh_at
+
+
+class CachingResolver(netutil.Resolver):
+    """
+    Resolver that caches lookups from another resolver.
+
+    :param resolver: the :class:`tornado.netutil.Resolver` that
+        performs lookups.  Defaults to the configured Tornado resolver.
+        Any object with a compatible ``resolve`` method can be used.
+    :param float ttl: number of seconds that a successful lookup is
+        cached for.  ``getaddrinfo`` does not report record TTLs so
+        every entry uses this value.
+    :param float negative_ttl: number of seconds that a failed lookup
+        is cached for
+    :param float refresh_ahead: fraction of `ttl` after which a cache
+        hit starts a background refresh of the entry.  Set this to
+        :data:`None` to only resolve again once an entry expires.
+    :param int max_entries: maximum number of cached lookups.  The
+        least recently used entry is evicted when this is exceeded.
+    :param clock: function that returns the current time in seconds
+
+    Assign an instance to :attr:`.HTTPClient.resolver` to install it on
+    the underlying :class:`~tornado.httpclient.AsyncHTTPClient`.  Only
+    the simple client uses a resolver; ``curl`` maintains its own DNS
+    cache.  Concurrent lookups for the same name share a single query
+    and a failed refresh keeps serving the previous addresses until
+    they expire.
+
+    .. attribute:: hits
+
+       Number of lookups answered from the cache.
+
+    .. attribute:: negative_hits
+
+       Number of lookups answered with a cached failure.
+
+    .. attribute:: misses
+
+       Number of lookups that waited for the backend.
+
+    .. attribute:: refreshes
+
+       Number of background refreshes that were started.
+
+    .. attribute:: errors
+
+       Number of backend lookups that failed.
+
+    """
+
+    def initialize(self, resolver=None, ttl=60.0, negative_ttl=5.0,
+                   refresh_ahead=0.8, max_entries=1024, clock=time.time):
+        self.resolver = netutil.Resolver() if resolver is None else resolver
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.refresh_ahead = refresh_ahead
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.errors = 0
+        self._entries = collections.OrderedDict()
+        self._pending = {}
+        self.logger = log.getChild(self.__class__.__name__)
+
+    def close(self):
+        self.resolver.close()
+        self._entries.clear()
+
+    def resolve(self, host, port, family=socket.AF_UNSPEC):
+        """
+        Resolve `host` from the cache or the backend.
+
+        :returns: :class:`~tornado.concurrent.Future` that resolves to
+            a :class:`list` of ``(family, address)`` tuples
+
+        """
+        key = (host, port, family)
+        entry = self._entries.pop(key, None)
+        now = self.clock()
+        if entry is None or entry.expires <= now:
+            self.misses += 1
+            return self._lookup(key)
+
+        self._entries[key] = entry  # most recently used
+        future = concurrent.Future()
+        if entry.error is not None:
+            self.negative_hits += 1
+            future.set_exception(entry.error)
+            return future
+
+        self.hits += 1
+        if (entry.refresh_at is not None and entry.refresh_at <= now and
+                key not in self._pending):
+            self.refreshes += 1
+            self.logger.debug('refreshing %s', host)
+            ioloop.IOLoop.current().add_future(self._lookup(key),
+                                               self._on_refreshed)
+        future.set_result(entry.addresses)
+        return future
+
+    def invalidate(self, host=None):
+        """
+        Discard cached lookups.
+
+        :param str host: only discard lookups for this host.  If
+            omitted, every entry is discarded.
+
+        """
+        for key in list(self._entries):
+            if host is None or key[0] == host:
+                del self._entries[key]
+
+    def stats(self):
+        """
+        Retrieve the cache counters.
+
+        :returns: :class:`dict` with ``hits``, ``negative_hits``,
+            ``misses``, ``refreshes``, ``errors`` and ``entries`` keys
+
+        """
+        return {'hits': self.hits, 'negative_hits': self.negative_hits,
+                'misses': self.misses, 'refreshes': self.refreshes,
+                'errors': self.errors, 'entries': len(self._entries)}
+
+    def _lookup(self, key):
+        future = self._pending.get(key)
+        if future is None:
+            future = self._query(key)
+            if not future.done():
+                self._pending[key] = future
+        return future
+
+    @staticmethod
+    def _on_refreshed(future):
+        future.exception()  # failures are logged by _query
+
+    @gen.coroutine
+    def _query(self, key):
+        try:
+            addresses = yield self.resolver.resolve(*key)
+        except Exception as error:
+            self.errors += 1
+            self.logger.debug('failed to resolve %s: %s', key[0], error)
+            now = self.clock()
+            entry = self._entries.get(key)
+            if (entry is None or entry.error is not None or
+                    entry.expires <= now):
+                self._store(key, ResolverEntry(
+                    None, error, now + self.negative_ttl, None))
+            elif entry.refresh_at is not None:
+                entry.refresh_at = now + self.negative_ttl
+            raise
+        finally:
+            self._pending.pop(key, None)
+
+        now = self.clock()
+        refresh_at = (None if self.refresh_ahead is None
+                      else now + self.ttl * self.refresh_ahead)
+        self._store(key, ResolverEntry(addresses, None, now + self.ttl,
+                                       refresh_at))
+        raise gen.Return(addresses)
+
+    def _store(self, key, entry):
+        self._entries.pop(key, None)
+        self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -0,0 +1,203 @@
+import collections
+import email.utils
+import random
+import time
+
+
+IDEMPOTENT_METHODS = frozenset(['DELETE', 'GET', 'HEAD', 'OPTIONS', 'PUT',
+                                'TRACE'])
+"""HTTP methods that are safe to repeat (:rfc:`7231#section-4.2.2`)."""
+
+RETRYABLE_CODES = frozenset([502, 503, 504, 599])
+"""Status codes that indicate a transient failure."""
+
+
+Attempt = collections.namedtuple('Attempt',
+                                 ['code', 'reason', 'duration', 'delay'])
+"""
+Record of a single failed attempt.
+
+.. py:attribute:: code
+
+   Status code of the failure.
+
+.. py:attribute:: reason
+
+   Reason phrase of the failure.
+
+.. py:attribute:: duration
+
+   Number of seconds that the attempt took.
+
+.. py:attribute:: delay
+
+   Number of seconds waited before the next attempt or :data:`None`
+   if the attempt was not retried.
+
+"""
+
+
+def parse_retry_after(value, now=None):
+    """
+    Parse a ``Retry-After`` header value.
+
+    :param str value: the header value.  This is either a number of
+        seconds or a HTTP date.
+    :param float now: the current UNIX timestamp.  Defaults to
+        :func:`time.time`.
+    :returns: the number of seconds to wait or :data:`None` if
+        `value` cannot be parsed
+    :rtype: float
+
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parsed = email.utils.parsedate_tz(value)
+    if parsed is None:
+        return None
+    now = time.time() if now is None else now
+    return max(0.0, email.utils.mktime_tz(parsed) - now)
+
+
+class RetryBudget(object):
+    """
+    Token bucket that limits the ratio of retries to requests.
+
+    :param float ratio: number of tokens deposited for each request
+        that is sent.  A ratio of ``0.2`` allows one retry for every
+        five requests once the initial tokens are spent.
+    :param float capacity: maximum number of tokens in the bucket
+    :param float initial: number of tokens in the bucket when it is
+        created.  Defaults to `capacity`.
+
+    A retry is only made when a whole token can be withdrawn from the
+    bucket.  When an upstream is failing every request, the budget
+    drains quickly and retries stop instead of multiplying the load
+    on the failing upstream.
+
+    """
+
+    def __init__(self, ratio=0.2, capacity=10.0, initial=None):
+        super(RetryBudget, self).__init__()
+        self.ratio = ratio
+        self.capacity = capacity
+        self.tokens = capacity if initial is None else initial
+
+    def deposit(self):
+        """Record that a request is being sent."""
+        self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def withdraw(self):
+        """
+        Attempt to spend a token on a retry.
+
+        :returns: :data:`True` if the retry is allowed
+        :rtype: bool
+
+        """
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class RetryPolicy(object):
+    """
+    Decides whether and when a failed request is retried.
+
+    :param int max_attempts: maximum number of attempts including
+        the initial one
+    :param codes: status codes that are retried.  Defaults to
+        :data:`.RETRYABLE_CODES`.
+    :param methods: HTTP methods that are retried.  Defaults to
+        :data:`.IDEMPOTENT_METHODS`.
+    :param float backoff: delay in seconds before the first retry.
+        The delay doubles after each attempt.
+    :param float max_delay: upper bound on the delay in seconds.  A
+        ``Retry-After`` value that exceeds this stops the retries.
+    :param bool jitter: randomize the delay between zero and the
+        computed backoff ("full jitter") so that retries from many
+        clients are spread out.
+    :param bool respect_retry_after: honor the ``Retry-After``
+        response header when it is present
+    :param float max_elapsed: do not start an attempt if it would
+        begin more than this many seconds after the first attempt
+    :param RetryBudget budget: optional budget shared by every
+        request that uses this policy
+
+    """
+
+    def __init__(self, max_attempts=3, codes=None, methods=None,
+                 backoff=0.1, max_delay=10.0, jitter=True,
+                 respect_retry_after=True, max_elapsed=None, budget=None):
+        super(RetryPolicy, self).__init__()
+        self.max_attempts = max_attempts
+        self.codes = frozenset(RETRYABLE_CODES if codes is None else codes)
+        self.methods = frozenset(m.upper() for m in
+                                 (IDEMPOTENT_METHODS if methods is None
+                                  else methods))
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.respect_retry_after = respect_retry_after
+        self.max_elapsed = max_elapsed
+        self.budget = budget
+
+    def request_started(self):
+        """Called once when a request is first sent."""
+        if self.budget is not None:
+            self.budget.deposit()
+
+    def compute_backoff(self, attempt):
+        """
+        Calculate the backoff after `attempt` failed attempts.
+
+        :param int attempt: number of attempts made so far
+        :rtype: float
+
+        """
+        delay = min(self.max_delay, self.backoff * (2 ** (attempt - 1)))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def get_retry_delay(self, request, error, attempt, elapsed):
+        """
+        Decide whether `request` should be retried.
+
+        :param tornado.httpclient.HTTPRequest request: the request
+            that failed
+        :param sprockets.clients.http.client.HTTPError error: the
+            failure
+        :param int attempt: number of attempts made so far
+        :param float elapsed: seconds since the first attempt started
+        :returns: the number of seconds to wait before retrying or
+            :data:`None` if the request should not be retried
+
+        """
+        if attempt >= self.max_attempts:
+            return None
+        if error.code not in self.codes:
+            return None
+        if request.method.upper() not in self.methods:
+            return None
+
+        delay = self.compute_backoff(attempt)
+        if self.respect_retry_after and error.response is not None:
+            retry_after = parse_retry_after(
+                error.response.headers.get('Retry-After'))
+            if retry_after is not None:
+                if retry_after > self.max_delay:
+                    return None
+                delay = max(delay, retry_after)
+
+        if (self.max_elapsed is not None and
+                elapsed + delay > self.max_elapsed):
+            return None
+        if self.budget is not None and not self.budget.withdraw():
+            return None
+        return delay
@@ -0,0 +1,221 @@
+import collections
+import logging
+
+from tornado import concurrent, ioloop
+
+from sprockets.clients.http import stats
+
+
+log = logging.getLogger(__name__)
+
+DEFAULT_WEIGHTS = {'high': 8, 'normal': 4, 'low': 1}
+"""Priority weights used when :class:`.PriorityScheduler` is not given any."""
+
+
+class _PriorityQueue(object):
+
+    def __init__(self, name, weight, window):
+        self.name = name
+        self.weight = weight
+        self.waiters = collections.deque()
+        self.credit = 0
+        self.dispatched = 0
+        self.starved = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.wait_times = stats.LatencyWindow(window)
+
+    def record_wait(self, wait_time):
+        self.dispatched += 1
+        self.total_wait_time += wait_time
+        self.max_wait_time = max(self.max_wait_time, wait_time)
+        self.wait_times.add(wait_time)
+
+
+class PriorityScheduler(object):
+    """
+    Dispatches requests from per-priority queues.
+
+    :param int max_concurrent: number of requests that may be in
+        flight at the same time.  Keep this at or below the
+        ``max_clients`` of the underlying client so that requests never
+        wait in its first-in, first-out queue.
+    :param dict weights: mapping of priority name to its relative
+        share of the dispatched requests.  Defaults to
+        :data:`DEFAULT_WEIGHTS`.
+    :param str default_priority: priority of requests that do not
+        specify one
+    :param float starvation_timeout: seconds after which a waiting
+        request is dispatched ahead of every other priority.
+        :data:`None` disables starvation protection.
+    :param int window: number of recent queue wait times to keep for
+        each priority
+
+    Assign an instance to :attr:`.HTTPClient.scheduler` and pass the
+    ``priority`` keyword to :meth:`.HTTPClient.send_request` (or
+    :meth:`.ClientMixin.make_http_request`) so that latency-critical
+    calls are not stuck behind background work when the client is
+    saturated.
+
+    Requests are sent immediately while fewer than `max_concurrent`
+    are in flight.  Once the limit is reached, each free slot goes to
+    the next priority chosen by smooth weighted round-robin: with the
+    default weights, eight ``high`` requests are dispatched for every
+    four ``normal`` and one ``low`` request while all three are
+    waiting.  A request that has waited for `starvation_timeout` is
+    dispatched first regardless of its priority so that low priorities
+    always make progress.
+
+    A waiting request gives up after its ``request_timeout`` (or
+    ``connect_timeout`` if that is shorter) with a
+    :class:`~sprockets.clients.http.client.QueueTimeoutError`, like
+    requests waiting in the queue of
+    :class:`~tornado.simple_httpclient.SimpleAsyncHTTPClient`.
+    Since the client limits both timeouts to the remaining
+    :class:`~sprockets.clients.http.deadline.Deadline`, a request never
+    waits beyond its deadline.
+
+    .. attribute:: active
+
+       Number of requests that currently hold a slot.
+
+    """
+
+    def __init__(self, max_concurrent=10, weights=None,
+                 default_priority='normal', starvation_timeout=1.0,
+                 window=1000):
+        super(PriorityScheduler, self).__init__()
+        weights = DEFAULT_WEIGHTS if weights is None else weights
+        if default_priority not in weights:
+            raise ValueError('default priority {!r} has no '
+                             'weight'.format(default_priority))
+        self.max_concurrent = max_concurrent
+        self.default_priority = default_priority
+        self.starvation_timeout = starvation_timeout
+        self.active = 0
+        self._queues = dict((name, _PriorityQueue(name, weight, window))
+                            for name, weight in weights.items())
+        # highest weight first so that ties favour important requests
+        self._order = sorted(self._queues.values(),
+                             key=lambda queue: (-queue.weight, queue.name))
+        self.logger = log.getChild(self.__class__.__name__)
+
+    @property
+    def queued(self):
+        """Number of requests waiting for a slot."""
+        return sum(len(queue.waiters) for queue in self._order)
+
+    def _get_queue(self, priority):
+        if priority is None:
+            priority = self.default_priority
+        try:
+            return self._queues[priority]
+        except KeyError:
+            raise ValueError('unknown priority {!r}'.format(priority))
+
+    def check_priority(self, priority):
+        """
+        Ensure that requests can be dispatched with `priority`.
+
+        :raises: :exc:`ValueError` if `priority` is unknown
+
+        """
+        self._get_queue(priority)
+
+    def acquire(self, priority=None, timeout=None):
+        """
+        Wait for a slot.
+
+        :param str priority: priority of the request.  Defaults to
+            the `default_priority`.
+        :param float timeout: number of seconds to wait for a slot.
+            :data:`None` waits as long as necessary.
+        :returns: :class:`~tornado.concurrent.Future` that resolves to
+            :data:`True` when a slot was acquired or :data:`False` if
+            the timeout expired first.  A slot must be returned by
+            calling :meth:`.release`.
+        :raises: :exc:`ValueError` if `priority` is unknown
+
+        """
+        queue = self._get_queue(priority)
+        future = concurrent.Future()
+        if self.active < self.max_concurrent and not self.queued:
+            self.active += 1
+            queue.record_wait(0.0)
+            future.set_result(True)
+            return future
+        io_loop = ioloop.IOLoop.current()
+        waiter = [future, io_loop.time(), None]
+        if timeout is not None:
+            waiter[2] = io_loop.call_later(timeout, self._expire, queue,
+                                           waiter)
+        queue.waiters.append(waiter)
+        return future
+
+    def _expire(self, queue, waiter):
+        try:
+            queue.waiters.remove(waiter)
+        except ValueError:
+            return
+        if not queue.waiters:
+            queue.credit = 0
+        waiter[0].set_result(False)
+
+    def release(self):
+        """Return a slot acquired by :meth:`.acquire`."""
+        queue = self._next_queue()
+        if queue is None:
+            self.active -= 1
+            return
+        future, queued_at, timeout = queue.waiters.popleft()
+        if not queue.waiters:
+            queue.credit = 0
+        io_loop = ioloop.IOLoop.current()
+        if timeout is not None:
+            io_loop.remove_timeout(timeout)
+        queue.record_wait(io_loop.time() - queued_at)
+        future.set_result(True)
+
+    def _next_queue(self):
+        waiting = [queue for queue in self._order if queue.waiters]
+        if not waiting:
+            return None
+
+        if self.starvation_timeout is not None:
+            now = ioloop.IOLoop.current().time()
+            oldest = min(waiting, key=lambda queue: queue.waiters[0][1])
+            if now - oldest.waiters[0][1] >= self.starvation_timeout:
+                oldest.starved += 1
+                return oldest
+
+        total = 0
+        selected = None
+        for queue in waiting:
+            queue.credit += queue.weight
+            total += queue.weight
+            if selected is None or queue.credit > selected.credit:
+                selected = queue
+        selected.credit -= total
+        return selected
+
+    def stats(self):
+        """
+        Retrieve queue statistics for each priority.
+
+        :returns: :class:`dict` mapping each priority to a :class:`dict`
+            with ``queued``, ``dispatched``, ``starved``,
+            ``mean_wait_time``, ``p50_wait_time``, ``p99_wait_time``
+            and ``max_wait_time`` keys.  ``starved`` counts requests
+            that were dispatched by starvation protection.
+
+        """
+        return dict((queue.name, {
+            'queued': len(queue.waiters),
+            'dispatched': queue.dispatched,
+            'starved': queue.starved,
+            'mean_wait_time': (queue.total_wait_time / queue.dispatched
+                               if queue.dispatched else 0.0),
+            'p50_wait_time': queue.wait_times.percentile(50),
+            'p99_wait_time': queue.wait_times.percentile(99),
+            'max_wait_time': queue.max_wait_time,
+        }) for queue in self._order)
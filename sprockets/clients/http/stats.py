@@ -0,0 +1,52 @@
+import collections
+import math
+
+
+class LatencyWindow(object):
+    """
+    Rolling window of the most recent latency samples.
+
+    :param int size: number of samples to keep
+    :param int refresh: number of new samples after which the sorted
+        view used by :meth:`.percentile` is rebuilt.  Defaults to a
+        tenth of `size`.
+
+    Percentiles are calculated from a sorted copy of the window that
+    is only rebuilt every `refresh` samples.  This keeps the cost of
+    recording a sample constant at the expense of percentiles lagging
+    slightly behind the most recent samples.
+
+    """
+
+    def __init__(self, size=1000, refresh=None):
+        super(LatencyWindow, self).__init__()
+        self.refresh = max(1, size // 10 if refresh is None else refresh)
+        self._samples = collections.deque(maxlen=size)
+        self._sorted = []
+        self._stale = 0
+
+    def add(self, value):
+        """Record a latency sample in seconds."""
+        self._samples.append(value)
+        self._stale += 1
+
+    def percentile(self, percent):
+        """
+        Calculate a percentile of the samples.
+
+        :param float percent: the percentile to calculate, for example
+            ``99`` for the 99th percentile
+        :returns: the latency in seconds or :data:`None` if there are
+            no samples
+
+        """
+        if self._stale >= self.refresh or len(self._sorted) == 0:
+            self._sorted = sorted(self._samples)
+            self._stale = 0
+        if not self._sorted:
+            return None
+        rank = int(math.ceil(percent / 100.0 * len(self._sorted))) - 1
+        return self._sorted[max(0, min(rank, len(self._sorted) - 1))]
+
+    def __len__(self):
+        return len(self._samples)
@@ -0,0 +1,223 @@
+import collections
+import logging
+
+from tornado import concurrent, httpclient, httputil, ioloop
+
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_BUFFER_SIZE = 10 * 1024 * 1024
+"""Default high-water mark of :meth:`.HTTPClient.stream_request`."""
+
+
+HOP_BY_HOP_HEADERS = frozenset(['connection', 'keep-alive',
+                                'proxy-authenticate', 'proxy-authorization',
+                                'te', 'trailer', 'transfer-encoding',
+                                'upgrade'])
+"""Headers that apply to a single connection and are not proxied."""
+
+REDIRECT_CODES = frozenset([301, 302, 303, 307, 308])
+
+
+class ResponseStream(object):
+    """
+    A response whose body is delivered in chunks as it arrives.
+
+    :param chunk_callback: optional function that is called with each
+        body chunk.  When this is set, chunks are not buffered and
+        :meth:`.next` is not used.
+    :param int max_buffer_size: high-water mark of the bytes that
+        have been received but not consumed yet or :data:`None` for
+        no limit
+
+    Instances are created by :meth:`.HTTPClient.stream_request`.  The
+    status line and headers are available once :meth:`.headers_received`
+    resolves.  The body is then consumed with :meth:`.done` and
+    :meth:`.next`:
+
+    .. code-block:: python
+
+       stream = http_client.stream_request('GET', 'http', 'example.com')
+       yield stream.headers_received()
+       while not stream.done():
+           chunk = yield stream.next()
+           if chunk is not None:
+               output.write(chunk)
+
+    Tornado reads the upstream body as fast as it arrives and offers no
+    way to pause the transfer, so memory is bounded by how quickly
+    chunks are consumed.  :attr:`.buffered` reports the number of bytes
+    that are waiting to be consumed.  When it exceeds `max_buffer_size`
+    the buffered chunks are released and the stream fails with an
+    error created by :attr:`.make_error` whose status code is ``599``
+    and reason is ``Stream Buffer Full``.  The rest of the body is
+    discarded as it arrives.
+
+    .. attribute:: make_error
+
+       Function that is called with a status code and reason to create
+       the exception that the stream fails with.  This is a
+       :class:`~tornado.httpclient.HTTPError` by default.
+       :meth:`.HTTPClient.stream_request` replaces it so that the
+       stream fails with a :class:`.HTTPError` for the request that
+       was sent.
+
+    .. attribute:: code
+
+       Status code of the response once the headers are received.
+
+    .. attribute:: reason
+
+       Reason phrase of the response once the headers are received.
+
+    .. attribute:: headers
+
+       :class:`tornado.httputil.HTTPHeaders` of the response.
+
+    """
+
+    def __init__(self, chunk_callback=None, max_buffer_size=None):
+        super(ResponseStream, self).__init__()
+        self.chunk_callback = chunk_callback
+        self.max_buffer_size = max_buffer_size
+        self.code = None
+        self.reason = None
+        self.headers = httputil.HTTPHeaders()
+        self.buffered = 0
+        self.make_error = httpclient.HTTPError
+        self._headers_future = concurrent.Future()
+        self._complete = concurrent.Future()
+        self._chunks = collections.deque()
+        self._waiter = None
+        self.logger = log.getChild(self.__class__.__name__)
+
+    def attach(self, future):
+        """
+        Follow the request future returned by ``send_request``.
+
+        :param tornado.concurrent.Future future: future that resolves
+            when the response is complete
+
+        """
+        ioloop.IOLoop.current().add_future(future, self._on_complete)
+
+    def on_header_line(self, line):
+        """``header_callback`` for :class:`tornado.httpclient.HTTPRequest`"""
+        if line.startswith('HTTP/'):
+            start_line = httputil.parse_response_start_line(line.strip())
+            self.code, self.reason = start_line.code, start_line.reason
+            self.headers = httputil.HTTPHeaders()
+        elif line.strip():
+            self.headers.parse_line(line)
+        elif self.code is not None and not self._headers_future.done():
+            # curl reports interim and redirect responses as well
+            if self.code < 200 or (self.code in REDIRECT_CODES and
+                                   'Location' in self.headers):
+                return
+            self._headers_future.set_result(self)
+
+    def on_chunk(self, chunk):
+        """``streaming_callback`` for :class:`tornado.httpclient.HTTPRequest`"""
+        if self._complete.done():
+            return  # the stream failed, discard the rest of the body
+        if self.chunk_callback is not None:
+            self.chunk_callback(chunk)
+        elif self._waiter is not None:
+            waiter, self._waiter = self._waiter, None
+            waiter.set_result(chunk)
+        else:
+            self._chunks.append(chunk)
+            self.buffered += len(chunk)
+            if (self.max_buffer_size is not None and
+                    self.buffered > self.max_buffer_size):
+                self._overflow()
+
+    def _overflow(self):
+        self.logger.warning('%d unconsumed bytes exceed the buffer size '
+                            'of %d, failing the stream', self.buffered,
+                            self.max_buffer_size)
+        self._chunks.clear()
+        self.buffered = 0
+        self._complete.set_exception(
+            self.make_error(599, 'Stream Buffer Full'))
+        self._complete.exception()  # reported by next() and complete()
+
+    def _on_complete(self, future):
+        error = future.exception()
+        if self._complete.done():
+            return  # failed when the buffer overflowed
+        if error is not None:
+            self._complete.set_exc_info(future.exc_info())
+            self._complete.exception()  # reported by the other futures
+        else:
+            self._complete.set_result(future.result())
+        if not self._headers_future.done():
+            if error is not None and self.code is None:
+                self._headers_future.set_exc_info(future.exc_info())
+            else:
+                self._headers_future.set_result(self)
+        if self._waiter is not None:
+            waiter, self._waiter = self._waiter, None
+            if self._is_transport_failure(error):
+                waiter.set_exc_info(future.exc_info())
+            else:
+                waiter.set_result(None)
+
+    def _is_transport_failure(self, error):
+        return (error is not None and
+                getattr(error, 'code', None) != self.code)
+
+    def headers_received(self):
+        """
+        Wait for the status line and headers.
+
+        :returns: :class:`~tornado.concurrent.Future` that resolves to
+            this instance.  It raises the request failure if the
+            request failed before a response was received.
+
+        """
+        return self._headers_future
+
+    def done(self):
+        """Has every chunk been consumed?"""
+        return (not self._chunks and self._waiter is None and
+                self._complete.done())
+
+    def next(self):
+        """
+        Wait for the next body chunk.
+
+        :returns: :class:`~tornado.concurrent.Future` that resolves to
+            the next chunk or :data:`None` if the stream ended while
+            waiting.  It raises the request failure if the connection
+            failed part way through the body.
+
+        """
+        if self._waiter is not None:
+            raise ValueError('next() called while already waiting')
+        future = concurrent.Future()
+        if self._chunks:
+            chunk = self._chunks.popleft()
+            self.buffered -= len(chunk)
+            future.set_result(chunk)
+        elif self._complete.done():
+            error = self._complete.exception()
+            if self._is_transport_failure(error):
+                future.set_exc_info(self._complete.exc_info())
+            else:
+                future.set_result(None)
+        else:
+            self._waiter = future
+        return future
+
+    def complete(self):
+        """
+        Wait for the response to complete.
+
+        :returns: :class:`~tornado.concurrent.Future` that resolves to
+            the :class:`~tornado.httpclient.HTTPResponse` (without a
+            body) or raises a :class:`.HTTPError`.  It raises as soon
+            as the buffer overflows without waiting for the transfer.
+
+        """
+        return self._complete
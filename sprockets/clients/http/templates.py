@@ -0,0 +1,121 @@
+import string
+try:
+    from urllib import parse
+except ImportError:
+    import urllib as parse
+
+
+_formatter = string.Formatter()
+
+
+class RequestTemplate(object):
+    """
+    A request whose URL and headers are prepared ahead of time.
+
+    Instances are created by :meth:`.HTTPClient.template`.  The URL
+    prefix, the quoted static path elements and the merged headers are
+    computed once.  Calling the template formats the variable path
+    elements and sends the request:
+
+    .. code-block:: python
+
+       get_user = http_client.template('GET', 'https', 'api.example.com',
+                                       'users', '{user_id}',
+                                       request_timeout=5)
+       response = yield get_user(user_id=42)
+
+    Keyword arguments that name a replacement field are used as path
+    values and the others are passed to :meth:`.HTTPClient.send_request`,
+    overriding the template defaults.  The port is fixed when the
+    template is created and the :attr:`.HTTPClient.headers` are copied
+    at that time, so later changes to them are not reflected.
+
+    .. attribute:: fields
+
+       Names of the replacement fields in the path.
+
+    .. attribute:: headers
+
+       :class:`tornado.httputil.HTTPHeaders` that are sent with each
+       request.
+
+    """
+
+    def __init__(self, http_client, method, scheme, host, path_pattern,
+                 defaults):
+        super(RequestTemplate, self).__init__()
+        self.http_client = http_client
+        self.method = method
+        self.scheme = scheme
+        self.host = host
+        self.defaults = dict(defaults)
+        self.port = self.defaults.pop('port', None)
+        if host in http_client.upstreams:
+            self.port = None
+        self.headers = http_client.headers.copy()
+        self.headers.update(self.defaults.pop('headers', None) or {})
+
+        netloc = host if self.port is None else '{}:{}'.format(host,
+                                                               self.port)
+        static = '{}://{}/'.format(scheme, netloc)
+        self.fields = []
+        self._parts = []
+        for index, segment in enumerate(path_pattern):
+            segment = str(segment)
+            if index:
+                static += '/'
+            names = [name for _, name, _, _ in _formatter.parse(segment)
+                     if name is not None]
+            if names:
+                self.fields.extend(names)
+                self._parts.append((static, segment))
+                static = ''
+            else:
+                static += parse.quote(segment, safe='')
+        self._suffix = static
+
+    def url(self, **values):
+        """
+        Format the URL for a set of path values.
+
+        :raises: :exc:`TypeError` if a path value is missing
+
+        """
+        try:
+            parts = [static + parse.quote(segment.format(**values), safe='')
+                     for static, segment in self._parts]
+        except KeyError as error:
+            raise TypeError('missing path value {}'.format(error))
+        parts.append(self._suffix)
+        return ''.join(parts)
+
+    def __call__(self, **kwargs):
+        """
+        Send the request.
+
+        :param kwargs: path values and :meth:`.HTTPClient.send_request`
+            keyword arguments
+        :returns: :class:`tornado.concurrent.Future` that resolves to
+            a :class:`tornado.httpclient.HTTPResponse` instance
+
+        """
+        values = {}
+        for name in self.fields:
+            if name in kwargs:
+                values[name] = kwargs.pop(name)
+        target = self.url(**values)
+
+        if self.defaults:
+            options = dict(self.defaults)
+            options.update(kwargs)
+        else:
+            options = kwargs
+        if 'headers' in options:
+            headers = self.headers.copy()
+            headers.update(options['headers'])
+            options['headers'] = headers
+        else:
+            options['headers'] = self.headers
+        return self.http_client._send_request(self.method, self.scheme,
+                                              self.host, self.port, target,
+                                              options)
@@ -0,0 +1,118 @@
+from sprockets.clients.http import stats
+
+
+class AdaptiveTimeouts(object):
+    """
+    Derives request timeouts from the observed latency of each upstream.
+
+    :param float percentile: latency percentile that the timeout is
+        based on
+    :param float multiplier: the timeout is the percentile latency
+        multiplied by this value
+    :param float floor: smallest timeout in seconds
+    :param float ceiling: largest timeout in seconds
+    :param int min_samples: number of samples that must be observed
+        for a host and method before an adaptive timeout is used
+    :param int window: number of recent samples to keep for each host
+        and method
+
+    Assign an instance to :attr:`.HTTPClient.adaptive_timeouts` to set
+    the ``request_timeout`` of requests that do not set one explicitly.
+    Latency is tracked separately for each host and HTTP method.
+    Until `min_samples` responses have been observed, the client's
+    default timeout is used.
+
+    The latency of a request that times out is not known, only that it
+    is at least the timeout.  Timeouts are recorded as samples at the
+    timeout value and each consecutive timeout doubles the timeout
+    (up to `ceiling`) so that the client recovers when the latency of
+    an upstream steps above the learned timeout instead of failing
+    every request.  The first response resets the doubling.
+
+    """
+
+    def __init__(self, percentile=99, multiplier=2.0, floor=0.1,
+                 ceiling=30.0, min_samples=20, window=1000):
+        super(AdaptiveTimeouts, self).__init__()
+        if floor > ceiling:
+            raise ValueError('floor must not be larger than ceiling')
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self.floor = floor
+        self.ceiling = ceiling
+        self.min_samples = min_samples
+        self.window = window
+        self._latencies = {}
+        self._timeouts = {}
+
+    def get_timeout(self, method, upstream):
+        """
+        Calculate the timeout for a request.
+
+        :param str method: HTTP method of the request
+        :param tuple upstream: ``(scheme, host, port)`` of the upstream
+        :returns: timeout in seconds or :data:`None` if not enough
+            samples have been observed
+
+        """
+        window = self._latencies.get((upstream[1], method))
+        if window is None or len(window) < self.min_samples:
+            return None
+        timeout = max(self.floor,
+                      window.percentile(self.percentile) * self.multiplier)
+        timeout *= 2 ** min(self._timeouts.get((upstream[1], method), 0),
+                            32)
+        return min(self.ceiling, timeout)
+
+    def record(self, method, upstream, latency):
+        """
+        Record the latency of a response.
+
+        :param str method: HTTP method of the request
+        :param tuple upstream: ``(scheme, host, port)`` of the upstream
+        :param float latency: seconds that the response took
+
+        """
+        key = (upstream[1], method)
+        self._timeouts.pop(key, None)
+        self._add(key, latency)
+
+    def record_timeout(self, method, upstream, timeout):
+        """
+        Record a request that timed out.
+
+        :param str method: HTTP method of the request
+        :param tuple upstream: ``(scheme, host, port)`` of the upstream
+        :param float timeout: seconds after which the request was
+            abandoned
+
+        """
+        key = (upstream[1], method)
+        self._timeouts[key] = self._timeouts.get(key, 0) + 1
+        self._add(key, timeout)
+
+    def _add(self, key, latency):
+        try:
+            window = self._latencies[key]
+        except KeyError:
+            window = self._latencies[key] = stats.LatencyWindow(self.window)
+        window.add(latency)
+
+    def stats(self):
+        """
+        Retrieve the effective timeouts.
+
+        :returns: :class:`dict` mapping ``(host, method)`` to a
+            :class:`dict` with ``samples``, ``latency`` (the configured
+            percentile), ``timeout`` and ``consecutive_timeouts`` keys.
+            ``timeout`` is :data:`None` until enough samples have been
+            observed.
+
+        """
+        return dict(
+            ((host, method),
+             {'samples': len(window),
+              'latency': window.percentile(self.percentile),
+              'timeout': self.get_timeout(method, (None, host, None)),
+              'consecutive_timeouts': self._timeouts.get((host, method), 0)})
+            for (host, method), window in self._latencies.items())
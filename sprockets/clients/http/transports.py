@@ -0,0 +1,205 @@
+import io
+import logging
+import time
+try:
+    from urllib import parse
+except ImportError:
+    import urlparse as parse
+
+from tornado import concurrent, gen, httpclient, httputil, ioloop
+
+
+log = logging.getLogger(__name__)
+
+
+def _done(result=None):
+    future = concurrent.Future()
+    future.set_result(result)
+    return future
+
+
+class _LoopbackContext(object):
+
+    def __init__(self, protocol):
+        self.remote_ip = '127.0.0.1'
+        self.protocol = protocol
+
+
+class _LoopbackConnection(object):
+    """
+    The server side of a loopback request.
+
+    Implements the parts of :class:`tornado.httputil.HTTPConnection`
+    that :class:`tornado.web.RequestHandler` uses and assembles the
+    response that the handler writes.
+
+    """
+
+    def __init__(self, request, on_finish):
+        self.request = request
+        self.context = _LoopbackContext(parse.urlsplit(request.url).scheme)
+        self.code = None
+        self.reason = None
+        self.headers = None
+        self.chunks = []
+        self._on_finish = on_finish
+        self._close_callback = None
+        self.abandoned = False
+
+    def set_close_callback(self, callback):
+        self._close_callback = callback
+
+    def abandon(self):
+        """The client stopped waiting, for example after a timeout."""
+        self.abandoned = True
+        if self._close_callback is not None:
+            callback, self._close_callback = self._close_callback, None
+            callback()
+
+    def write_headers(self, start_line, headers, chunk=None, callback=None):
+        self.code, self.reason = start_line.code, start_line.reason
+        self.headers = headers
+        header_callback = self.request.header_callback
+        if header_callback is not None and not self.abandoned:
+            header_callback('HTTP/1.1 {} {}\r\n'.format(self.code,
+                                                        self.reason))
+            for name, value in headers.get_all():
+                header_callback('{}: {}\r\n'.format(name, value))
+            header_callback('\r\n')
+        return self.write(chunk, callback)
+
+    def write(self, chunk, callback=None):
+        if chunk and not self.abandoned:
+            if self.request.streaming_callback is not None:
+                self.request.streaming_callback(chunk)
+            else:
+                self.chunks.append(chunk)
+        if callback is not None:
+            callback()
+        return _done()
+
+    def finish(self):
+        self._on_finish(self)
+
+
+class LoopbackTransport(object):
+    """
+    Transport that dispatches requests straight into an application.
+
+    :param tornado.web.Application application: the application that
+        handles every request, regardless of the host in the URL
+    :param tornado.ioloop.IOLoop io_loop: the IO loop that requests run
+        on.  Defaults to the current IO loop.
+
+    Assign an instance to :attr:`.HTTPClient.transport` to call a
+    co-located application without a socket or HTTP serialization.
+    Requests still pass through the application's routing, handlers and
+    output transforms, so handlers behave as they do behind a server.
+    Request bodies (including ``body_producer``), ``header_callback``,
+    ``streaming_callback`` and ``request_timeout`` are supported.
+    Redirects are returned to the caller instead of being followed and
+    responses are not decompressed.
+
+    A transport is any object with this interface:
+
+    - ``fetch(request)`` returns a :class:`~tornado.concurrent.Future`
+      that resolves to a :class:`~tornado.httpclient.HTTPResponse` or
+      raises :class:`tornado.httpclient.HTTPError` for responses that
+      are not successful, as
+      :meth:`tornado.httpclient.AsyncHTTPClient.fetch` does
+    - ``io_loop`` is the :class:`~tornado.ioloop.IOLoop` that requests
+      run on
+    - ``defaults`` is a :class:`dict` of default request options such
+      as ``request_timeout``
+    - ``close()`` releases resources
+
+    :class:`tornado.httpclient.AsyncHTTPClient` is the default
+    transport.
+
+    """
+
+    def __init__(self, application, io_loop=None):
+        super(LoopbackTransport, self).__init__()
+        self.application = application
+        self.io_loop = io_loop or ioloop.IOLoop.current()
+        self.defaults = {'connect_timeout': 20.0, 'request_timeout': 20.0}
+        self.logger = log.getChild(self.__class__.__name__)
+
+    def close(self):
+        pass
+
+    def fetch(self, request):
+        """
+        Dispatch `request` to the application.
+
+        :param tornado.httpclient.HTTPRequest request: the request
+        :returns: :class:`~tornado.concurrent.Future` that resolves to
+            a :class:`~tornado.httpclient.HTTPResponse`
+
+        """
+        future = concurrent.Future()
+        started = time.time()
+        timeout = request.request_timeout or self.defaults['request_timeout']
+
+        def on_finish(connection):
+            if future.done():
+                return
+            self.io_loop.remove_timeout(timeout_handle)
+            response = httpclient.HTTPResponse(
+                request, connection.code, reason=connection.reason,
+                headers=connection.headers,
+                buffer=io.BytesIO(b''.join(connection.chunks)),
+                effective_url=request.url,
+                request_time=time.time() - started)
+            if response.error is not None:
+                future.set_exception(response.error)
+            else:
+                future.set_result(response)
+
+        connection = _LoopbackConnection(request, on_finish)
+
+        def on_timeout():
+            if not future.done():
+                connection.abandon()
+                future.set_exception(httpclient.HTTPError(599, 'Timeout'))
+
+        timeout_handle = self.io_loop.call_later(timeout, on_timeout)
+        self.io_loop.add_callback(self._dispatch, request, connection,
+                                  future)
+        return future
+
+    @gen.coroutine
+    def _dispatch(self, request, connection, future):
+        try:
+            url = parse.urlsplit(request.url)
+            headers = httputil.HTTPHeaders(request.headers)
+            if 'Host' not in headers:
+                headers['Host'] = url.netloc
+            path = url.path or '/'
+            if url.query:
+                path += '?' + url.query
+            start_line = httputil.RequestStartLine(request.method, path,
+                                                   'HTTP/1.1')
+            if request.body and 'Content-Length' not in headers:
+                headers['Content-Length'] = str(len(request.body))
+
+            delegate = self.application.start_request(self, connection)
+            yield gen.maybe_future(delegate.headers_received(start_line,
+                                                             headers))
+            if request.body_producer is not None:
+                def write(chunk):
+                    if isinstance(chunk, memoryview):
+                        chunk = chunk.tobytes()  # like a real server
+                    return gen.maybe_future(delegate.data_received(chunk))
+
+                yield request.body_producer(write)
+            elif request.body:
+                yield gen.maybe_future(delegate.data_received(request.body))
+            delegate.finish()
+        except Exception as error:
+            self.logger.exception('failed to dispatch %s %s',
+                                  request.method, request.url)
+            if not future.done():
+                future.set_exception(httpclient.HTTPError(
+                    599, str(error)))
+
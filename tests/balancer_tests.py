@@ -0,0 +1,137 @@
+import time
+import unittest
+
+from tornado import testing, web
+
+from sprockets.clients.http import balancer, client
+
+from tests.circuit_tests import FakeClock
+
+
+class HostRecordingHandler(web.RequestHandler):
+
+    def initialize(self, hosts):
+        self.hosts = hosts
+
+    def get(self):
+        self.hosts.append(self.request.host.split(':')[0])
+        self.write('ok')
+
+
+class UpstreamTests(unittest.TestCase):
+
+    def setUp(self):
+        super(UpstreamTests, self).setUp()
+        self.clock = FakeClock()
+        self.upstream = balancer.Upstream(
+            'service', ['one:80', ('two', 8080), 'three:80'],
+            max_failures=2, ejection_time=10, clock=self.clock)
+        self.one, self.two, self.three = self.upstream.endpoints
+
+    def finish(self, endpoint, code=503):
+        self.upstream.request_started(endpoint)
+        self.upstream.request_finished(endpoint, code, 0.1)
+
+    def test_that_endpoints_are_parsed(self):
+        self.assertEqual([e.netloc for e in self.upstream.endpoints],
+                         ['one:80', 'two:8080', 'three:80'])
+
+    def test_that_empty_upstream_is_rejected(self):
+        with self.assertRaises(ValueError):
+            balancer.Upstream('service', [])
+
+    def test_that_round_robin_visits_each_endpoint(self):
+        selected = set(self.upstream.select() for _ in range(3))
+        self.assertEqual(selected, set(self.upstream.endpoints))
+
+    def test_that_least_outstanding_prefers_idle_endpoints(self):
+        self.upstream.strategy = balancer.LeastOutstanding()
+        self.upstream.request_started(self.one)
+        self.upstream.request_started(self.three)
+        self.assertIs(self.upstream.select(), self.two)
+
+    def test_that_power_of_two_choices_prefers_faster_endpoints(self):
+        self.upstream.strategy = balancer.PowerOfTwoChoices()
+        self.one.latency, self.two.latency, self.three.latency = 1, 5, 9
+        for _ in range(20):
+            self.assertIsNot(self.upstream.select(), self.three)
+
+    def test_that_latency_is_a_moving_average(self):
+        self.upstream.request_started(self.one)
+        self.upstream.request_finished(self.one, 200, 1.0)
+        self.upstream.request_started(self.one)
+        self.upstream.request_finished(self.one, 200, 2.0)
+        self.assertAlmostEqual(self.one.latency, 1.3)
+        self.assertEqual(self.one.outstanding, 0)
+
+    def test_that_consecutive_failures_eject_endpoint(self):
+        self.finish(self.one)
+        self.finish(self.one)
+        self.assertNotIn(self.one, self.upstream.healthy_endpoints())
+        self.assertTrue(self.upstream.stats()['one:80']['ejected'])
+
+    def test_that_success_resets_failure_count(self):
+        self.finish(self.one)
+        self.finish(self.one, code=200)
+        self.finish(self.one)
+        self.assertIn(self.one, self.upstream.healthy_endpoints())
+
+    def test_that_client_errors_do_not_eject(self):
+        self.finish(self.one, code=404)
+        self.finish(self.one, code=404)
+        self.assertIn(self.one, self.upstream.healthy_endpoints())
+
+    def test_that_ejected_endpoint_is_readmitted(self):
+        self.finish(self.one)
+        self.finish(self.one)
+        self.clock.now += 10
+        self.assertIn(self.one, self.upstream.healthy_endpoints())
+        self.assertFalse(self.upstream.stats()['one:80']['ejected'])
+
+    def test_that_ejection_is_capped(self):
+        for endpoint in self.upstream.endpoints:
+            self.finish(endpoint)
+            self.finish(endpoint)
+        self.assertEqual(len(self.upstream.healthy_endpoints()), 2)
+
+    def test_that_all_endpoints_are_used_when_all_are_ejected(self):
+        self.upstream.max_ejected = 1.0
+        for endpoint in self.upstream.endpoints:
+            self.finish(endpoint)
+            self.finish(endpoint)
+        self.assertIn(self.upstream.select(), self.upstream.endpoints)
+
+
+class SendRequestBalancingTests(testing.AsyncHTTPTestCase):
+
+    def setUp(self):
+        self.hosts = []
+        super(SendRequestBalancingTests, self).setUp()
+        self.client = client.HTTPClient()
+        self.upstream = self.client.add_upstream(
+            'service', ['127.0.0.1:{}'.format(self.get_http_port()),
+                        ('localhost', self.get_http_port())])
+
+    def get_app(self):
+        return web.Application([web.url(r'/.*', HostRecordingHandler,
+                                        {'hosts': self.hosts})])
+
+    @testing.gen_test
+    def test_that_requests_are_spread_across_endpoints(self):
+        for _ in range(4):
+            response = yield self.client.send_request('GET', 'http',
+                                                      'service', 'path')
+            self.assertEqual(response.body, b'ok')
+        self.assertEqual(sorted(self.hosts),
+                         ['127.0.0.1', '127.0.0.1',
+                          'localhost', 'localhost'])
+        self.assertTrue(all(e.latency is not None and e.outstanding == 0
+                            for e in self.upstream.endpoints))
+
+    @testing.gen_test
+    def test_that_request_is_addressed_to_endpoint(self):
+        self.upstream.endpoints[1].ejected_until = time.time() + 60
+        response = yield self.client.send_request('GET', 'http', 'service',
+                                                  'a b')
+        self.assertEqual(response.request.url, 'http://127.0.0.1:{}/a%20b'
+                         .format(self.get_http_port()))
@@ -0,0 +1,116 @@
+import json
+import unittest
+
+from tornado import gen, testing, web
+
+from sprockets.clients import http
+from sprockets.clients.http import batch, client, registry
+
+
+class DelayHandler(web.RequestHandler):
+    """Responds with ``status`` after ``delay`` milliseconds."""
+
+    def initialize(self, state):
+        self.state = state
+
+    @gen.coroutine
+    def get(self, status, delay):
+        self.state['active'] += 1
+        self.state['max_active'] = max(self.state['max_active'],
+                                       self.state['active'])
+        self.state['calls'] += 1
+        yield gen.sleep(int(delay) / 1000.0)
+        self.state['active'] -= 1
+        self.set_status(int(status))
+        self.write(delay)
+
+
+class FanOutHandler(http.ClientMixin, web.RequestHandler):
+
+    @gen.coroutine
+    def get(self):
+        port = int(self.get_query_argument('port'))
+        specs = [('GET', 'http', '127.0.0.1', status, 1, {'port': port})
+                 for status in self.get_query_arguments('status')]
+        results = yield self.make_http_requests(
+            specs, fail_fast=bool(self.get_query_argument('fail_fast', '')))
+        if not self._finished:
+            self.write(json.dumps([r.error is None for r in results]))
+
+
+def make_specs(port, *entries):
+    return [('GET', 'http', '127.0.0.1', status, delay, {'port': port})
+            for status, delay in entries]
+
+
+class SplitSpecTests(unittest.TestCase):
+
+    def test_that_trailing_dict_is_keywords(self):
+        self.assertEqual(batch.split_spec(('GET', 'http', 'h', {'port': 1})),
+                         (('GET', 'http', 'h'), {'port': 1}))
+
+    def test_that_keywords_are_optional(self):
+        self.assertEqual(batch.split_spec(['GET', 'http', 'h', 'p']),
+                         (('GET', 'http', 'h', 'p'), {}))
+
+
+class SendRequestsTests(testing.AsyncHTTPTestCase):
+
+    def setUp(self):
+        self.state = {'active': 0, 'max_active': 0, 'calls': 0}
+        super(SendRequestsTests, self).setUp()
+        self.client = client.HTTPClient()
+
+    def get_app(self):
+        return web.Application([
+            web.url(r'/(\d+)/(\d+)', DelayHandler, {'state': self.state}),
+            web.url('/fan-out', FanOutHandler),
+        ])
+
+    def tearDown(self):
+        registry.close_clients(self.io_loop)
+        super(SendRequestsTests, self).tearDown()
+
+    @testing.gen_test
+    def test_that_results_are_in_input_order(self):
+        specs = make_specs(self.get_http_port(),
+                           (200, 60), (200, 10), (500, 30), (200, 0))
+        results = yield self.client.send_requests(specs, parallelism=2)
+        self.assertEqual([r.index for r in results], [0, 1, 2, 3])
+        self.assertEqual([r.response.body for r in results
+                          if r.response is not None],
+                         [b'60', b'10', b'0'])
+        self.assertIsInstance(results[2].error, client.HTTPError)
+        self.assertEqual(self.state['max_active'], 2)
+
+    @testing.gen_test
+    def test_that_fail_fast_stops_sending(self):
+        specs = make_specs(self.get_http_port(),
+                           (500, 0), (200, 50), (200, 0), (200, 0))
+        with self.assertRaises(client.HTTPError) as context:
+            yield self.client.send_requests(specs, parallelism=1,
+                                            fail_fast=True)
+        self.assertEqual(context.exception.code, 500)
+        self.assertEqual(self.state['calls'], 1)
+
+    @testing.gen_test
+    def test_that_results_can_be_consumed_as_completed(self):
+        specs = make_specs(self.get_http_port(),
+                           (200, 80), (200, 0), (200, 40))
+        requests = self.client.iter_requests(specs, parallelism=3)
+        order = []
+        while not requests.done():
+            result = yield requests.next()
+            order.append(result.index)
+        self.assertEqual(order, [1, 2, 0])
+
+    def test_that_mixin_captures_failures(self):
+        response = self.fetch('/fan-out?port={}&status=200&status=404'
+                              .format(self.get_http_port()))
+        self.assertEqual(json.loads(response.body.decode('utf-8')),
+                         [True, False])
+
+    def test_that_mixin_calls_error_handler_when_failing_fast(self):
+        response = self.fetch('/fan-out?port={}&status=200&status=404'
+                              '&fail_fast=1'.format(self.get_http_port()))
+        self.assertEqual(response.code, 404)
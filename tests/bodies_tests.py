@@ -0,0 +1,215 @@
+import unittest
+
+from tornado import concurrent, gen, httpclient, testing, web
+
+from sprockets.clients.http import (bodies, cache, client, registry,
+                                    retry, transports)
+
+
+class SpooledBodyTests(unittest.TestCase):
+
+    def test_that_small_bodies_stay_in_memory(self):
+        body = bodies.SpooledBody(threshold=10)
+        body.write(b'0123456789')
+        self.assertFalse(body.spilled)
+        self.assertEqual(body.getvalue(), b'0123456789')
+        self.assertEqual(body.mmap(), b'0123456789')
+
+    def test_that_large_bodies_spill_to_disk(self):
+        body = bodies.SpooledBody(threshold=10)
+        body.write(b'01234')
+        body.write(b'56789abcdef')
+        self.assertTrue(body.spilled)
+        self.assertEqual(len(body), 16)
+        body.seek(0)
+        self.assertEqual(body.read(4), b'0123')
+        self.assertEqual(body.getvalue(), b'0123456789abcdef')
+        self.assertEqual(body.tell(), 4)
+        mapped = body.mmap()
+        try:
+            self.assertEqual(mapped[10:], b'abcdef')
+        finally:
+            mapped.close()
+        body.close()
+
+    def test_that_reset_discards_the_body(self):
+        body = bodies.SpooledBody(threshold=1)
+        body.write(b'abc')
+        body.reset()
+        self.assertFalse(body.spilled)
+        self.assertEqual(body.getvalue(), b'')
+
+
+class BodyCollectorTests(unittest.TestCase):
+
+    def test_that_oversized_content_length_aborts(self):
+        collector = bodies.BodyCollector(
+            httpclient.HTTPRequest('http://example.com'), max_body_size=10)
+        watched = collector.watch(concurrent.Future())
+        collector.request.header_callback('Content-Length: 11\r\n')
+        self.assertTrue(collector.exceeded)
+        self.assertEqual(watched.exception().code, 502)
+
+    def test_that_head_content_length_is_ignored(self):
+        collector = bodies.BodyCollector(
+            httpclient.HTTPRequest('http://example.com', method='HEAD'),
+            max_body_size=10)
+        collector.request.header_callback('Content-Length: 11\r\n')
+        self.assertFalse(collector.exceeded)
+
+
+class BodyHandler(web.RequestHandler):
+
+    def initialize(self, calls):
+        self.calls = calls
+
+    @gen.coroutine
+    def get(self, size, status=None):
+        self.calls.append(size)
+        self.set_header('Cache-Control', 'max-age=60')
+        if status is not None:
+            self.set_status(int(status))
+        for _ in range(int(size) // 10):
+            self.write(b'0123456789')
+            yield self.flush()
+
+    def head(self, size, status=None):
+        self.set_header('Content-Length', size)
+
+
+class BodyLimitTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(BodyLimitTests, self).setUp()
+        self.calls = []
+        self.client = client.HTTPClient()
+        self.client.transport = transports.LoopbackTransport(
+            web.Application([web.url(r'/(\d+)(?:/(\d+))?', BodyHandler,
+                                     {'calls': self.calls})]),
+            io_loop=self.io_loop)
+        self.client.max_body_size = 100
+
+    @testing.gen_test
+    def test_that_bodies_within_the_limit_are_returned(self):
+        response = yield self.client.send_request('GET', 'http', 'service',
+                                                  '100')
+        self.assertEqual(response.body, b'0123456789' * 10)
+
+    @testing.gen_test
+    def test_that_oversized_bodies_fail(self):
+        self.client.retry_policy = retry.RetryPolicy(
+            max_attempts=3, codes=[502], backoff=0.0)
+        with self.assertRaises(client.ResponseTooLargeError) as context:
+            yield self.client.send_request('GET', 'http', 'service', '200')
+        self.assertEqual(context.exception.code, 502)
+        self.assertEqual(context.exception.reason, 'Response Too Large')
+        self.assertEqual(self.calls, ['200'])
+
+    @testing.gen_test
+    def test_that_limit_can_be_set_per_request(self):
+        response = yield self.client.send_request(
+            'GET', 'http', 'service', '200', max_body_size=None)
+        self.assertEqual(len(response.body), 200)
+        with self.assertRaises(client.ResponseTooLargeError):
+            yield self.client.send_request('GET', 'http', 'service', '50',
+                                           max_body_size=40)
+
+    @testing.gen_test
+    def test_that_streamed_bodies_are_limited(self):
+        stream = self.client.stream_request('GET', 'http', 'service', '200')
+        with self.assertRaises(client.ResponseTooLargeError):
+            yield stream.complete()
+
+    @testing.gen_test
+    def test_that_head_requests_are_not_limited(self):
+        response = yield self.client.send_request('HEAD', 'http', 'service',
+                                                  '1000')
+        self.assertEqual(response.code, 200)
+
+    @testing.gen_test
+    def test_that_large_bodies_are_spilled(self):
+        response = yield self.client.send_request(
+            'GET', 'http', 'service', '100', spill_threshold=50)
+        self.assertIsInstance(response.buffer, bodies.SpooledBody)
+        self.assertTrue(response.buffer.spilled)
+        self.assertEqual(response.buffer.read(10), b'0123456789')
+        self.assertEqual(response.body, b'0123456789' * 10)
+        response.buffer.close()
+
+    @testing.gen_test
+    def test_that_error_responses_keep_their_body(self):
+        with self.assertRaises(client.HTTPError) as context:
+            yield self.client.send_request('GET', 'http', 'service', '20',
+                                           '404', spill_threshold=10)
+        self.assertEqual(context.exception.code, 404)
+        self.assertEqual(context.exception.response.body,
+                         b'0123456789' * 2)
+        context.exception.response.buffer.close()
+
+    @testing.gen_test
+    def test_that_spilled_bodies_are_not_cached(self):
+        self.client.response_cache = cache.ResponseCache()
+        for _ in range(2):
+            response = yield self.client.send_request(
+                'GET', 'http', 'service', '100', '200', spill_threshold=50)
+            self.assertTrue(response.buffer.spilled)
+            response.buffer.close()
+        self.assertEqual(self.calls, ['100', '100'])
+
+
+class SimpleClientBodyLimitTests(testing.AsyncHTTPTestCase):
+
+    def get_app(self):
+        return web.Application([web.url(r'/(\d+)', BodyHandler,
+                                        {'calls': []})])
+
+    @testing.gen_test
+    def test_that_download_is_aborted(self):
+        http_client = client.HTTPClient(force_instance=True)
+        http_client.max_body_size = 1000
+        try:
+            with self.assertRaises(client.ResponseTooLargeError):
+                yield http_client.send_request(
+                    'GET', 'http', '127.0.0.1', '100000',
+                    port=self.get_http_port())
+            self.assertEqual(http_client.client.max_body_size, 2000)
+        finally:
+            http_client.close()
+
+    @testing.gen_test
+    def test_that_larger_per_request_limits_are_rejected(self):
+        http_client = client.HTTPClient(force_instance=True)
+        http_client.max_body_size = 1000
+        try:
+            for max_body_size in (None, 1001):
+                with self.assertRaises(ValueError):
+                    http_client.send_request(
+                        'GET', 'http', '127.0.0.1', '100',
+                        port=self.get_http_port(),
+                        max_body_size=max_body_size)
+            response = yield http_client.send_request(
+                'GET', 'http', '127.0.0.1', '100', port=self.get_http_port(),
+                max_body_size=100)
+            self.assertEqual(len(response.body), 100)
+        finally:
+            http_client.close()
+
+    def test_that_shared_client_is_not_configured(self):
+        http_client = client.HTTPClient(io_loop=self.io_loop)
+        http_client.max_body_size = 1000
+        self.assertIs(http_client.client, self.http_client)
+        self.assertNotEqual(self.http_client.max_body_size, 2000)
+
+
+class RegistryBodyLimitTests(testing.AsyncTestCase):
+
+    def test_that_limits_are_configured(self):
+        clients = registry.ClientRegistry()
+        try:
+            http_client = clients.get_client('api', {'api': {
+                'max_body_size': 1024, 'spill_threshold': 256}},
+                io_loop=self.io_loop)
+            self.assertEqual(http_client.max_body_size, 1024)
+            self.assertEqual(http_client.spill_threshold, 256)
+        finally:
+            clients.close()
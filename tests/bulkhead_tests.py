@@ -0,0 +1,105 @@
+from tornado import testing, web
+
+from sprockets.clients.http import bulkhead, circuit, client
+
+from tests.client_tests import SlowCountingHandler
+
+
+class BulkheadTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(BulkheadTests, self).setUp()
+        self.bulkhead = bulkhead.Bulkhead(max_concurrent=1, max_queued=1,
+                                          queue_timeout=0.05)
+
+    @testing.gen_test
+    def test_that_slots_are_handed_to_waiters(self):
+        acquired = yield self.bulkhead.acquire()
+        self.assertTrue(acquired)
+
+        waiter = self.bulkhead.acquire()
+        self.assertFalse(waiter.done())
+        self.assertEqual(self.bulkhead.queued, 1)
+
+        self.bulkhead.release()
+        acquired = yield waiter
+        self.assertTrue(acquired)
+        self.assertEqual(self.bulkhead.active, 1)
+
+        self.bulkhead.release()
+        self.assertEqual(self.bulkhead.active, 0)
+
+    @testing.gen_test
+    def test_that_full_queue_rejects_immediately(self):
+        yield self.bulkhead.acquire()
+        self.bulkhead.acquire()
+        rejected = self.bulkhead.acquire()
+        self.assertTrue(rejected.done())
+        self.assertFalse(rejected.result())
+        self.assertEqual(self.bulkhead.rejected, 1)
+
+    @testing.gen_test
+    def test_that_queued_requests_time_out(self):
+        yield self.bulkhead.acquire()
+        acquired = yield self.bulkhead.acquire()
+        self.assertFalse(acquired)
+        self.assertEqual(self.bulkhead.queued, 0)
+        self.assertEqual(self.bulkhead.stats()['rejected'], 1)
+
+
+class SendRequestBulkheadTests(testing.AsyncHTTPTestCase):
+
+    def setUp(self):
+        self.state = {'calls': 0}
+        super(SendRequestBulkheadTests, self).setUp()
+        self.client = client.HTTPClient()
+        self.client.bulkheads = bulkhead.Bulkheads(
+            max_concurrent=1, max_queued=1, queue_timeout=1.0)
+
+    def get_app(self):
+        return web.Application([web.url('/', SlowCountingHandler,
+                                        {'state': self.state})])
+
+    def send_request(self):
+        return self.client.send_request('GET', 'http', '127.0.0.1',
+                                        port=self.get_http_port())
+
+    @testing.gen_test
+    def test_that_excess_requests_are_rejected(self):
+        first, second, third = [self.send_request() for _ in range(3)]
+        with self.assertRaises(client.BulkheadFullError) as context:
+            yield third
+        self.assertEqual(context.exception.code, 598)
+        self.assertEqual(context.exception.to_server_error().status_code,
+                         503)
+
+        responses = yield [first, second]
+        self.assertEqual([r.code for r in responses], [200, 200])
+        self.assertEqual(self.state['calls'], 2)
+
+        stats = self.client.bulkheads.stats()
+        key = ('http', '127.0.0.1', self.get_http_port())
+        self.assertEqual(stats[key]['active'], 0)
+        self.assertGreater(stats[key]['max_wait_time'], 0)
+
+    @testing.gen_test
+    def test_that_host_overrides_are_applied(self):
+        self.client.bulkheads.overrides['127.0.0.1'] = {'max_queued': 5}
+        responses = yield [self.send_request() for _ in range(3)]
+        self.assertEqual([r.code for r in responses], [200] * 3)
+
+    @testing.gen_test
+    def test_that_open_circuit_does_not_wait_for_bulkhead(self):
+        key = ('http', '127.0.0.1', self.get_http_port())
+        self.client.circuit_breakers = circuit.CircuitBreakers(
+            minimum_requests=1)
+        breaker = self.client.circuit_breakers.get(key)
+        breaker.allow_request()
+        breaker.record_failure()
+        acquired = yield self.client.bulkheads.get(key).acquire()
+        self.assertTrue(acquired)
+
+        with self.assertRaises(client.CircuitOpenError):
+            yield self.send_request()
+        self.assertEqual(self.client.bulkheads.get(key).queued, 0)
+        self.assertEqual(self.state['calls'], 0)
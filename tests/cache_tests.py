@@ -0,0 +1,198 @@
+import shutil
+import tempfile
+import unittest
+
+from tornado import httpclient, testing, web
+
+from sprockets.clients.http import cache, client
+
+
+class CachedHandler(web.RequestHandler):
+
+    def initialize(self, state):
+        self.state = state
+
+    def get(self):
+        self.state['calls'] += 1
+        self.set_header('Cache-Control', self.state['cache_control'])
+        self.set_header('ETag', '"v1"')
+        if self.request.headers.get('If-None-Match') == '"v1"':
+            self.set_status(304)
+        else:
+            self.write('cached body')
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_entry(body, expires=2000.0):
+    return cache.CacheEntry(200, 'OK', [('ETag', '"x"')], body, expires)
+
+
+class CredentialsTests(unittest.TestCase):
+
+    def test_that_credentials_are_detected(self):
+        for kwargs in ({'headers': {'Authorization': 'Bearer a'}},
+                       {'headers': {'Cookie': 'session=a'}},
+                       {'headers': {'Proxy-Authorization': 'Basic a'}},
+                       {'auth_username': 'alice'},
+                       {'client_cert': '/tmp/cert.pem'},
+                       {'proxy_username': 'alice'}):
+            request = httpclient.HTTPRequest('http://example.com', **kwargs)
+            self.assertTrue(cache.has_credentials(request), kwargs)
+
+    def test_that_anonymous_requests_have_no_credentials(self):
+        request = httpclient.HTTPRequest('http://example.com',
+                                         headers={'Accept': '*/*'})
+        self.assertFalse(cache.has_credentials(request))
+
+
+class CacheControlTests(unittest.TestCase):
+
+    def test_that_directives_are_parsed(self):
+        self.assertEqual(
+            cache.parse_cache_control('public, max-age=60, no-cache'),
+            {'public': None, 'max-age': '60', 'no-cache': None})
+
+    def test_that_missing_header_is_empty(self):
+        self.assertEqual(cache.parse_cache_control(None), {})
+
+
+class MemoryStoreTests(unittest.TestCase):
+
+    def test_that_least_recently_used_entries_are_evicted(self):
+        store = cache.MemoryStore(max_bytes=60, max_entry_size=60)
+        store.set('a', make_entry(b'x' * 20))
+        store.set('b', make_entry(b'x' * 20))
+        store.get('a')
+        store.set('c', make_entry(b'x' * 20))
+        self.assertIsNotNone(store.get('a'))
+        self.assertIsNone(store.get('b'))
+        self.assertIsNotNone(store.get('c'))
+        self.assertLessEqual(store.size, 60)
+
+    def test_that_large_entries_are_not_stored(self):
+        store = cache.MemoryStore(max_bytes=100, max_entry_size=10)
+        store.set('a', make_entry(b'x' * 20))
+        self.assertEqual(len(store), 0)
+
+
+class DiskStoreTests(unittest.TestCase):
+
+    def setUp(self):
+        super(DiskStoreTests, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.store = cache.DiskStore(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super(DiskStoreTests, self).tearDown()
+
+    def test_that_entries_round_trip(self):
+        self.store.set('GET http://example.com/', make_entry(b'body'))
+        entry = self.store.get('GET http://example.com/')
+        self.assertEqual(entry.body, b'body')
+        self.assertEqual(entry.etag, '"x"')
+
+    def test_that_deleted_entries_are_missing(self):
+        self.store.set('key', make_entry(b'body'))
+        self.store.delete('key')
+        self.assertIsNone(self.store.get('key'))
+
+
+class SendRequestCacheTests(testing.AsyncHTTPTestCase):
+
+    def setUp(self):
+        self.state = {'calls': 0, 'cache_control': 'max-age=60'}
+        super(SendRequestCacheTests, self).setUp()
+        self.clock = FakeClock()
+        self.client = client.HTTPClient()
+        self.client.response_cache = cache.ResponseCache(clock=self.clock)
+
+    def get_app(self):
+        return web.Application([web.url('/', CachedHandler,
+                                        {'state': self.state})])
+
+    def send_request(self, **kwargs):
+        return self.client.send_request('GET', 'http', '127.0.0.1',
+                                        port=self.get_http_port(), **kwargs)
+
+    @testing.gen_test
+    def test_that_fresh_responses_are_served_from_cache(self):
+        yield self.send_request()
+        response = yield self.send_request()
+        self.assertEqual(response.body, b'cached body')
+        self.assertEqual(self.state['calls'], 1)
+        self.assertEqual(self.client.response_cache.stats(),
+                         {'hits': 1, 'misses': 1, 'revalidations': 0})
+
+    @testing.gen_test
+    def test_that_stale_responses_are_revalidated(self):
+        yield self.send_request()
+        self.clock.now += 61
+        response = yield self.send_request()
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.body, b'cached body')
+        self.assertEqual(self.state['calls'], 2)
+        self.assertEqual(self.client.response_cache.revalidations, 1)
+
+        response = yield self.send_request()
+        self.assertEqual(self.state['calls'], 2)
+
+    @testing.gen_test
+    def test_that_no_store_responses_are_not_cached(self):
+        self.state['cache_control'] = 'no-store'
+        yield self.send_request()
+        yield self.send_request()
+        self.assertEqual(self.state['calls'], 2)
+
+    @testing.gen_test
+    def test_that_cache_can_be_bypassed(self):
+        yield self.send_request()
+        yield self.send_request(use_cache=False)
+        self.assertEqual(self.state['calls'], 2)
+
+    @testing.gen_test
+    def test_that_authorized_responses_are_not_shared(self):
+        yield self.send_request(headers={'Authorization': 'Bearer a'})
+        yield self.send_request()
+        self.assertEqual(self.state['calls'], 2)
+
+    @testing.gen_test
+    def test_that_public_authorized_responses_are_cached(self):
+        self.state['cache_control'] = 'public, max-age=60'
+        yield self.send_request(headers={'Authorization': 'Bearer a'})
+        yield self.send_request()
+        self.assertEqual(self.state['calls'], 1)
+
+    @testing.gen_test
+    def test_that_responses_to_cookies_are_not_shared(self):
+        self.state['cache_control'] = 's-maxage=60'
+        yield self.send_request(headers={'Cookie': 'session=alice'})
+        yield self.send_request()
+        self.assertEqual(self.state['calls'], 2)
+
+    @testing.gen_test
+    def test_that_responses_to_authenticated_requests_are_not_shared(self):
+        yield self.send_request(auth_username='alice', auth_password='a')
+        yield self.send_request()
+        self.assertEqual(self.state['calls'], 2)
+
+    @testing.gen_test
+    def test_that_public_responses_to_cookies_are_cached(self):
+        self.state['cache_control'] = 'public, max-age=60'
+        yield self.send_request(headers={'Cookie': 'session=alice'})
+        yield self.send_request()
+        self.assertEqual(self.state['calls'], 1)
+
+    @testing.gen_test
+    def test_that_no_store_requests_are_not_cached(self):
+        yield self.send_request(headers={'Cache-Control': 'no-store'})
+        yield self.send_request()
+        self.assertEqual(self.state['calls'], 2)
@@ -0,0 +1,140 @@
+import unittest
+
+from tornado import testing, web
+
+from sprockets.clients.http import circuit, client
+
+from tests.retry_tests import FlakyHandler, unused_port
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class CircuitBreakerTests(unittest.TestCase):
+
+    def setUp(self):
+        super(CircuitBreakerTests, self).setUp()
+        self.clock = FakeClock()
+        self.breaker = circuit.CircuitBreaker(
+            failure_rate=0.5, minimum_requests=4, window=10,
+            open_timeout=5, probes=1, clock=self.clock)
+
+    def record_failures(self, count):
+        for _ in range(count):
+            self.assertTrue(self.breaker.allow_request())
+            self.breaker.record_failure()
+
+    def test_that_circuit_opens_at_failure_rate(self):
+        self.breaker.record_success()
+        self.breaker.record_success()
+        self.record_failures(1)
+        self.assertEqual(self.breaker.state, circuit.CLOSED)
+        self.record_failures(1)
+        self.assertEqual(self.breaker.state, circuit.OPEN)
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_that_old_failures_fall_out_of_window(self):
+        self.record_failures(3)
+        self.clock.now += 11
+        self.record_failures(1)
+        self.assertEqual(self.breaker.state, circuit.CLOSED)
+
+    def test_that_half_open_allows_limited_probes(self):
+        self.record_failures(4)
+        self.clock.now += 5
+        self.assertTrue(self.breaker.allow_request())
+        self.assertEqual(self.breaker.state, circuit.HALF_OPEN)
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_that_successful_probe_closes_circuit(self):
+        self.record_failures(4)
+        self.clock.now += 5
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, circuit.CLOSED)
+
+    def test_that_failed_probe_reopens_circuit(self):
+        self.record_failures(4)
+        self.clock.now += 5
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, circuit.OPEN)
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_that_cancelled_probe_is_released(self):
+        self.record_failures(4)
+        self.clock.now += 5
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.cancel_request()
+        self.assertEqual(self.breaker.state, circuit.HALF_OPEN)
+        self.assertTrue(self.breaker.allow_request())
+
+
+class SendRequestCircuitTests(testing.AsyncHTTPTestCase):
+
+    def setUp(self):
+        self.state = {'calls': 0, 'failures': 100, 'status': 503}
+        super(SendRequestCircuitTests, self).setUp()
+        self.client = client.HTTPClient()
+        self.client.circuit_breakers = circuit.CircuitBreakers(
+            minimum_requests=2, open_timeout=60)
+
+    def get_app(self):
+        return web.Application([web.url('/', FlakyHandler,
+                                        {'state': self.state})])
+
+    @testing.gen_test
+    def test_that_open_circuit_fails_fast(self):
+        for _ in range(2):
+            with self.assertRaises(client.HTTPError):
+                yield self.client.send_request('GET', 'http', '127.0.0.1',
+                                               port=self.get_http_port())
+
+        with self.assertRaises(client.CircuitOpenError) as context:
+            yield self.client.send_request('GET', 'http', '127.0.0.1',
+                                           port=self.get_http_port())
+        self.assertEqual(self.state['calls'], 2)
+        self.assertEqual(context.exception.to_server_error().status_code,
+                         503)
+        self.assertEqual(
+            self.client.circuit_breakers.states(),
+            {('http', '127.0.0.1', self.get_http_port()): circuit.OPEN})
+
+    @testing.gen_test
+    def test_that_client_errors_do_not_open_circuit(self):
+        self.state['status'] = 404
+        for _ in range(3):
+            with self.assertRaises(client.HTTPError) as context:
+                yield self.client.send_request('GET', 'http', '127.0.0.1',
+                                               port=self.get_http_port())
+            self.assertEqual(context.exception.code, 404)
+        self.assertEqual(self.state['calls'], 3)
+
+    @testing.gen_test
+    def test_that_refused_connections_open_circuit(self):
+        clock = FakeClock()
+        self.client.circuit_breakers = circuit.CircuitBreakers(
+            minimum_requests=2, open_timeout=60, clock=clock)
+        port = unused_port()
+        key = ('http', '127.0.0.1', port)
+        for _ in range(2):
+            with self.assertRaises(client.HTTPError) as context:
+                yield self.client.send_request('GET', 'http', '127.0.0.1',
+                                               port=port)
+            self.assertEqual(context.exception.code, 599)
+        self.assertEqual(self.client.circuit_breakers.states()[key],
+                         circuit.OPEN)
+
+        clock.now += 60
+        with self.assertRaises(client.HTTPError) as context:
+            yield self.client.send_request('GET', 'http', '127.0.0.1',
+                                           port=port)
+        self.assertNotIsInstance(context.exception, client.CircuitOpenError)
+        self.assertEqual(self.client.circuit_breakers.states()[key],
+                         circuit.OPEN)
@@ -1,7 +1,7 @@
 import json
 import uuid
 
-from tornado import httpserver, testing, web
+from tornado import gen, httpserver, testing, web
 import tornado.httpclient
 
 from sprockets.clients.http import client
@@ -20,6 +20,19 @@ class EchoHandler(web.RequestHandler):
         self.set_status(200)
 
 
+class SlowCountingHandler(web.RequestHandler):
+
+    def initialize(self, state):
+        self.state = state
+
+    @gen.coroutine
+    def get(self):
+        self.state['calls'] += 1
+        yield gen.sleep(0.05)
+        self.set_status(self.state.get('status', 200))
+        self.write(self.request.headers.get('Accept', ''))
+
+
 class HttpClientTests(testing.AsyncTestCase):
 
     def setUp(self):
@@ -108,3 +121,71 @@ class HttpClientTests(testing.AsyncTestCase):
 
         body = json.loads(response.body.decode('utf-8'))
         self.assertEqual(body['headers']['Correlation-Id'], specific_id)
+
+
+class CoalescingTests(testing.AsyncHTTPTestCase):
+
+    def setUp(self):
+        self.state = {'calls': 0}
+        super(CoalescingTests, self).setUp()
+        self.client = client.HTTPClient()
+        self.client.coalesce_requests = True
+
+    def get_app(self):
+        return web.Application([web.url('/', SlowCountingHandler,
+                                        {'state': self.state})])
+
+    def send_request(self, method='GET', **kwargs):
+        return self.client.send_request(method, 'http', '127.0.0.1',
+                                        port=self.get_http_port(), **kwargs)
+
+    @testing.gen_test
+    def test_that_concurrent_requests_share_a_fetch(self):
+        responses = yield [self.send_request() for _ in range(5)]
+        self.assertEqual([r.code for r in responses], [200] * 5)
+        self.assertEqual(self.state['calls'], 1)
+
+        yield self.send_request()
+        self.assertEqual(self.state['calls'], 2)
+
+    @testing.gen_test
+    def test_that_vary_headers_separate_requests(self):
+        responses = yield [
+            self.send_request(headers={'Accept': 'application/json'}),
+            self.send_request(headers={'Accept': 'text/html'}),
+        ]
+        self.assertEqual([r.body for r in responses],
+                         [b'application/json', b'text/html'])
+        self.assertEqual(self.state['calls'], 2)
+
+    @testing.gen_test
+    def test_that_each_waiter_gets_its_own_error(self):
+        self.state['status'] = 500
+        futures = [self.send_request() for _ in range(2)]
+        errors = []
+        for future in futures:
+            try:
+                yield future
+            except client.HTTPError as error:
+                errors.append(error)
+        self.assertEqual([e.code for e in errors], [500, 500])
+        self.assertIsNot(errors[0], errors[1])
+        self.assertIsNot(errors[0].request, errors[1].request)
+        self.assertEqual(self.state['calls'], 1)
+
+    @testing.gen_test
+    def test_that_authenticated_requests_are_not_coalesced(self):
+        yield [self.send_request(auth_username='alice', auth_password='a'),
+               self.send_request(auth_username='bob', auth_password='b')]
+        self.assertEqual(self.state['calls'], 2)
+
+    @testing.gen_test
+    def test_that_requests_with_cookies_are_not_coalesced(self):
+        yield [self.send_request(headers={'Cookie': 'session=alice'}),
+               self.send_request(headers={'Cookie': 'session=bob'})]
+        self.assertEqual(self.state['calls'], 2)
+
+    @testing.gen_test
+    def test_that_coalescing_can_be_disabled_per_call(self):
+        yield [self.send_request(), self.send_request(coalesce=False)]
+        self.assertEqual(self.state['calls'], 2)
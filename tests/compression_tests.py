@@ -0,0 +1,235 @@
+import gzip
+import io
+import unittest
+import zlib
+
+from tornado import httpclient, testing, web
+
+from sprockets.clients.http import client, compression, transports
+
+
+def gzip_bytes(data):
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb') as gzip_file:
+        gzip_file.write(data)
+    return buffer.getvalue()
+
+
+PAYLOAD = b'{"name": "value"}' * 200
+
+BOMB = gzip_bytes(b'\0' * (8 * 1024 * 1024))
+
+
+class UploadHandler(web.RequestHandler):
+
+    def post(self):
+        body = self.request.body
+        encoding = self.request.headers.get('Content-Encoding', 'identity')
+        if encoding == 'gzip':
+            body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+        self.set_header('X-Content-Encoding', encoding)
+        self.set_header('X-Length', len(self.request.body))
+        self.write(body)
+
+
+class EncodedHandler(web.RequestHandler):
+
+    def initialize(self, mode='gzip'):
+        self.mode = mode
+
+    def get(self, status):
+        self.set_status(int(status))
+        self.set_header('X-Accept-Encoding',
+                        self.request.headers.get('Accept-Encoding', ''))
+        if self.mode == 'identity':
+            self.write(PAYLOAD)
+            return
+        self.set_header('Content-Encoding', 'gzip')
+        encoded = BOMB if self.mode == 'bomb' else gzip_bytes(PAYLOAD)
+        if self.mode == 'corrupt':
+            encoded = encoded[:10] + b'garbage' + encoded[10:]
+        for offset in range(0, len(encoded), 16):
+            self.write(encoded[offset:offset + 16])
+            self.flush()
+
+
+def make_application():
+    return web.Application([
+        web.url(r'/upload', UploadHandler),
+        web.url(r'/encoded/(\d+)', EncodedHandler),
+        web.url(r'/identity/(\d+)', EncodedHandler, {'mode': 'identity'}),
+        web.url(r'/corrupt/(\d+)', EncodedHandler, {'mode': 'corrupt'}),
+        web.url(r'/bomb/(\d+)', EncodedHandler, {'mode': 'bomb'}),
+    ])
+
+
+class CompressionTests(unittest.TestCase):
+
+    def test_that_unknown_encoding_is_rejected(self):
+        with self.assertRaises(ValueError):
+            compression.Compression('compress')
+
+    def test_that_small_bodies_are_not_compressed(self):
+        policy = compression.Compression(threshold=100)
+        request = httpclient.HTTPRequest('http://example.com', 'POST',
+                                         body=b'x' * 99)
+        self.assertFalse(policy.compress_request(request, 'example.com'))
+        self.assertEqual(request.body, b'x' * 99)
+        self.assertEqual(policy.stats(), {})
+
+    def test_that_encoded_bodies_are_not_compressed(self):
+        policy = compression.Compression(threshold=0)
+        request = httpclient.HTTPRequest(
+            'http://example.com', 'POST', body=b'x' * 100,
+            headers={'Content-Encoding': 'identity'})
+        self.assertFalse(policy.compress_request(request, 'example.com'))
+
+    def test_that_request_statistics_are_recorded(self):
+        policy = compression.Compression(threshold=0)
+        headers = {'Content-Type': 'application/json'}
+        request = httpclient.HTTPRequest('http://example.com', 'POST',
+                                         body=PAYLOAD, headers=headers)
+        self.assertTrue(policy.compress_request(request, 'example.com'))
+        self.assertEqual(request.headers['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Encoding', headers)
+
+        stats = policy.stats()['example.com']
+        self.assertEqual(stats['requests'], 1)
+        self.assertEqual(stats['request_bytes'], len(PAYLOAD))
+        self.assertEqual(stats['request_compressed_bytes'],
+                         len(request.body))
+        self.assertGreater(stats['request_ratio'], 5)
+        self.assertGreaterEqual(stats['compress_time'], 0)
+        self.assertIsNone(stats['response_ratio'])
+
+
+class ResponseDecoderTests(unittest.TestCase):
+
+    def decode(self, body, max_body_size=None):
+        chunks = []
+        decoder = compression.ResponseDecoder(
+            httpclient.HTTPRequest('http://example.com',
+                                   streaming_callback=chunks.append),
+            compression.CompressionStats(), 'gzip', max_body_size)
+        decoder.on_header_line('Content-Encoding: gzip\r\n')
+        decoder.on_chunk(body)
+        return decoder, chunks
+
+    def test_that_decoding_stops_at_the_limit(self):
+        decoder, chunks = self.decode(BOMB, max_body_size=1000)
+        self.assertTrue(decoder.exceeded)
+        self.assertEqual(sum(len(chunk) for chunk in chunks), 1001)
+
+    def test_that_chunks_are_decoded_in_steps(self):
+        decoder, chunks = self.decode(BOMB)
+        self.assertFalse(decoder.exceeded)
+        self.assertEqual(max(len(chunk) for chunk in chunks),
+                         compression.DECODE_CHUNK_SIZE)
+        self.assertEqual(sum(len(chunk) for chunk in chunks),
+                         8 * 1024 * 1024)
+
+
+class LoopbackCompressionTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(LoopbackCompressionTests, self).setUp()
+        self.client = client.HTTPClient()
+        self.client.transport = transports.LoopbackTransport(
+            make_application(), io_loop=self.io_loop)
+        self.client.compression = compression.Compression(threshold=1024)
+
+    @testing.gen_test
+    def test_that_large_bodies_are_compressed(self):
+        response = yield self.client.send_request(
+            'POST', 'http', 'service', 'upload', body=PAYLOAD)
+        self.assertEqual(response.body, PAYLOAD)
+        self.assertEqual(response.headers['X-Content-Encoding'], 'gzip')
+        self.assertLess(int(response.headers['X-Length']), len(PAYLOAD))
+
+    @testing.gen_test
+    def test_that_compression_can_be_disabled_per_request(self):
+        response = yield self.client.send_request(
+            'POST', 'http', 'service', 'upload', body=PAYLOAD,
+            compress=False)
+        self.assertEqual(response.headers['X-Content-Encoding'], 'identity')
+
+    @testing.gen_test
+    def test_that_responses_are_decoded(self):
+        response = yield self.client.send_request('GET', 'http', 'service',
+                                                  'encoded', 200)
+        self.assertEqual(response.body, PAYLOAD)
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.headers['X-Consumed-Content-Encoding'],
+                         'gzip')
+        self.assertEqual(response.headers['X-Accept-Encoding'],
+                         self.client.compression.accept_encoding)
+
+        stats = self.client.compression.stats()['service']
+        self.assertEqual(stats['responses'], 1)
+        self.assertEqual(stats['response_bytes'], len(PAYLOAD))
+        self.assertGreater(stats['response_ratio'], 5)
+
+    @testing.gen_test
+    def test_that_decoded_chunks_are_streamed(self):
+        chunks = []
+        yield self.client.send_request('GET', 'http', 'service',
+                                       'encoded', 200,
+                                       streaming_callback=chunks.append)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(b''.join(chunks), PAYLOAD)
+
+    @testing.gen_test
+    def test_that_error_responses_are_decoded(self):
+        with self.assertRaises(client.HTTPError) as context:
+            yield self.client.send_request('GET', 'http', 'service',
+                                           'encoded', 404)
+        self.assertEqual(context.exception.code, 404)
+        self.assertEqual(context.exception.response.body, PAYLOAD)
+
+    @testing.gen_test
+    def test_that_identity_responses_are_untouched(self):
+        response = yield self.client.send_request('GET', 'http', 'service',
+                                                  'identity', 200)
+        self.assertEqual(response.body, PAYLOAD)
+        self.assertNotIn('X-Consumed-Content-Encoding', response.headers)
+        self.assertEqual(self.client.compression.stats()['service']
+                         ['responses'], 0)
+
+    @testing.gen_test
+    def test_that_corrupt_bodies_fail(self):
+        with self.assertRaises(client.HTTPError) as context:
+            yield self.client.send_request('GET', 'http', 'service',
+                                           'corrupt', 200)
+        self.assertEqual(context.exception.code, 502)
+
+    @testing.gen_test
+    def test_that_decoded_bodies_are_limited(self):
+        with self.assertRaises(client.ResponseTooLargeError):
+            yield self.client.send_request('GET', 'http', 'service', 'bomb',
+                                           200, max_body_size=1000)
+
+    @testing.gen_test
+    def test_that_decoding_can_be_disabled_per_request(self):
+        response = yield self.client.send_request(
+            'GET', 'http', 'service', 'encoded', 200,
+            decompress_response=False)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(zlib.decompress(response.body,
+                                         16 + zlib.MAX_WBITS), PAYLOAD)
+
+
+class SocketCompressionTests(testing.AsyncHTTPTestCase):
+
+    def get_app(self):
+        return make_application()
+
+    @testing.gen_test
+    def test_that_tornado_client_decodes_responses(self):
+        http_client = client.HTTPClient()
+        http_client.compression = compression.Compression()
+        response = yield http_client.send_request(
+            'GET', 'http', '127.0.0.1', 'encoded', 200,
+            port=self.get_http_port())
+        self.assertEqual(response.body, PAYLOAD)
+        self.assertEqual(response.headers['X-Consumed-Content-Encoding'],
+                         'gzip')
@@ -0,0 +1,149 @@
+import io
+import json
+import unittest
+
+from tornado import httpclient, httputil, testing, web
+
+from sprockets.clients.http import client, content, transports
+
+
+def make_response(body, content_type):
+    request = httpclient.HTTPRequest('http://example.com')
+    headers = httputil.HTTPHeaders()
+    if content_type is not None:
+        headers['Content-Type'] = content_type
+    return httpclient.HTTPResponse(request, 200, headers=headers,
+                                   buffer=io.BytesIO(body))
+
+
+class CountingCodec(content.JSONCodec):
+
+    def __init__(self):
+        self.decodes = 0
+
+    def decode(self, data, charset='utf-8'):
+        self.decodes += 1
+        return super(CountingCodec, self).decode(data, charset)
+
+
+class ContentNegotiationTests(unittest.TestCase):
+
+    def setUp(self):
+        super(ContentNegotiationTests, self).setUp()
+        self.negotiation = content.ContentNegotiation()
+
+    def test_that_json_is_preferred(self):
+        self.assertTrue(self.negotiation.accept.startswith(
+            'application/json, '))
+        self.assertIn('application/x-www-form-urlencoded;q=',
+                      self.negotiation.accept)
+
+    def test_that_missing_content_type_uses_default(self):
+        headers = httputil.HTTPHeaders()
+        body = self.negotiation.encode({'a': [1, 2]}, headers)
+        self.assertEqual(headers['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(body.decode('utf-8')), {'a': [1, 2]})
+
+    def test_that_form_encoding_is_selected_by_content_type(self):
+        headers = httputil.HTTPHeaders(
+            {'Content-Type': 'application/x-www-form-urlencoded'})
+        body = self.negotiation.encode({'a': ['1', '2']}, headers)
+        self.assertEqual(body, b'a=1&a=2')
+
+    def test_that_unknown_content_type_is_rejected(self):
+        headers = httputil.HTTPHeaders({'Content-Type': 'text/csv'})
+        with self.assertRaises(ValueError):
+            self.negotiation.encode({}, headers)
+
+    def test_that_unknown_default_is_rejected(self):
+        with self.assertRaises(ValueError):
+            content.ContentNegotiation(default_content_type='text/csv')
+
+    def test_that_structured_suffix_selects_codec(self):
+        response = make_response(b'{"title": "x"}',
+                                 'application/problem+json; charset=utf-8')
+        self.assertEqual(self.negotiation.decode(response), {'title': 'x'})
+
+    def test_that_charset_is_honoured(self):
+        response = make_response(u'{"name": "\u00e9"}'.encode('latin-1'),
+                                 'application/json; charset=latin-1')
+        self.assertEqual(self.negotiation.decode(response),
+                         {'name': u'\u00e9'})
+
+    def test_that_empty_body_decodes_to_none(self):
+        self.assertIsNone(self.negotiation.decode(make_response(b'', None)))
+
+    def test_that_undecodable_body_raises(self):
+        with self.assertRaises(ValueError):
+            self.negotiation.decode(make_response(b'x', 'image/png'))
+
+    def test_that_response_is_decoded_once(self):
+        codec = CountingCodec()
+        negotiation = content.ContentNegotiation([codec])
+        response = content.ContentResponse(
+            make_response(b'[1]', 'application/json'), negotiation)
+        self.assertEqual(codec.decodes, 0)
+        self.assertEqual(response.data, [1])
+        self.assertIs(response.data, response.data)
+        self.assertEqual(codec.decodes, 1)
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.body, b'[1]')
+
+
+class EchoHandler(web.RequestHandler):
+
+    def post(self, status):
+        self.set_status(int(status))
+        self.set_header('Content-Type',
+                        self.request.headers['Content-Type'])
+        self.set_header('X-Accept', self.request.headers.get('Accept'))
+        self.write(self.request.body)
+
+
+class SendContentTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(SendContentTests, self).setUp()
+        self.client = client.HTTPClient()
+        self.client.transport = transports.LoopbackTransport(
+            web.Application([web.url(r'/echo/(\d+)', EchoHandler)]),
+            io_loop=self.io_loop)
+        self.client.content_negotiation = content.ContentNegotiation()
+
+    @testing.gen_test
+    def test_that_objects_are_round_tripped(self):
+        response = yield self.client.send_request(
+            'POST', 'http', 'service', 'echo', 200, body={'a': 1})
+        self.assertIsInstance(response, content.ContentResponse)
+        self.assertEqual(response.data, {'a': 1})
+        self.assertEqual(response.headers['X-Accept'],
+                         self.client.content_negotiation.accept)
+
+    @testing.gen_test
+    def test_that_explicit_headers_are_kept(self):
+        headers = {'Accept': 'application/json',
+                   'Content-Type': 'application/x-www-form-urlencoded'}
+        response = yield self.client.send_request(
+            'POST', 'http', 'service', 'echo', 200, body={'a': 'b'},
+            headers=headers)
+        self.assertEqual(response.body, b'a=b')
+        self.assertEqual(response.data, {'a': ['b']})
+        self.assertEqual(response.headers['X-Accept'], 'application/json')
+        self.assertEqual(sorted(headers), ['Accept', 'Content-Type'])
+
+    @testing.gen_test
+    def test_that_bytes_bodies_are_sent_as_is(self):
+        response = yield self.client.send_request(
+            'POST', 'http', 'service', 'echo', 200, body=b'[1]',
+            headers={'Content-Type': 'application/json'})
+        self.assertEqual(response.data, [1])
+
+    @testing.gen_test
+    def test_that_error_responses_are_wrapped(self):
+        with self.assertRaises(client.HTTPError) as context:
+            yield self.client.send_request(
+                'POST', 'http', 'service', 'echo', 422,
+                body={'error': 'invalid'})
+        self.assertEqual(context.exception.code, 422)
+        self.assertEqual(context.exception.response.data,
+                         {'error': 'invalid'})
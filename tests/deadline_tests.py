@@ -0,0 +1,150 @@
+import unittest
+
+from tornado import gen, testing, web
+
+from sprockets.clients.http import client, deadline, mixins, registry, retry
+
+from tests.circuit_tests import FakeClock
+from tests.retry_tests import FlakyHandler
+
+
+class DeadlineEchoHandler(web.RequestHandler):
+
+    def initialize(self, delay=0):
+        self.delay = delay
+
+    @gen.coroutine
+    def get(self):
+        if self.delay:
+            yield gen.sleep(self.delay)
+        self.write(self.request.headers.get(deadline.DEADLINE_HEADER, ''))
+
+
+class ForwardingHandler(mixins.ClientMixin, web.RequestHandler):
+
+    request_budget = 5.0
+
+    @gen.coroutine
+    def get(self):
+        response = yield self.make_http_request(
+            'GET', 'http', '127.0.0.1', 'echo',
+            port=self.request.host.split(':')[1])
+        self.write(response.body)
+
+
+class MessageConsumer(object):
+    """Stand-in for a message consumer such as rejected's."""
+
+    def initialize(self):
+        pass
+
+
+class Consumer(mixins.ClientMixin, MessageConsumer):
+
+    request_budget = 5.0
+
+
+class DeadlineTests(unittest.TestCase):
+
+    def setUp(self):
+        super(DeadlineTests, self).setUp()
+        self.clock = FakeClock()
+
+    def test_that_remaining_budget_shrinks(self):
+        limit = deadline.Deadline(2, clock=self.clock)
+        self.clock.now += 0.5
+        self.assertEqual(limit.remaining(), 1.5)
+        self.assertEqual(limit.to_header(), '1500')
+        self.assertFalse(limit.expired())
+
+    def test_that_remaining_budget_is_never_negative(self):
+        limit = deadline.Deadline(1, clock=self.clock)
+        self.clock.now += 3
+        self.assertEqual(limit.remaining(), 0)
+        self.assertTrue(limit.expired())
+
+    def test_that_header_is_measured_from_start(self):
+        limit = deadline.Deadline.from_header('250', start=self.clock.now - 1,
+                                              clock=self.clock)
+        self.assertTrue(limit.expired())
+
+    def test_that_malformed_headers_are_ignored(self):
+        for value in (None, '', 'soon', 'nan'):
+            self.assertIsNone(deadline.Deadline.from_header(value))
+
+
+class SendRequestDeadlineTests(testing.AsyncHTTPTestCase):
+
+    def setUp(self):
+        self.state = {'calls': 0, 'failures': 100, 'status': 503}
+        super(SendRequestDeadlineTests, self).setUp()
+        self.client = client.HTTPClient()
+
+    def tearDown(self):
+        registry.close_clients(self.io_loop)
+        super(SendRequestDeadlineTests, self).tearDown()
+
+    def get_app(self):
+        return web.Application([
+            web.url('/echo', DeadlineEchoHandler),
+            web.url('/slow', DeadlineEchoHandler, {'delay': 1}),
+            web.url('/flaky', FlakyHandler, {'state': self.state}),
+            web.url('/forward', ForwardingHandler),
+        ])
+
+    @testing.gen_test
+    def test_that_remaining_budget_is_forwarded(self):
+        response = yield self.client.send_request(
+            'GET', 'http', '127.0.0.1', 'echo', port=self.get_http_port(),
+            deadline=deadline.Deadline(10))
+        self.assertTrue(9000 < int(response.body) <= 10000)
+        self.assertNotIn(deadline.DEADLINE_HEADER, self.client.headers)
+
+    @testing.gen_test
+    def test_that_expired_deadline_fails_without_sending(self):
+        with self.assertRaises(client.DeadlineExceededError) as context:
+            yield self.client.send_request(
+                'GET', 'http', '127.0.0.1', 'flaky',
+                port=self.get_http_port(), deadline=deadline.Deadline(0))
+        self.assertEqual(self.state['calls'], 0)
+        self.assertEqual(context.exception.to_server_error().status_code,
+                         504)
+
+    @testing.gen_test
+    def test_that_request_timeout_is_clamped(self):
+        with self.assertRaises(client.HTTPError) as context:
+            yield self.client.send_request(
+                'GET', 'http', '127.0.0.1', 'slow',
+                port=self.get_http_port(), request_timeout=30,
+                deadline=deadline.Deadline(0.1))
+        self.assertEqual(context.exception.code, 599)
+
+    @testing.gen_test
+    def test_that_retries_stop_at_deadline(self):
+        policy = retry.RetryPolicy(max_attempts=10, backoff=0.2,
+                                   jitter=False)
+        with self.assertRaises(client.HTTPError) as context:
+            yield self.client.send_request(
+                'GET', 'http', '127.0.0.1', 'flaky',
+                port=self.get_http_port(), retry_policy=policy,
+                deadline=deadline.Deadline(0.5))
+        self.assertEqual(context.exception.code, 503)
+        self.assertEqual(self.state['calls'], 2)
+
+    def test_that_mixin_forwards_inbound_deadline(self):
+        response = self.fetch('/forward',
+                              headers={deadline.DEADLINE_HEADER: '2000'})
+        self.assertTrue(1000 < int(response.body) <= 2000)
+
+    def test_that_mixin_uses_request_budget(self):
+        response = self.fetch('/forward')
+        self.assertTrue(4000 < int(response.body) <= 5000)
+
+    @testing.gen_test
+    def test_that_mixin_works_without_inbound_request(self):
+        consumer = Consumer()
+        consumer.initialize()
+        self.assertIsNone(consumer.request_deadline)
+        response = yield consumer.make_http_request(
+            'GET', 'http', '127.0.0.1', 'echo', port=self.get_http_port())
+        self.assertEqual(response.body, b'')
@@ -0,0 +1,91 @@
+import unittest
+
+from tornado import gen, testing, web
+
+from sprockets.clients.http import client, hedge, retry, stats
+
+
+class FirstCallSlowHandler(web.RequestHandler):
+
+    def initialize(self, state):
+        self.state = state
+
+    @gen.coroutine
+    def get(self):
+        self.state['calls'] += 1
+        if self.state['calls'] == 1:
+            yield gen.sleep(0.5)
+            self.write('slow')
+        else:
+            self.write('fast')
+
+    post = get
+
+
+class LatencyWindowTests(unittest.TestCase):
+
+    def test_that_percentiles_are_calculated(self):
+        window = stats.LatencyWindow(size=100, refresh=1)
+        for value in range(1, 101):
+            window.add(value / 1000.0)
+        self.assertEqual(window.percentile(50), 0.05)
+        self.assertEqual(window.percentile(99), 0.099)
+        self.assertEqual(window.percentile(100), 0.1)
+
+    def test_that_old_samples_are_discarded(self):
+        window = stats.LatencyWindow(size=2, refresh=1)
+        for value in (10, 1, 2):
+            window.add(value)
+        self.assertEqual(len(window), 2)
+        self.assertEqual(window.percentile(100), 2)
+
+    def test_that_empty_window_has_no_percentile(self):
+        self.assertIsNone(stats.LatencyWindow().percentile(50))
+
+
+class HedgingPolicyTests(unittest.TestCase):
+
+    def test_that_delay_is_derived_from_percentile(self):
+        policy = hedge.HedgingPolicy(delay=1.0, percentile=90,
+                                     min_samples=10)
+        upstream = ('http', 'example.com', 80)
+        for _ in range(9):
+            policy.record_success(upstream, 0.2, False)
+        self.assertEqual(policy.get_delay(upstream), 1.0)
+        policy.record_success(upstream, 0.2, False)
+        self.assertEqual(policy.get_delay(upstream), 0.2)
+
+    def test_that_budget_limits_hedges(self):
+        policy = hedge.HedgingPolicy(
+            budget=retry.RetryBudget(ratio=0.5, capacity=1, initial=1))
+        self.assertTrue(policy.allow_hedge())
+        self.assertFalse(policy.allow_hedge())
+        self.assertEqual(policy.stats()['hedges_sent'], 1)
+
+
+class SendRequestHedgingTests(testing.AsyncHTTPTestCase):
+
+    def setUp(self):
+        self.state = {'calls': 0}
+        super(SendRequestHedgingTests, self).setUp()
+        self.client = client.HTTPClient()
+        self.client.hedging_policy = hedge.HedgingPolicy(delay=0.02)
+
+    def get_app(self):
+        return web.Application([web.url('/', FirstCallSlowHandler,
+                                        {'state': self.state})])
+
+    @testing.gen_test
+    def test_that_hedge_wins_over_slow_request(self):
+        response = yield self.client.send_request(
+            'GET', 'http', '127.0.0.1', port=self.get_http_port())
+        self.assertEqual(response.body, b'fast')
+        self.assertEqual(self.client.hedging_policy.stats(),
+                         {'requests': 1, 'hedges_sent': 1, 'hedges_won': 1})
+
+    @testing.gen_test
+    def test_that_non_idempotent_requests_are_not_hedged(self):
+        response = yield self.client.send_request(
+            'POST', 'http', '127.0.0.1', port=self.get_http_port(), body='')
+        self.assertEqual(response.body, b'slow')
+        self.assertEqual(self.state['calls'], 1)
@@ -0,0 +1,129 @@
+import socket
+import unittest
+
+from tornado import gen, testing, web
+
+from sprockets.clients.http import client, metrics
+
+from tests.retry_tests import FlakyHandler
+
+
+class HistogramTests(unittest.TestCase):
+
+    def test_that_percentiles_are_within_bucket_precision(self):
+        histogram = metrics.Histogram(sub_buckets=16)
+        for value in range(1, 1001):
+            histogram.record(value / 1000.0)
+        self.assertEqual(histogram.count, 1000)
+        self.assertAlmostEqual(histogram.percentile(50), 0.5, delta=0.5 / 16)
+        self.assertAlmostEqual(histogram.percentile(99), 0.99,
+                               delta=0.99 / 16)
+        self.assertEqual(histogram.percentile(100), 1.0)
+        self.assertAlmostEqual(histogram.mean, 0.5005)
+
+    def test_that_small_values_are_exact(self):
+        histogram = metrics.Histogram()
+        histogram.record(0.000003)
+        self.assertEqual(histogram.percentile(50), 0.000003)
+
+    def test_that_empty_histogram_has_no_percentiles(self):
+        self.assertIsNone(metrics.Histogram().percentile(50))
+
+
+class StatsdSinkTests(unittest.TestCase):
+
+    def setUp(self):
+        super(StatsdSinkTests, self).setUp()
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.settimeout(1)
+        self.sink = metrics.StatsdSink(*self.server.getsockname())
+
+    def tearDown(self):
+        self.sink.socket.close()
+        self.server.close()
+        super(StatsdSinkTests, self).tearDown()
+
+    def test_that_metrics_are_sent_on_flush(self):
+        self.sink.increment('a.requests')
+        self.sink.gauge('a.in_flight', 2)
+        self.sink.timing('a.request_time', 0.25)
+        self.sink.flush()
+        payload = self.server.recv(1024).decode('ascii')
+        self.assertEqual(payload.split('\n'),
+                         ['a.requests:1|c', 'a.in_flight:2|g',
+                          'a.request_time:250.000|ms'])
+
+
+class FlushCountingSink(metrics.InMemorySink):
+
+    def __init__(self):
+        super(FlushCountingSink, self).__init__()
+        self.flushes = 0
+
+    def flush(self):
+        self.flushes += 1
+
+
+class SendRequestMetricsTests(testing.AsyncHTTPTestCase):
+
+    def setUp(self):
+        self.state = {'calls': 0, 'failures': 1, 'status': 503}
+        super(SendRequestMetricsTests, self).setUp()
+        self.client = client.HTTPClient()
+        self.client.metrics = metrics.MetricsRecorder()
+
+    def get_app(self):
+        return web.Application([web.url('/', FlakyHandler,
+                                        {'state': self.state})])
+
+    @testing.gen_test
+    def test_that_requests_are_recorded_by_status_class(self):
+        for _ in range(2):
+            try:
+                yield self.client.send_request('GET', 'http', '127.0.0.1',
+                                               port=self.get_http_port())
+            except client.HTTPError:
+                pass
+
+        snapshot = self.client.metrics.sink.snapshot()
+        self.assertEqual(snapshot['counters']['http.127_0_0_1.GET.5xx'
+                                              '.requests'], 1)
+        self.assertEqual(snapshot['counters']['http.127_0_0_1.GET.2xx'
+                                              '.requests'], 1)
+        self.assertEqual(snapshot['counters']['http.127_0_0_1.GET.2xx'
+                                              '.bytes_in'], 2)
+        self.assertEqual(snapshot['gauges']['http.127_0_0_1.GET.in_flight'],
+                         0)
+        self.assertEqual(snapshot['timings']['http.127_0_0_1.GET.2xx'
+                                             '.request_time']['count'], 1)
+
+    @testing.gen_test
+    def test_that_flushes_are_batched(self):
+        sink = FlushCountingSink()
+        self.client.metrics = metrics.MetricsRecorder(sink,
+                                                      flush_interval=0.05)
+        self.state['failures'] = 0
+        for _ in range(3):
+            yield self.client.send_request('GET', 'http', '127.0.0.1',
+                                           port=self.get_http_port())
+        self.assertEqual(sink.flushes, 0)
+        yield gen.sleep(0.1)
+        self.assertEqual(sink.flushes, 1)
+
+        yield self.client.send_request('GET', 'http', '127.0.0.1',
+                                       port=self.get_http_port())
+        self.client.close()
+        self.assertEqual(sink.flushes, 2)
+        yield gen.sleep(0.1)
+        self.assertEqual(sink.flushes, 2)
+
+    @testing.gen_test
+    def test_that_flush_interval_can_be_disabled(self):
+        sink = FlushCountingSink()
+        self.client.metrics = metrics.MetricsRecorder(sink,
+                                                      flush_interval=None)
+        self.state['failures'] = 0
+        yield self.client.send_request('GET', 'http', '127.0.0.1',
+                                       port=self.get_http_port())
+        self.assertEqual(sink.flushes, 1)
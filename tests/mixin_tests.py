@@ -6,6 +6,7 @@ from tornado import gen, testing, web
 
 from examples import request_handler
 from sprockets.clients import http
+from sprockets.clients.http import registry
 
 from tests import HTTPBIN_PORT, HTTPBIN_SERVER, HTTPBIN_URL
 
@@ -55,6 +56,7 @@ class LoggingTests(testing.AsyncHTTPTestCase):
             logging.getLogger(logger).addHandler(self.log_handler)
 
     def tearDown(self):
+        registry.close_clients(self.io_loop)
         super(LoggingTests, self).tearDown()
         for logger in self.LOGGERS:
             logging.getLogger(logger).removeHandler(self.log_handler)
@@ -107,6 +109,10 @@ class LoggingTests(testing.AsyncHTTPTestCase):
 
 class MixinTests(testing.AsyncHTTPTestCase):
 
+    def tearDown(self):
+        registry.close_clients(self.io_loop)
+        super(MixinTests, self).tearDown()
+
     def get_app(self):
         app = request_handler.make_application(server=HTTPBIN_SERVER,
                                                port=HTTPBIN_PORT)
@@ -0,0 +1,211 @@
+import gc
+import json
+import unittest
+
+from tornado import gen, httputil, testing, web
+
+from sprockets.clients.http import client, pagination, transports
+
+
+class ItemsHandler(web.RequestHandler):
+
+    def initialize(self, requested):
+        self.requested = requested
+
+    def get(self):
+        page = int(self.get_query_argument('page', '1'))
+        self.requested.append(page)
+        if page == 3 and self.get_query_argument('fail', None):
+            raise web.HTTPError(500)
+        if page < 5:
+            self.add_header('Link', '</items?page=1>; rel="first"')
+            self.add_header('Link', '</items?page={}&fail={}>; '
+                            'rel="next"'.format(
+                                page + 1,
+                                self.get_query_argument('fail', '')))
+        self.set_header('Content-Type', 'application/json')
+        self.write(json.dumps([page * 10, page * 10 + 1]))
+
+
+class CursorHandler(web.RequestHandler):
+
+    def get(self):
+        cursor = int(self.get_query_argument('cursor', '0'))
+        self.write({'items': [cursor],
+                    'cursor': cursor + 1 if cursor < 2 else None})
+
+
+class CredentialsHandler(web.RequestHandler):
+
+    def initialize(self, requested):
+        self.requested = requested
+
+    def get(self):
+        page = int(self.get_query_argument('page', '1'))
+        self.requested.append((self.request.host, page,
+                               self.request.headers.get('Authorization'),
+                               self.request.headers.get('Cookie')))
+        if page == 1:
+            self.add_header('Link', '<http://other/credentials?page=2>; '
+                            'rel="next"')
+        elif page == 2:
+            self.add_header('Link', '</credentials?page=3>; rel="next"')
+        self.write(json.dumps([page]))
+
+
+class PaginationTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(PaginationTests, self).setUp()
+        self.requested = []
+        self.client = client.HTTPClient()
+        self.client.transport = transports.LoopbackTransport(
+            web.Application([
+                web.url(r'/items', ItemsHandler,
+                        {'requested': self.requested}),
+                web.url(r'/cursor', CursorHandler),
+                web.url(r'/credentials', CredentialsHandler,
+                        {'requested': self.requested}),
+            ]), io_loop=self.io_loop)
+
+    @gen.coroutine
+    def collect(self, pages):
+        items = []
+        while (yield pages.fetch_next):
+            items.append(pages.next_item())
+        raise gen.Return(items)
+
+    @testing.gen_test
+    def test_that_next_links_are_followed(self):
+        pages = self.client.paginate('GET', 'http', 'service', 'items')
+        items = yield self.collect(pages)
+        self.assertEqual(items, [10, 11, 20, 21, 30, 31, 40, 41, 50, 51])
+        self.assertEqual(self.requested, [1, 2, 3, 4, 5])
+        self.assertEqual(pages.pages, 5)
+
+    @testing.gen_test
+    def test_that_cursor_extractor_is_used(self):
+        def next_cursor(response):
+            cursor = json.loads(response.body.decode('utf-8'))['cursor']
+            return None if cursor is None else {'cursor': cursor}
+
+        pages = self.client.paginate(
+            'GET', 'http', 'service', 'cursor', next_page=next_cursor,
+            items=lambda r: json.loads(r.body.decode('utf-8'))['items'])
+        items = yield self.collect(pages)
+        self.assertEqual(items, [0, 1, 2])
+
+    @testing.gen_test
+    def test_that_read_ahead_bounds_requested_pages(self):
+        pages = self.client.paginate('GET', 'http', 'service', 'items',
+                                     read_ahead=2)
+        yield gen.sleep(0.05)
+        self.assertEqual(self.requested, [1, 2])
+        self.assertTrue((yield pages.fetch_next))
+        yield gen.sleep(0.05)
+        self.assertEqual(self.requested, [1, 2, 3])
+
+    @testing.gen_test
+    def test_that_cancel_stops_prefetching(self):
+        pages = self.client.paginate('GET', 'http', 'service', 'items',
+                                     read_ahead=1)
+        self.assertTrue((yield pages.fetch_next))
+        self.assertEqual(pages.next_item(), 10)
+        pages.cancel()
+        yield gen.sleep(0.05)
+        self.assertFalse((yield pages.fetch_next))
+        self.assertEqual(self.requested, [1, 2])
+
+    @testing.gen_test
+    def test_that_credentials_are_not_sent_to_other_origins(self):
+        pages = self.client.paginate(
+            'GET', 'http', 'service', 'credentials',
+            headers={'Authorization': 'Bearer secret', 'Cookie': 'a=b',
+                     'X-Trace': '1'})
+        items = yield self.collect(pages)
+        self.assertEqual(items, [1, 2, 3])
+        self.assertEqual(self.requested, [
+            ('service', 1, 'Bearer secret', 'a=b'),
+            ('other', 2, None, None),
+            ('other', 3, None, None)])
+
+    def test_that_credential_keywords_are_removed(self):
+        headers = httputil.HTTPHeaders({'Authorization': 'Basic x',
+                                        'Accept': 'application/json'})
+        kwargs = pagination.without_credentials(
+            {'headers': headers, 'auth_username': 'user',
+             'auth_password': 'secret', 'request_timeout': 5})
+        self.assertEqual(kwargs['request_timeout'], 5)
+        self.assertNotIn('auth_username', kwargs)
+        self.assertNotIn('auth_password', kwargs)
+        self.assertEqual(dict(kwargs['headers']),
+                         {'Accept': 'application/json'})
+        self.assertEqual(headers['Authorization'], 'Basic x')
+
+    @testing.gen_test
+    def test_that_abandoned_iterator_stops_prefetching(self):
+        pages = self.client.paginate('GET', 'http', 'service', 'items',
+                                     read_ahead=3)
+        self.assertEqual((yield pages.__anext__()), 10)
+        del pages
+        gc.collect()
+        yield gen.sleep(0.05)
+        self.assertEqual(self.requested, [1, 2])
+
+    @testing.gen_test
+    def test_that_failed_page_is_raised_after_earlier_items(self):
+        items = []
+        pages = self.client.paginate(
+            'GET', 'http', 'service', 'items', read_ahead=3,
+            next_page=lambda r: pagination._merge_query(
+                pagination.next_link(r), {'fail': '1'}))
+        with self.assertRaises(client.HTTPError) as context:
+            while (yield pages.fetch_next):
+                items.append(pages.next_item())
+        self.assertEqual(context.exception.code, 500)
+        self.assertEqual(items, [10, 11, 20, 21])
+
+    @testing.gen_test
+    def test_that_max_pages_stops_iteration(self):
+        pages = self.client.paginate('GET', 'http', 'service', 'items',
+                                     max_pages=2, read_ahead=4)
+        items = yield self.collect(pages)
+        self.assertEqual(items, [10, 11, 20, 21])
+        self.assertEqual(self.requested, [1, 2])
+
+    @testing.gen_test
+    def test_that_pages_support_async_iteration_protocol(self):
+        pages = self.client.paginate('GET', 'http', 'service', 'items',
+                                     max_pages=1)
+        self.assertIs(pages.__aiter__(), pages)
+        self.assertEqual((yield pages.__anext__()), 10)
+        self.assertEqual((yield pages.__anext__()), 11)
+        if pagination._StopAsyncIteration is not None:
+            with self.assertRaises(pagination._StopAsyncIteration):
+                yield pages.__anext__()
+
+    @testing.gen_test
+    def test_that_non_list_pages_fail(self):
+        pages = self.client.paginate('GET', 'http', 'service', 'cursor')
+        with self.assertRaises(ValueError):
+            yield pages.fetch_next
+
+
+class LinkHeaderTests(unittest.TestCase):
+
+    def test_that_links_are_parsed(self):
+        self.assertEqual(
+            pagination.parse_link_header(
+                '<https://a/?p=2>; rel="next last"; title=x, </p/1>;rel=prev'),
+            [('https://a/?p=2', {'rel': 'next last', 'title': 'x'}),
+             ('/p/1', {'rel': 'prev'})])
+
+    def test_that_next_link_is_resolved_against_response(self):
+        headers = httputil.HTTPHeaders()
+        headers.add('Link', '</p/1>; rel=prev')
+        headers.add('Link', '<?page=3>; rel="next"')
+        response = type('Response', (object,), {
+            'headers': headers,
+            'effective_url': 'http://example.com/items?page=2'})()
+        self.assertEqual(pagination.next_link(response),
+                         'http://example.com/items?page=3')
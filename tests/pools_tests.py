@@ -0,0 +1,146 @@
+import unittest
+
+from tornado import httpclient, httputil, testing, web
+
+from sprockets.clients.http import client, pools, registry
+
+from tests.circuit_tests import FakeClock
+from tests.retry_tests import unused_port
+
+
+def make_response(connect=None, connection=None):
+    headers = httputil.HTTPHeaders()
+    if connection is not None:
+        headers['Connection'] = connection
+    time_info = {} if connect is None else {'connect': connect}
+    return httpclient.HTTPResponse(
+        httpclient.HTTPRequest('http://example.com'), 200, headers=headers,
+        time_info=time_info)
+
+
+class ConnectionPoolTests(unittest.TestCase):
+
+    def setUp(self):
+        super(ConnectionPoolTests, self).setUp()
+        self.clock = FakeClock()
+        self.pool = pools.ConnectionPool(idle_connections=2,
+                                         idle_timeout=30.0, clock=self.clock)
+
+    def send(self, response):
+        self.pool.request_started()
+        self.pool.request_finished(response)
+
+    def test_that_new_and_reused_connections_are_counted(self):
+        self.send(make_response(connect=0.01))
+        self.send(make_response(connect=0))
+        stats = self.pool.stats()
+        self.assertEqual(stats['created'], 1)
+        self.assertEqual(stats['reused'], 1)
+        self.assertEqual(stats['idle'], 1)
+        self.assertEqual(stats['open'], 1)
+
+    def test_that_active_requests_take_idle_connections(self):
+        self.send(make_response(connect=0.01))
+        self.pool.request_started()
+        stats = self.pool.stats()
+        self.assertEqual(stats['idle'], 0)
+        self.assertEqual(stats['active'], 1)
+        self.assertEqual(stats['open'], 1)
+
+    def test_that_connections_beyond_target_are_evicted(self):
+        for _ in range(3):
+            self.pool.request_started()
+        for _ in range(3):
+            self.pool.request_finished(make_response(connect=0.01))
+        self.assertEqual(self.pool.idle, 2)
+        self.assertEqual(self.pool.evicted, 1)
+
+    def test_that_idle_connections_expire(self):
+        self.send(make_response(connect=0.01))
+        self.clock.now += 30.0
+        self.assertEqual(self.pool.idle, 0)
+        self.assertEqual(self.pool.evicted, 1)
+
+    def test_that_closed_connections_are_not_pooled(self):
+        self.send(make_response(connect=0.01, connection='close'))
+        self.assertEqual(self.pool.idle, 0)
+        self.assertEqual(self.pool.created, 1)
+
+    def test_that_clients_without_keep_alive_never_pool(self):
+        self.send(make_response())
+        self.send(None)
+        stats = self.pool.stats()
+        self.assertEqual(stats['created'], 1)
+        self.assertEqual(stats['open'], 0)
+
+
+class ConnectionPoolsTests(unittest.TestCase):
+
+    def test_that_curl_callback_is_installed(self):
+        http_client = client.HTTPClient(force_instance=True)
+        http_client.connection_pools = pools.ConnectionPools()
+        try:
+            self.assertEqual(
+                http_client.client.defaults['prepare_curl_callback'],
+                http_client.connection_pools.prepare_curl)
+        finally:
+            http_client.close()
+
+
+class WarmUpTests(testing.AsyncHTTPTestCase):
+
+    def setUp(self):
+        super(WarmUpTests, self).setUp()
+        self.client = client.HTTPClient()
+        self.client.connection_pools = pools.ConnectionPools(
+            ['http://127.0.0.1:{}'.format(self.get_http_port())],
+            idle_connections=3)
+
+    def get_app(self):
+        return web.Application([])
+
+    @testing.gen_test
+    def test_that_configured_upstreams_are_connected(self):
+        key = ('http', '127.0.0.1', self.get_http_port())
+        results = yield self.client.warm_up()
+        self.assertEqual(results, {key: 3})
+        stats = self.client.connection_pools.stats()[key]
+        self.assertEqual(stats['created'], 3)
+        self.assertEqual(stats['active'], 0)
+
+    @testing.gen_test
+    def test_that_named_upstreams_connect_to_each_endpoint(self):
+        closed_port = unused_port()
+        self.client.add_upstream('service', [
+            '127.0.0.1:{}'.format(self.get_http_port()),
+            '127.0.0.1:{}'.format(closed_port)])
+        results = yield self.client.warm_up(['service'])
+        self.assertEqual(results, {
+            ('http', '127.0.0.1', self.get_http_port()): 3,
+            ('http', '127.0.0.1', closed_port): 0,
+        })
+
+
+class RegistryWarmUpTests(testing.AsyncHTTPTestCase):
+
+    def get_app(self):
+        return web.Application([])
+
+    def tearDown(self):
+        registry.close_clients(self.io_loop)
+        super(RegistryWarmUpTests, self).tearDown()
+
+    @testing.gen_test
+    def test_that_configured_clients_are_warmed_up(self):
+        url = 'http://127.0.0.1:{}'.format(self.get_http_port())
+        settings = {registry.SETTINGS_KEY: {
+            'api': {'connection_pools': {'upstreams': [url],
+                                         'idle_connections': 1}},
+            'other': {'max_clients': 2},
+        }}
+        results = yield registry.warm_up_clients(settings, self.io_loop)
+        self.assertEqual(list(results), ['api'])
+        self.assertEqual(list(results['api'].values()), [1])
+        http_client = registry.get_client('api', settings, self.io_loop)
+        self.assertIsInstance(http_client.connection_pools,
+                              pools.ConnectionPools)
@@ -0,0 +1,153 @@
+import io
+import json
+import tempfile
+import unittest
+
+from tornado import gen, httpclient, testing, web
+
+from sprockets.clients import http
+from sprockets.clients.http import client, producers, registry
+
+
+class EchoBodyHandler(web.RequestHandler):
+
+    def post(self):
+        self.write(json.dumps({
+            'body': self.request.body.decode('utf-8'),
+            'content_length': self.request.headers.get('Content-Length'),
+            'transfer_encoding': self.request.headers.get(
+                'Transfer-Encoding'),
+        }))
+
+
+@web.stream_request_body
+class UploadProxyHandler(http.ClientMixin, web.RequestHandler):
+
+    def prepare(self):
+        self.begin_streaming_request('POST', 'http', '127.0.0.1', 'echo',
+                                     port=self.settings['upstream_port'])
+
+    @gen.coroutine
+    def post(self):
+        response = yield self.finish_streaming_request()
+        self.write(response.body)
+
+
+class CurlLikeClient(httpclient.AsyncHTTPClient):
+    """Client that ignores ``body_producer`` like ``curl_httpclient``."""
+
+    def fetch_impl(self, request, callback):
+        raise AssertionError('request should not be sent')
+
+
+class IsStreamingBodyTests(unittest.TestCase):
+
+    def test_that_streamable_bodies_are_detected(self):
+        def generate():
+            yield b'chunk'
+
+        for body in (producers.BodyPipe(), io.BytesIO(b'body'),
+                     generate(), iter([b'one'])):
+            self.assertTrue(producers.is_streaming_body(body), body)
+
+    def test_that_in_memory_bodies_are_not_streamed(self):
+        for body in (None, b'body', u'body', bytearray(b'body'),
+                     memoryview(b'body'), {'key': 'value'}, [b'one']):
+            self.assertFalse(producers.is_streaming_body(body), body)
+
+
+class StreamingBodyTests(testing.AsyncHTTPTestCase):
+
+    def setUp(self):
+        super(StreamingBodyTests, self).setUp()
+        self.client = client.HTTPClient()
+
+    def tearDown(self):
+        registry.close_clients(self.io_loop)
+        super(StreamingBodyTests, self).tearDown()
+
+    def get_app(self):
+        return web.Application([
+            web.url('/echo', EchoBodyHandler),
+            web.url('/upload', UploadProxyHandler),
+        ], upstream_port=self.get_http_port())
+
+    @gen.coroutine
+    def post(self, body):
+        response = yield self.client.send_request(
+            'POST', 'http', '127.0.0.1', 'echo', port=self.get_http_port(),
+            body=body)
+        raise gen.Return(json.loads(response.body.decode('utf-8')))
+
+    @testing.gen_test
+    def test_that_files_are_sent_with_known_length(self):
+        with tempfile.TemporaryFile() as body_file:
+            body_file.write(b'0123456789' * 10000)
+            body_file.seek(10)
+            result = yield self.post(body_file)
+        self.assertEqual(len(result['body']), 99990)
+        self.assertEqual(result['content_length'], '99990')
+
+    @testing.gen_test
+    def test_that_memoryviews_are_sent(self):
+        result = yield self.post(memoryview(b'x' * 100000))
+        self.assertEqual(result['body'], 'x' * 100000)
+        self.assertEqual(result['content_length'], '100000')
+
+    @testing.gen_test
+    def test_that_memoryviews_are_not_copied(self):
+        data = b'0123456789' * 10
+        producer, length = producers.make_body_producer(memoryview(data),
+                                                        chunk_size=40)
+        chunks = []
+        for _ in range(2):
+            yield producer(lambda chunk: chunks.append(chunk))
+        self.assertEqual(length, 100)
+        self.assertEqual([len(chunk) for chunk in chunks],
+                         [40, 40, 20, 40, 40, 20])
+        self.assertEqual(
+            b''.join(memoryview(chunk).tobytes() for chunk in chunks[:3]),
+            data)
+        if producers._WRITES_MEMORYVIEW:
+            self.assertTrue(all(chunk.obj is data for chunk in chunks))
+
+    @testing.gen_test
+    def test_that_bytearrays_are_sent_as_plain_bodies(self):
+        result = yield self.post(bytearray(b'abc'))
+        self.assertEqual(result['body'], 'abc')
+        self.assertEqual(result['content_length'], '3')
+
+    @testing.gen_test
+    def test_that_iterables_are_sent_chunked(self):
+        result = yield self.post(iter([b'one', b'two', b'three']))
+        self.assertEqual(result['body'], 'onetwothree')
+        self.assertEqual(result['transfer_encoding'], 'chunked')
+
+    @testing.gen_test
+    def test_that_body_pipe_forwards_written_chunks(self):
+        pipe = producers.BodyPipe(max_chunks=1)
+        future = self.post(pipe)
+        for chunk in (b'a', b'b', b'c'):
+            yield pipe.write(chunk)
+        yield pipe.close()
+        result = yield future
+        self.assertEqual(result['body'], 'abc')
+        self.assertEqual(pipe.bytes_written, 3)
+
+    def test_that_curl_client_rejects_streaming_bodies(self):
+        self.client.transport = CurlLikeClient(io_loop=self.io_loop,
+                                               force_instance=True)
+        with self.assertRaises(ValueError):
+            self.client.send_request('POST', 'http', '127.0.0.1', 'echo',
+                                     body=iter([b'one']))
+
+    def test_that_unstreamable_bodies_are_rejected(self):
+        with self.assertRaises(TypeError):
+            producers.make_body_producer(object())
+
+    def test_that_mixin_streams_inbound_body(self):
+        body = b'y' * (256 * 1024)
+        response = self.fetch('/upload', method='POST', body=body)
+        result = json.loads(response.body.decode('utf-8'))
+        self.assertEqual(result['body'], body.decode('utf-8'))
+        self.assertEqual(result['content_length'], str(len(body)))
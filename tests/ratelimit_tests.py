@@ -0,0 +1,184 @@
+import unittest
+
+from tornado import httpclient, testing, web
+
+from sprockets.clients.http import client, ratelimit
+
+from tests.circuit_tests import FakeClock
+
+
+class QuotaHandler(web.RequestHandler):
+
+    def initialize(self, state):
+        self.state = state
+
+    def get(self):
+        self.state['calls'] += 1
+        for name, value in self.state.get('headers', {}).items():
+            self.set_header(name, value)
+        self.set_status(self.state.get('status', 200))
+
+
+def make_response(code, headers):
+    request = httpclient.HTTPRequest('http://api.example.com/')
+    return httpclient.HTTPResponse(request, code, headers=headers)
+
+
+class TokenBucketTests(unittest.TestCase):
+
+    def setUp(self):
+        super(TokenBucketTests, self).setUp()
+        self.clock = FakeClock()
+        self.bucket = ratelimit.TokenBucket(2, burst=2, clock=self.clock)
+
+    def test_that_burst_is_sent_immediately(self):
+        self.assertEqual(self.bucket.reserve(), 0)
+        self.assertEqual(self.bucket.reserve(), 0)
+
+    def test_that_waits_are_spaced_at_rate(self):
+        self.bucket.reserve()
+        self.bucket.reserve()
+        self.assertEqual(self.bucket.reserve(), 0.5)
+        self.assertEqual(self.bucket.reserve(), 1.0)
+
+    def test_that_tokens_refill(self):
+        self.bucket.reserve()
+        self.bucket.reserve()
+        self.clock.now += 0.5
+        self.assertEqual(self.bucket.reserve(), 0)
+
+    def test_that_excessive_wait_is_rejected(self):
+        self.bucket.reserve()
+        self.bucket.reserve()
+        self.assertIsNone(self.bucket.reserve(max_wait=0.1))
+        self.assertEqual(self.bucket.reserve(), 0.5)
+
+    def test_that_pause_delays_tokens(self):
+        self.bucket.pause(3)
+        self.assertEqual(self.bucket.reserve(), 3)
+
+    def test_that_pause_drains_tokens(self):
+        self.bucket.pause(3)
+        self.clock.now += 3
+        self.assertEqual(self.bucket.reserve(), 0)
+        self.assertEqual(self.bucket.reserve(), 0.5)
+
+    def test_that_waits_during_pause_start_after_it(self):
+        self.bucket.pause(3)
+        self.assertEqual(self.bucket.reserve(), 3)
+        self.assertEqual(self.bucket.reserve(), 3.5)
+
+    def test_that_burst_is_learned_from_limit(self):
+        self.bucket.learn(limit=1)
+        self.assertEqual(self.bucket.burst, 1)
+        self.assertEqual(self.bucket.stats()['tokens'], 1)
+        self.bucket.learn(limit=2)
+        self.clock.now += 10
+        self.assertEqual(self.bucket.stats()['tokens'], 2)
+
+    def test_that_burst_never_grows_beyond_configuration(self):
+        self.bucket.learn(limit=5000)
+        self.assertEqual(self.bucket.burst, 2)
+        self.clock.now += 3600
+        self.assertEqual(self.bucket.stats()['tokens'], 2)
+        self.bucket.learn(limit=1)
+        self.bucket.learn(limit=5000)
+        self.assertEqual(self.bucket.burst, 2)
+
+    def test_that_exhausted_quota_pauses_until_reset(self):
+        self.bucket.learn(limit=100, remaining=0, reset=10)
+        self.assertEqual(self.bucket.reserve(), 10)
+        self.assertTrue(self.bucket.stats()['paused'])
+
+    def test_that_remaining_quota_is_spread_over_window(self):
+        self.bucket.learn(limit=100, remaining=5, reset=10)
+        self.assertEqual(self.bucket.rate, 0.5)
+        self.clock.now += 10
+        self.assertEqual(self.bucket.rate, 2)
+
+
+class RateLimiterTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(RateLimiterTests, self).setUp()
+        self.clock = FakeClock()
+        self.limiter = ratelimit.RateLimiter(
+            rate=1, burst=1, max_wait=0, overrides={'fast': {'rate': 100}},
+            clock=self.clock)
+
+    @testing.gen_test
+    def test_that_keys_have_separate_buckets(self):
+        self.assertTrue((yield self.limiter.acquire('one')))
+        self.assertFalse((yield self.limiter.acquire('one')))
+        self.assertTrue((yield self.limiter.acquire('two')))
+        self.assertEqual(self.limiter.rejected, 1)
+
+    def test_that_overrides_are_applied(self):
+        self.assertEqual(self.limiter.get('fast').rate, 100)
+
+    def test_that_retry_after_pauses_key(self):
+        self.limiter.observe('api', make_response(429,
+                                                  {'Retry-After': '30'}))
+        self.assertTrue(self.limiter.stats()['api']['paused'])
+
+    def test_that_retry_after_is_ignored_on_success(self):
+        self.limiter.observe('api', make_response(200,
+                                                  {'Retry-After': '30'}))
+        self.assertNotIn('api', self.limiter.stats())
+
+    def test_that_ratelimit_headers_are_learned(self):
+        self.clock.now = 1500000000.0
+        self.limiter.observe('api', make_response(200, {
+            'X-RateLimit-Limit': '10', 'X-RateLimit-Remaining': '0',
+            'X-RateLimit-Reset': str(int(self.clock.now) + 20)}))
+        self.assertTrue(self.limiter.stats()['api']['paused'])
+        self.assertEqual(self.limiter.get('api').reserve(), 20)
+
+    def test_that_ratelimit_parameters_are_ignored(self):
+        self.limiter.observe('api', make_response(200, {
+            'RateLimit-Limit': '10, 10;w=60', 'RateLimit-Remaining': '0',
+            'RateLimit-Reset': '5'}))
+        self.assertTrue(self.limiter.stats()['api']['paused'])
+
+
+class SendRequestRateLimitTests(testing.AsyncHTTPTestCase):
+
+    def setUp(self):
+        self.state = {'calls': 0}
+        super(SendRequestRateLimitTests, self).setUp()
+        self.client = client.HTTPClient()
+        self.client.rate_limiter = ratelimit.RateLimiter(rate=20, burst=1,
+                                                         max_wait=0.2)
+
+    def get_app(self):
+        return web.Application([web.url('/', QuotaHandler,
+                                        {'state': self.state})])
+
+    def send(self, **kwargs):
+        return self.client.send_request('GET', 'http', '127.0.0.1',
+                                        port=self.get_http_port(), **kwargs)
+
+    @testing.gen_test
+    def test_that_requests_are_paced(self):
+        start = self.io_loop.time()
+        for _ in range(3):
+            yield self.send()
+        self.assertGreaterEqual(self.io_loop.time() - start, 0.09)
+        self.assertEqual(self.client.rate_limiter.waits, 2)
+
+    @testing.gen_test
+    def test_that_throttled_key_rejects_requests(self):
+        self.state.update(status=429, headers={'Retry-After': '60'})
+        with self.assertRaises(client.HTTPError) as context:
+            yield self.send(rate_limit_key='partner')
+        self.assertEqual(context.exception.code, 429)
+
+        with self.assertRaises(client.RateLimitedError) as context:
+            yield self.send(rate_limit_key='partner')
+        self.assertEqual(self.state['calls'], 1)
+        self.assertEqual(context.exception.to_server_error().status_code,
+                         503)
+        self.state.update(status=200, headers={})
+        yield self.send()
+        self.assertEqual(sorted(self.client.rate_limiter.stats()),
+                         ['127.0.0.1', 'partner'])
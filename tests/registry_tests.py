@@ -0,0 +1,122 @@
+from tornado import httpclient, ioloop, testing, web
+
+from sprockets.clients import http
+from sprockets.clients.http import circuit, metrics, registry, retry
+
+
+class SharedClientHandler(http.ClientMixin, web.RequestHandler):
+
+    def get(self):
+        self.write(str(id(self.http_client)))
+
+
+class NamedClientHandler(SharedClientHandler):
+    http_client_name = 'other'
+
+
+class ClientRegistryTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(ClientRegistryTests, self).setUp()
+        self.registry = registry.ClientRegistry()
+
+    def tearDown(self):
+        self.registry.close()
+        super(ClientRegistryTests, self).tearDown()
+
+    def test_that_clients_are_shared_per_io_loop_and_name(self):
+        first = self.registry.get_client(io_loop=self.io_loop)
+        self.assertIs(first, self.registry.get_client(io_loop=self.io_loop))
+
+        other_loop = ioloop.IOLoop()
+        try:
+            self.assertIsNot(first,
+                             self.registry.get_client(io_loop=other_loop))
+        finally:
+            self.registry.close(other_loop)
+            other_loop.close()
+
+    def test_that_clients_are_separated_per_configurations(self):
+        first = self.registry.get_client(
+            'default', {'default': {'max_clients': 3}}, io_loop=self.io_loop)
+        second = self.registry.get_client(
+            'default', {'default': {'max_clients': 5}}, io_loop=self.io_loop)
+        self.assertIsNot(first, second)
+        self.assertEqual(first.client.max_clients, 3)
+        self.assertEqual(second.client.max_clients, 5)
+
+    def test_that_configuration_is_applied(self):
+        configs = {'api': {'max_clients': 3,
+                           'headers': {'User-Agent': 'testing/1.0'}}}
+        http_client = self.registry.get_client('api', configs,
+                                               io_loop=self.io_loop)
+        self.assertEqual(http_client.headers['User-Agent'], 'testing/1.0')
+        self.assertEqual(http_client.client.max_clients, 3)
+        self.assertIsNot(http_client.client,
+                         httpclient.AsyncHTTPClient(io_loop=self.io_loop))
+
+    def test_that_policies_are_configured(self):
+        sink = metrics.InMemorySink()
+        budget = retry.RetryBudget(ratio=0.1)
+        configs = {'api': {
+            'retry_policy': {'max_attempts': 5, 'budget': budget},
+            'circuit_breakers': {'failure_rate': 0.25},
+            'metrics': {'sink': sink, 'prefix': 'api'},
+            'coalesce_requests': True,
+        }}
+        http_client = self.registry.get_client('api', configs,
+                                               io_loop=self.io_loop)
+        self.assertEqual(http_client.retry_policy.max_attempts, 5)
+        self.assertIs(http_client.retry_policy.budget, budget)
+        self.assertIsInstance(http_client.circuit_breakers,
+                              circuit.CircuitBreakers)
+        self.assertEqual(
+            http_client.circuit_breakers.get(('http', 'h', 80)).failure_rate,
+            0.25)
+        self.assertIs(http_client.metrics.sink, sink)
+        self.assertEqual(http_client.metrics.prefix, 'api')
+        self.assertTrue(http_client.coalesce_requests)
+        self.assertIsNone(http_client.bulkheads)
+        self.assertEqual(configs['api']['retry_policy']['max_attempts'], 5)
+
+    def test_that_unknown_configuration_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.registry.get_client('unknown', {}, io_loop=self.io_loop)
+
+    def test_that_close_forgets_clients(self):
+        http_client = self.registry.get_client(io_loop=self.io_loop)
+        self.registry.close(self.io_loop)
+        self.assertEqual(len(self.registry), 0)
+        self.assertIsNot(http_client,
+                         self.registry.get_client(io_loop=self.io_loop))
+
+
+class MixinRegistryTests(testing.AsyncHTTPTestCase):
+
+    def get_app(self):
+        return web.Application([
+            web.url('/shared', SharedClientHandler),
+            web.url('/named', NamedClientHandler),
+        ], http_clients={'other': {'max_clients': 2}})
+
+    def tearDown(self):
+        registry.close_clients(self.io_loop)
+        super(MixinRegistryTests, self).tearDown()
+
+    def test_that_handlers_share_a_client(self):
+        first = self.fetch('/shared')
+        second = self.fetch('/shared')
+        self.assertEqual(first.body, second.body)
+
+    def test_that_applications_do_not_share_clients(self):
+        other = web.Application([web.url('/shared', SharedClientHandler)],
+                                http_clients={'default': {}})
+        shared = self.fetch('/shared')
+        http_client = registry.get_client(settings=other.settings,
+                                          io_loop=self.io_loop)
+        self.assertNotEqual(shared.body, str(id(http_client)).encode())
+
+    def test_that_named_configuration_is_used(self):
+        shared = self.fetch('/shared')
+        named = self.fetch('/named')
+        self.assertNotEqual(shared.body, named.body)
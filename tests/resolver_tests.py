@@ -0,0 +1,156 @@
+import socket
+
+from tornado import concurrent, gen, testing, web
+
+from sprockets.clients.http import client, registry, resolver
+
+from tests.circuit_tests import FakeClock
+
+
+class StubResolver(object):
+
+    def __init__(self):
+        self.calls = []
+        self.error = None
+        self.pending = None
+
+    def resolve(self, host, port, family=socket.AF_UNSPEC):
+        self.calls.append(host)
+        future = concurrent.Future()
+        if self.pending is not None:
+            self.pending.append(future)
+        elif self.error is not None:
+            future.set_exception(self.error)
+        else:
+            future.set_result([(socket.AF_INET, ('10.0.0.{}'.format(
+                len(self.calls)), port))])
+        return future
+
+    def close(self):
+        pass
+
+
+class OkHandler(web.RequestHandler):
+
+    def get(self):
+        self.write('ok')
+
+
+class CachingResolverTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(CachingResolverTests, self).setUp()
+        self.backend = StubResolver()
+        self.clock = FakeClock()
+        self.resolver = resolver.CachingResolver(
+            resolver=self.backend, ttl=10, negative_ttl=2, refresh_ahead=0.5,
+            max_entries=2, clock=self.clock)
+
+    @testing.gen_test
+    def test_that_lookups_are_cached(self):
+        first = yield self.resolver.resolve('example.com', 80)
+        second = yield self.resolver.resolve('example.com', 80)
+        self.assertEqual(first, second)
+        self.assertEqual(self.backend.calls, ['example.com'])
+        self.assertEqual(self.resolver.stats()['hits'], 1)
+        self.assertEqual(self.resolver.stats()['misses'], 1)
+
+    @testing.gen_test
+    def test_that_expired_lookups_are_resolved_again(self):
+        yield self.resolver.resolve('example.com', 80)
+        self.clock.now += 10
+        addresses = yield self.resolver.resolve('example.com', 80)
+        self.assertEqual(addresses[0][1], ('10.0.0.2', 80))
+
+    @testing.gen_test
+    def test_that_failures_are_cached(self):
+        self.backend.error = IOError('no such host')
+        for _ in range(2):
+            with self.assertRaises(IOError):
+                yield self.resolver.resolve('example.com', 80)
+        self.assertEqual(len(self.backend.calls), 1)
+        self.assertEqual(self.resolver.stats()['negative_hits'], 1)
+        self.clock.now += 2
+        self.backend.error = None
+        yield self.resolver.resolve('example.com', 80)
+        self.assertEqual(len(self.backend.calls), 2)
+
+    @testing.gen_test
+    def test_that_entries_are_refreshed_before_expiry(self):
+        yield self.resolver.resolve('example.com', 80)
+        self.clock.now += 5
+        addresses = yield self.resolver.resolve('example.com', 80)
+        self.assertEqual(addresses[0][1], ('10.0.0.1', 80))
+        yield gen.moment
+        addresses = yield self.resolver.resolve('example.com', 80)
+        self.assertEqual(addresses[0][1], ('10.0.0.2', 80))
+        self.assertEqual(self.resolver.stats()['refreshes'], 1)
+
+    @testing.gen_test
+    def test_that_failed_refresh_keeps_previous_addresses(self):
+        yield self.resolver.resolve('example.com', 80)
+        self.clock.now += 5
+        self.backend.error = IOError('no such host')
+        yield self.resolver.resolve('example.com', 80)
+        yield gen.moment
+        addresses = yield self.resolver.resolve('example.com', 80)
+        self.assertEqual(addresses[0][1], ('10.0.0.1', 80))
+        self.assertEqual(self.resolver.stats()['errors'], 1)
+
+    @testing.gen_test
+    def test_that_concurrent_lookups_share_a_query(self):
+        self.backend.pending = []
+        first = self.resolver.resolve('example.com', 80)
+        second = self.resolver.resolve('example.com', 80)
+        self.assertEqual(len(self.backend.calls), 1)
+        self.backend.pending[0].set_result([])
+        results = yield [first, second]
+        self.assertEqual(results, [[], []])
+
+    @testing.gen_test
+    def test_that_least_recently_used_entry_is_evicted(self):
+        yield self.resolver.resolve('one.example.com', 80)
+        yield self.resolver.resolve('two.example.com', 80)
+        yield self.resolver.resolve('one.example.com', 80)
+        yield self.resolver.resolve('three.example.com', 80)
+        yield self.resolver.resolve('one.example.com', 80)
+        self.assertEqual(self.resolver.stats()['entries'], 2)
+        self.assertEqual(self.backend.calls.count('one.example.com'), 1)
+        yield self.resolver.resolve('two.example.com', 80)
+        self.assertEqual(self.backend.calls.count('two.example.com'), 2)
+
+    @testing.gen_test
+    def test_that_invalidate_discards_host(self):
+        yield self.resolver.resolve('example.com', 80)
+        self.resolver.invalidate('example.com')
+        yield self.resolver.resolve('example.com', 80)
+        self.assertEqual(len(self.backend.calls), 2)
+
+
+class HTTPClientResolverTests(testing.AsyncHTTPTestCase):
+
+    def get_app(self):
+        return web.Application([web.url('/', OkHandler)])
+
+    def tearDown(self):
+        registry.close_clients(self.io_loop)
+        super(HTTPClientResolverTests, self).tearDown()
+
+    @testing.gen_test
+    def test_that_resolver_is_installed_on_client(self):
+        http_client = client.HTTPClient(force_instance=True)
+        http_client.resolver = resolver.CachingResolver()
+        for _ in range(2):
+            yield http_client.send_request('GET', 'http', 'localhost',
+                                           port=self.get_http_port(),
+                                           headers={'Connection': 'close'})
+        self.assertEqual(http_client.resolver.stats()['misses'], 1)
+        self.assertEqual(http_client.resolver.stats()['hits'], 1)
+        http_client.close()
+
+    def test_that_registry_configures_dns_cache(self):
+        settings = {registry.SETTINGS_KEY: {
+            'cached': {'dns_cache': {'ttl': 5}}}}
+        http_client = registry.get_client('cached', settings, self.io_loop)
+        self.assertIsInstance(http_client.resolver, resolver.CachingResolver)
+        self.assertEqual(http_client.resolver.ttl, 5)
@@ -0,0 +1,201 @@
+import socket
+import unittest
+
+from tornado import httpclient, testing, web
+
+from sprockets.clients.http import circuit, client, retry
+
+
+def unused_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class FlakyHandler(web.RequestHandler):
+    """Fails with ``status`` until ``failures`` requests have been made."""
+
+    def initialize(self, state):
+        self.state = state
+
+    def get(self):
+        self.state['calls'] += 1
+        if self.state['calls'] <= self.state['failures']:
+            if self.state.get('retry_after') is not None:
+                self.set_header('Retry-After', self.state['retry_after'])
+            self.set_status(self.state['status'])
+        else:
+            self.write('ok')
+
+    post = get
+
+
+class RetryPolicyTests(unittest.TestCase):
+
+    def setUp(self):
+        super(RetryPolicyTests, self).setUp()
+        self.policy = retry.RetryPolicy(max_attempts=3, backoff=0.5,
+                                        jitter=False)
+
+    def make_error(self, code, method='GET', headers=None):
+        request = httpclient.HTTPRequest('http://localhost/', method=method)
+        response = None
+        if headers is not None:
+            response = httpclient.HTTPResponse(request, code,
+                                               headers=headers)
+        return request, client.HTTPError(request, code, response=response)
+
+    def test_that_backoff_grows_exponentially(self):
+        request, error = self.make_error(503)
+        self.assertEqual(self.policy.get_retry_delay(request, error, 1, 0),
+                         0.5)
+        self.assertEqual(self.policy.get_retry_delay(request, error, 2, 0),
+                         1.0)
+        self.assertIsNone(self.policy.get_retry_delay(request, error, 3, 0))
+
+    def test_that_non_idempotent_methods_are_not_retried(self):
+        request, error = self.make_error(503, method='POST')
+        self.assertIsNone(self.policy.get_retry_delay(request, error, 1, 0))
+
+    def test_that_client_errors_are_not_retried(self):
+        request, error = self.make_error(404)
+        self.assertIsNone(self.policy.get_retry_delay(request, error, 1, 0))
+
+    def test_that_retry_after_is_honored(self):
+        request, error = self.make_error(503, headers={'Retry-After': '2'})
+        self.assertEqual(self.policy.get_retry_delay(request, error, 1, 0),
+                         2.0)
+
+        request, error = self.make_error(503, headers={'Retry-After': '60'})
+        self.assertIsNone(self.policy.get_retry_delay(request, error, 1, 0))
+
+    def test_that_max_elapsed_is_honored(self):
+        self.policy.max_elapsed = 1.0
+        request, error = self.make_error(503)
+        self.assertIsNone(self.policy.get_retry_delay(request, error, 1, 0.8))
+
+    def test_that_budget_limits_retries(self):
+        self.policy.budget = retry.RetryBudget(ratio=0.5, capacity=2,
+                                               initial=1)
+        request, error = self.make_error(503)
+        self.assertIsNotNone(self.policy.get_retry_delay(request, error, 1, 0))
+        self.assertIsNone(self.policy.get_retry_delay(request, error, 1, 0))
+        self.policy.request_started()
+        self.policy.request_started()
+        self.assertIsNotNone(self.policy.get_retry_delay(request, error, 1, 0))
+
+    def test_that_jitter_stays_within_backoff(self):
+        self.policy.jitter = True
+        for _ in range(100):
+            self.assertLessEqual(self.policy.compute_backoff(2), 1.0)
+
+    def test_that_retry_after_dates_are_parsed(self):
+        self.assertEqual(
+            retry.parse_retry_after('Wed, 21 Oct 2015 07:28:10 GMT',
+                                    now=1445412480),
+            10.0)
+        self.assertIsNone(retry.parse_retry_after('soon'))
+
+
+class SendRequestRetryTests(testing.AsyncHTTPTestCase):
+
+    def setUp(self):
+        self.state = {'calls': 0, 'failures': 2, 'status': 503}
+        super(SendRequestRetryTests, self).setUp()
+        self.client = client.HTTPClient()
+        self.client.retry_policy = retry.RetryPolicy(backoff=0.01,
+                                                     jitter=False)
+
+    def get_app(self):
+        return web.Application([web.url('/', FlakyHandler,
+                                        {'state': self.state})])
+
+    @testing.gen_test
+    def test_that_transient_failures_are_retried(self):
+        response = yield self.client.send_request(
+            'GET', 'http', '127.0.0.1', port=self.get_http_port())
+        self.assertEqual(response.code, 200)
+        self.assertEqual(self.state['calls'], 3)
+
+    @testing.gen_test
+    def test_that_attempts_are_recorded_on_error(self):
+        self.state['failures'] = 10
+        with self.assertRaises(client.HTTPError) as context:
+            yield self.client.send_request(
+                'GET', 'http', '127.0.0.1', port=self.get_http_port())
+        self.assertEqual([a.code for a in context.exception.attempts],
+                         [503, 503, 503])
+        self.assertEqual([a.delay for a in context.exception.attempts],
+                         [0.01, 0.02, None])
+
+    @testing.gen_test
+    def test_that_retries_can_be_disabled_per_call(self):
+        with self.assertRaises(client.HTTPError) as context:
+            yield self.client.send_request(
+                'GET', 'http', '127.0.0.1', port=self.get_http_port(),
+                retry_policy=None)
+        self.assertEqual(len(context.exception.attempts), 1)
+        self.assertEqual(self.state['calls'], 1)
+
+    @testing.gen_test
+    def test_that_connection_failures_are_retried(self):
+        self.client.retry_policy.backoff = 0.0
+        with self.assertRaises(client.HTTPError) as context:
+            yield self.client.send_request('GET', 'http', '127.0.0.1',
+                                           port=unused_port())
+        self.assertEqual(context.exception.code, 599)
+        self.assertIsNotNone(context.exception.cause)
+        self.assertEqual([a.code for a in context.exception.attempts],
+                         [599, 599, 599])
+
+
+class FailingTransport(object):
+    """Transport whose ``fetch`` raises ``exception``."""
+
+    def __init__(self, io_loop, exception):
+        self.io_loop = io_loop
+        self.exception = exception
+        self.defaults = {}
+        self.calls = 0
+
+    def fetch(self, request):
+        self.calls += 1
+        raise self.exception
+
+    def close(self):
+        pass
+
+
+class UnexpectedFailureTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(UnexpectedFailureTests, self).setUp()
+        self.client = client.HTTPClient()
+        self.client.retry_policy = retry.RetryPolicy(max_attempts=3,
+                                                     backoff=0.0)
+        self.client.circuit_breakers = circuit.CircuitBreakers(
+            minimum_requests=3)
+
+    def fail_with(self, exception):
+        self.client.transport = FailingTransport(self.io_loop, exception)
+        return self.client.send_request('GET', 'http', 'service')
+
+    @testing.gen_test
+    def test_that_programming_errors_are_raised_as_is(self):
+        with self.assertRaises(TypeError):
+            yield self.fail_with(TypeError('unexpected keyword'))
+        self.assertEqual(self.client.transport.calls, 1)
+        self.assertEqual(self.client.circuit_breakers.states(),
+                         {('http', 'service', 80): circuit.CLOSED})
+
+    @testing.gen_test
+    def test_that_transport_errors_are_reported_as_599(self):
+        with self.assertRaises(client.HTTPError) as context:
+            yield self.fail_with(socket.error('connection reset'))
+        self.assertEqual(context.exception.code, 599)
+        self.assertIsInstance(context.exception.cause, socket.error)
+        self.assertEqual(self.client.transport.calls, 3)
+        self.assertEqual(self.client.circuit_breakers.states(),
+                         {('http', 'service', 80): circuit.OPEN})
@@ -0,0 +1,172 @@
+from tornado import gen, testing, web
+
+from sprockets.clients.http import (bulkhead, circuit, client, metrics,
+                                    retry, scheduler, transports)
+
+
+class PrioritySchedulerTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(PrioritySchedulerTests, self).setUp()
+        self.scheduler = scheduler.PriorityScheduler(
+            max_concurrent=1, weights={'a': 2, 'b': 1},
+            default_priority='a', starvation_timeout=None)
+        self.order = []
+
+    def queue(self, priority):
+        future = self.scheduler.acquire(priority)
+        self.io_loop.add_future(
+            future, lambda _: self.order.append(priority))
+
+    @gen.coroutine
+    def drain(self):
+        while self.scheduler.queued:
+            self.scheduler.release()
+            yield gen.moment
+
+    def test_that_requests_are_sent_immediately_when_not_saturated(self):
+        self.assertTrue(self.scheduler.acquire('b').done())
+        self.assertFalse(self.scheduler.acquire('a').done())
+        self.assertEqual(self.scheduler.active, 1)
+        self.assertEqual(self.scheduler.queued, 1)
+
+    def test_that_unknown_priority_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.scheduler.acquire('c')
+        with self.assertRaises(ValueError):
+            scheduler.PriorityScheduler(default_priority='c')
+
+    @testing.gen_test
+    def test_that_waiting_times_out(self):
+        self.scheduler.acquire()
+        acquired = yield self.scheduler.acquire('b', timeout=0.01)
+        self.assertFalse(acquired)
+        self.assertEqual(self.scheduler.queued, 0)
+        self.scheduler.release()
+        self.assertEqual(self.scheduler.active, 0)
+
+    @testing.gen_test
+    def test_that_priorities_are_weighted(self):
+        self.scheduler.acquire()
+        for _ in range(4):
+            self.queue('b')
+        for _ in range(4):
+            self.queue('a')
+        yield self.drain()
+        self.assertEqual(self.order, ['a', 'b', 'a', 'a', 'b', 'a', 'b', 'b'])
+
+    @testing.gen_test
+    def test_that_starved_requests_are_dispatched_first(self):
+        self.scheduler.starvation_timeout = 0.05
+        self.scheduler.acquire()
+        self.queue('b')
+        yield gen.sleep(0.05)
+        self.queue('a')
+        self.queue('a')
+        yield self.drain()
+        self.assertEqual(self.order, ['b', 'a', 'a'])
+        self.assertEqual(self.scheduler.stats()['b']['starved'], 1)
+
+    @testing.gen_test
+    def test_that_queue_wait_is_recorded(self):
+        self.scheduler.acquire('a')
+        self.queue('b')
+        yield gen.sleep(0.02)
+        self.scheduler.release()
+        stats = self.scheduler.stats()
+        self.assertEqual(stats['a']['dispatched'], 1)
+        self.assertEqual(stats['a']['max_wait_time'], 0.0)
+        self.assertEqual(stats['b']['dispatched'], 1)
+        self.assertEqual(stats['b']['queued'], 0)
+        self.assertGreaterEqual(stats['b']['p99_wait_time'], 0.02)
+
+    def test_that_releasing_idle_slot_frees_it(self):
+        self.scheduler.acquire()
+        self.scheduler.release()
+        self.assertEqual(self.scheduler.active, 0)
+
+
+class RecordingHandler(web.RequestHandler):
+
+    def initialize(self, order):
+        self.order = order
+
+    @gen.coroutine
+    def get(self, name):
+        self.order.append(name)
+        yield gen.sleep(0.2 if name == 'slow' else 0.01)
+
+
+class ScheduledClientTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(ScheduledClientTests, self).setUp()
+        self.order = []
+        self.client = client.HTTPClient()
+        self.client.transport = transports.LoopbackTransport(
+            web.Application([web.url(r'/(.*)', RecordingHandler,
+                                     {'order': self.order})]),
+            io_loop=self.io_loop)
+        self.client.scheduler = scheduler.PriorityScheduler(max_concurrent=1)
+
+    @testing.gen_test
+    def test_that_high_priority_requests_jump_the_queue(self):
+        futures = [
+            self.client.send_request('GET', 'http', 'service', 'first',
+                                     priority='low'),
+            self.client.send_request('GET', 'http', 'service', 'low',
+                                     priority='low'),
+            self.client.send_request('GET', 'http', 'service', 'normal'),
+            self.client.send_request('GET', 'http', 'service', 'high',
+                                     priority='high'),
+        ]
+        yield futures
+        self.assertEqual(self.order, ['first', 'high', 'normal', 'low'])
+        self.assertEqual(self.client.scheduler.active, 0)
+        self.assertEqual(self.client.scheduler.stats()['low']['dispatched'],
+                         2)
+
+    def test_that_unknown_priority_is_rejected_before_sending(self):
+        with self.assertRaises(ValueError):
+            self.client.send_request('GET', 'http', 'service', 'x',
+                                     priority='urgent')
+        self.assertEqual(self.client.scheduler.active, 0)
+        self.assertEqual(self.order, [])
+
+    @testing.gen_test
+    def test_that_queue_wait_is_bounded_by_request_timeout(self):
+        first = self.client.send_request('GET', 'http', 'service', 'slow')
+        with self.assertRaises(client.QueueTimeoutError) as context:
+            yield self.client.send_request('GET', 'http', 'service', 'x',
+                                           request_timeout=0.05,
+                                           retry_policy=None)
+        self.assertEqual(context.exception.code, 599)
+        self.assertEqual(self.client.scheduler.queued, 0)
+        yield first
+        self.assertEqual(self.order, ['slow'])
+        self.assertEqual(self.client.scheduler.active, 0)
+
+    @testing.gen_test
+    def test_that_queue_timeouts_are_not_held_against_the_upstream(self):
+        self.client.circuit_breakers = circuit.CircuitBreakers(
+            minimum_requests=1)
+        self.client.bulkheads = bulkhead.Bulkheads(max_concurrent=1)
+        self.client.metrics = metrics.MetricsRecorder(flush_interval=None)
+        self.client.retry_policy = retry.RetryPolicy(max_attempts=3,
+                                                     codes=[599])
+        first = self.client.send_request('GET', 'http', 'service', 'slow')
+        for _ in range(4):
+            with self.assertRaises(client.QueueTimeoutError) as context:
+                yield self.client.send_request('GET', 'http', 'service',
+                                               'x', request_timeout=0.01)
+            self.assertEqual(context.exception.attempts, [])
+        yield first
+
+        response = yield self.client.send_request('GET', 'http', 'service',
+                                                  'last')
+        self.assertEqual(response.code, 200)
+        self.assertEqual(self.client.circuit_breakers.states(),
+                         {('http', 'service', 80): circuit.CLOSED})
+        self.assertEqual(self.order, ['slow', 'last'])
+        self.assertEqual(self.client.metrics.sink.counters,
+                         {'http.service.GET.2xx.requests': 2})
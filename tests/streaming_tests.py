@@ -0,0 +1,175 @@
+import unittest
+
+from tornado import gen, testing, web
+
+from sprockets.clients import http
+from sprockets.clients.http import client, registry, streaming
+
+
+class ChunkedHandler(web.RequestHandler):
+
+    @gen.coroutine
+    def get(self, status):
+        self.set_status(int(status))
+        self.set_header('Content-Type', 'application/octet-stream')
+        self.set_header('X-Upstream', 'yes')
+        for index in range(3):
+            self.write('chunk{}'.format(index))
+            yield self.flush()
+            yield gen.sleep(0.01)
+
+
+class BurstHandler(web.RequestHandler):
+
+    def get(self):
+        for index in range(3):
+            self.write('chunk{}'.format(index))
+            self.flush()
+
+
+class ProxyHandler(http.ClientMixin, web.RequestHandler):
+
+    @gen.coroutine
+    def get(self, status):
+        yield self.proxy_http_response(
+            'GET', 'http', '127.0.0.1', 'chunks', status,
+            port=self.settings['upstream_port'])
+
+
+class LimitedProxyHandler(http.ClientMixin, web.RequestHandler):
+
+    @gen.coroutine
+    def get(self):
+        try:
+            yield self.proxy_http_response(
+                'GET', 'http', '127.0.0.1', 'burst',
+                port=self.settings['upstream_port'], max_buffer_size=2)
+        except client.HTTPError as error:
+            self.settings['errors'].append(error)
+
+
+class HeaderLineTests(unittest.TestCase):
+
+    def test_that_interim_responses_are_skipped(self):
+        stream = streaming.ResponseStream()
+        for line in ('HTTP/1.1 302 Found\r\n', 'Location: /other\r\n',
+                     '\r\n', 'HTTP/1.1 200 OK\r\n', 'X-Final: 1\r\n'):
+            stream.on_header_line(line)
+        self.assertFalse(stream.headers_received().done())
+        stream.on_header_line('\r\n')
+        self.assertTrue(stream.headers_received().done())
+        self.assertEqual(stream.code, 200)
+        self.assertEqual(dict(stream.headers), {'X-Final': '1'})
+
+
+class BufferLimitTests(unittest.TestCase):
+
+    def test_that_overflow_fails_the_stream(self):
+        stream = streaming.ResponseStream(max_buffer_size=10)
+        stream.on_chunk(b'0123456789')
+        self.assertFalse(stream.complete().done())
+        stream.on_chunk(b'a')
+        self.assertEqual(stream.buffered, 0)
+        self.assertEqual(stream.complete().exception().code, 599)
+        stream.on_chunk(b'discarded')
+        self.assertEqual(stream.buffered, 0)
+        self.assertTrue(stream.done())
+
+
+class StreamRequestTests(testing.AsyncHTTPTestCase):
+
+    def setUp(self):
+        super(StreamRequestTests, self).setUp()
+        self.client = client.HTTPClient()
+
+    def get_app(self):
+        return web.Application([
+            web.url(r'/chunks/(\d+)', ChunkedHandler),
+            web.url(r'/proxy/(\d+)', ProxyHandler),
+            web.url(r'/burst', BurstHandler),
+            web.url(r'/limited', LimitedProxyHandler),
+        ], upstream_port=self.get_http_port(), errors=[])
+
+    def tearDown(self):
+        registry.close_clients(self.io_loop)
+        super(StreamRequestTests, self).tearDown()
+
+    @testing.gen_test
+    def test_that_chunks_are_streamed(self):
+        stream = self.client.stream_request('GET', 'http', '127.0.0.1',
+                                            'chunks', 200,
+                                            port=self.get_http_port())
+        yield stream.headers_received()
+        self.assertEqual(stream.code, 200)
+        self.assertEqual(stream.headers['X-Upstream'], 'yes')
+
+        chunks = []
+        while not stream.done():
+            chunk = yield stream.next()
+            if chunk is not None:
+                chunks.append(chunk)
+        self.assertEqual(b''.join(chunks), b'chunk0chunk1chunk2')
+        self.assertEqual(stream.buffered, 0)
+
+        response = yield stream.complete()
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.body, b'')
+
+    @testing.gen_test
+    def test_that_unconsumed_chunks_are_limited(self):
+        stream = self.client.stream_request('GET', 'http', '127.0.0.1',
+                                            'chunks', 200,
+                                            port=self.get_http_port(),
+                                            max_buffer_size=10)
+        yield stream.headers_received()
+        yield gen.sleep(0.05)
+        with self.assertRaises(client.HTTPError) as context:
+            yield stream.next()
+        self.assertEqual(context.exception.code, 599)
+        self.assertEqual(context.exception.reason, 'Stream Buffer Full')
+        self.assertEqual(context.exception.request.url,
+                         self.get_url('/chunks/200'))
+        self.assertEqual(stream.buffered, 0)
+
+    @testing.gen_test
+    def test_that_chunk_callback_receives_chunks(self):
+        chunks = []
+        stream = self.client.stream_request('GET', 'http', '127.0.0.1',
+                                            'chunks', 200,
+                                            port=self.get_http_port(),
+                                            chunk_callback=chunks.append)
+        yield stream.complete()
+        self.assertEqual(len(chunks), 3)
+
+    @testing.gen_test
+    def test_that_connection_failures_fail_headers(self):
+        sock, port = testing.bind_unused_port()
+        sock.close()
+        stream = self.client.stream_request('GET', 'http', '127.0.0.1',
+                                            port=port)
+        with self.assertRaises(Exception):
+            yield stream.headers_received()
+        self.assertIsNone(stream.code)
+
+    def test_that_mixin_proxies_response(self):
+        response = self.fetch('/proxy/200')
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.body, b'chunk0chunk1chunk2')
+        self.assertEqual(response.headers['X-Upstream'], 'yes')
+        self.assertEqual(response.headers['Content-Type'],
+                         'application/octet-stream')
+
+    def test_that_mixin_proxies_error_responses(self):
+        response = self.fetch('/proxy/404')
+        self.assertEqual(response.code, 404)
+        self.assertEqual(response.body, b'chunk0chunk1chunk2')
+
+    def test_that_mixin_reports_buffer_overflows(self):
+        response = self.fetch('/limited')
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.body, b'chunk0')
+        error, = self._app.settings['errors']
+        self.assertIsInstance(error, client.HTTPError)
+        self.assertEqual(error.code, 599)
+        self.assertEqual(error.reason, 'Stream Buffer Full')
+        self.assertEqual(error.request.url, self.get_url('/burst'))
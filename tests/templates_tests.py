@@ -0,0 +1,83 @@
+import unittest
+
+from tornado import testing, web
+
+from sprockets.clients.http import client
+
+
+class EchoPathHandler(web.RequestHandler):
+
+    def get(self, *args):
+        self.set_header('X-Header', self.request.headers.get('X-Header', ''))
+        self.write(self.request.path)
+
+
+class RequestTemplateTests(unittest.TestCase):
+
+    def setUp(self):
+        super(RequestTemplateTests, self).setUp()
+        self.client = client.HTTPClient()
+        self.client.headers['Accept'] = 'application/json'
+
+    def test_that_static_segments_are_quoted(self):
+        template = self.client.template('GET', 'http', 'example.com',
+                                        'a b', 'c/d', port=8000)
+        self.assertEqual(template.url(),
+                         'http://example.com:8000/a%20b/c%2Fd')
+
+    def test_that_fields_are_formatted_and_quoted(self):
+        template = self.client.template('GET', 'http', 'example.com',
+                                        'users', '{user}', 'v{version}')
+        self.assertEqual(template.fields, ['user', 'version'])
+        self.assertEqual(template.url(user='a/b', version=2),
+                         'http://example.com/users/a%2Fb/v2')
+
+    def test_that_missing_field_raises_type_error(self):
+        template = self.client.template('GET', 'http', 'example.com',
+                                        '{user}')
+        with self.assertRaises(TypeError):
+            template.url()
+
+    def test_that_headers_are_merged_once(self):
+        template = self.client.template('GET', 'http', 'example.com',
+                                        headers={'X-Header': 'template'})
+        self.assertEqual(template.headers['Accept'], 'application/json')
+        self.assertEqual(template.headers['X-Header'], 'template')
+        self.assertNotIn('X-Header', self.client.headers)
+
+    def test_that_upstream_names_ignore_port(self):
+        self.client.add_upstream('service', ['127.0.0.1:8000'])
+        template = self.client.template('GET', 'http', 'service', 'path',
+                                        port=9000)
+        self.assertEqual(template.url(), 'http://service/path')
+
+
+class SendTemplateTests(testing.AsyncHTTPTestCase):
+
+    def setUp(self):
+        super(SendTemplateTests, self).setUp()
+        self.client = client.HTTPClient()
+        self.template = self.client.template(
+            'GET', 'http', '127.0.0.1', 'items', '{item}',
+            port=self.get_http_port(), headers={'X-Header': 'template'})
+
+    def get_app(self):
+        return web.Application([web.url(r'/(.*)', EchoPathHandler)])
+
+    @testing.gen_test
+    def test_that_template_sends_request(self):
+        response = yield self.template(item='a b')
+        self.assertEqual(response.body, b'/items/a%20b')
+        self.assertEqual(response.headers['X-Header'], 'template')
+
+    @testing.gen_test
+    def test_that_call_overrides_headers(self):
+        response = yield self.template(item=1, headers={'X-Header': 'call'})
+        self.assertEqual(response.headers['X-Header'], 'call')
+        self.assertEqual(self.template.headers['X-Header'], 'template')
+
+    @testing.gen_test
+    def test_that_send_request_options_are_supported(self):
+        response = yield self.template(item=1, use_cache=False,
+                                       request_timeout=5)
+        self.assertEqual(response.request.request_timeout, 5)
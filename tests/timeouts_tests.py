@@ -0,0 +1,128 @@
+import unittest
+
+from tornado import testing, web
+
+from sprockets.clients.http import client, timeouts
+
+from tests.deadline_tests import DeadlineEchoHandler
+
+
+UPSTREAM = ('http', 'api.example.com', 80)
+
+
+class AdaptiveTimeoutsTests(unittest.TestCase):
+
+    def setUp(self):
+        super(AdaptiveTimeoutsTests, self).setUp()
+        self.timeouts = timeouts.AdaptiveTimeouts(
+            percentile=90, multiplier=2, floor=0.05, ceiling=1.0,
+            min_samples=10)
+
+    def record(self, values, method='GET'):
+        for value in values:
+            self.timeouts.record(method, UPSTREAM, value)
+
+    def test_that_timeout_needs_enough_samples(self):
+        self.record([0.1] * 9)
+        self.assertIsNone(self.timeouts.get_timeout('GET', UPSTREAM))
+        self.record([0.1])
+        self.assertAlmostEqual(self.timeouts.get_timeout('GET', UPSTREAM),
+                               0.2)
+
+    def test_that_timeout_follows_percentile(self):
+        self.record([0.01] * 8 + [0.2, 0.3])
+        self.assertAlmostEqual(self.timeouts.get_timeout('GET', UPSTREAM),
+                               0.4)
+
+    def test_that_timeout_is_clamped(self):
+        self.record([0.001] * 10)
+        self.record([5.0] * 10, method='POST')
+        self.assertEqual(self.timeouts.get_timeout('GET', UPSTREAM), 0.05)
+        self.assertEqual(self.timeouts.get_timeout('POST', UPSTREAM), 1.0)
+
+    def test_that_floor_must_not_exceed_ceiling(self):
+        with self.assertRaises(ValueError):
+            timeouts.AdaptiveTimeouts(floor=2, ceiling=1)
+
+    def test_that_consecutive_timeouts_raise_the_timeout(self):
+        self.record([0.1] * 10)
+        self.assertAlmostEqual(self.timeouts.get_timeout('GET', UPSTREAM),
+                               0.2)
+        self.timeouts.record_timeout('GET', UPSTREAM, 0.2)
+        self.assertAlmostEqual(self.timeouts.get_timeout('GET', UPSTREAM),
+                               0.4)
+        for _ in range(3):
+            self.timeouts.record_timeout('GET', UPSTREAM, 0.4)
+        self.assertEqual(self.timeouts.get_timeout('GET', UPSTREAM), 1.0)
+        self.record([0.1])
+        self.assertAlmostEqual(self.timeouts.get_timeout('GET', UPSTREAM),
+                               0.2)
+
+    def test_that_stats_report_effective_timeouts(self):
+        self.record([0.1] * 10)
+        self.record([0.1], method='PUT')
+        stats = self.timeouts.stats()
+        self.assertEqual(stats[('api.example.com', 'GET')]['samples'], 10)
+        self.assertAlmostEqual(
+            stats[('api.example.com', 'GET')]['timeout'], 0.2)
+        self.assertIsNone(stats[('api.example.com', 'PUT')]['timeout'])
+
+
+class SendRequestAdaptiveTimeoutTests(testing.AsyncHTTPTestCase):
+
+    def setUp(self):
+        super(SendRequestAdaptiveTimeoutTests, self).setUp()
+        self.client = client.HTTPClient()
+        self.client.adaptive_timeouts = timeouts.AdaptiveTimeouts(
+            multiplier=1, floor=0.2, ceiling=0.5, min_samples=2)
+
+    def get_app(self):
+        return web.Application([
+            web.url('/fast', DeadlineEchoHandler),
+            web.url('/slow', DeadlineEchoHandler, {'delay': 1}),
+            web.url('/slower', DeadlineEchoHandler, {'delay': 0.25}),
+        ])
+
+    def send(self, path, **kwargs):
+        return self.client.send_request('GET', 'http', '127.0.0.1', path,
+                                        port=self.get_http_port(), **kwargs)
+
+    @testing.gen_test
+    def test_that_learned_timeout_is_applied(self):
+        for _ in range(2):
+            yield self.send('fast')
+        with self.assertRaises(client.HTTPError) as context:
+            yield self.send('slow')
+        self.assertEqual(context.exception.code, 599)
+        self.assertEqual(context.exception.request.request_timeout, 0.2)
+        stats = self.client.adaptive_timeouts.stats()
+        self.assertEqual(stats[('127.0.0.1', 'GET')]['samples'], 3)
+        self.assertEqual(
+            stats[('127.0.0.1', 'GET')]['consecutive_timeouts'], 1)
+
+    @testing.gen_test
+    def test_that_timeout_recovers_when_latency_steps_up(self):
+        self.client.adaptive_timeouts = timeouts.AdaptiveTimeouts(
+            multiplier=1, floor=0.05, ceiling=1.0, min_samples=2)
+        for _ in range(2):
+            yield self.send('fast')
+        codes = []
+        for _ in range(5):
+            try:
+                response = yield self.send('slower')
+            except client.HTTPError as error:
+                codes.append(error.code)
+            else:
+                codes.append(response.code)
+                break
+        self.assertEqual(codes, [599, 599, 599, 200])
+        stats = self.client.adaptive_timeouts.stats()
+        self.assertEqual(
+            stats[('127.0.0.1', 'GET')]['consecutive_timeouts'], 0)
+
+    @testing.gen_test
+    def test_that_explicit_timeout_is_not_replaced(self):
+        for _ in range(2):
+            yield self.send('fast')
+        response = yield self.send('fast', request_timeout=5)
+        self.assertEqual(response.request.request_timeout, 5)
@@ -0,0 +1,143 @@
+from tornado import gen, httpclient, testing, web
+
+from sprockets.clients.http import client, mixins, registry, transports
+
+
+class EchoHandler(web.RequestHandler):
+
+    def get(self, status):
+        self.set_status(int(status))
+        self.set_header('X-Host', self.request.host)
+        self.write(self.request.uri)
+
+    def post(self, status):
+        self.set_status(int(status))
+        self.write(self.request.body)
+
+
+class ChunkedHandler(web.RequestHandler):
+
+    @gen.coroutine
+    def get(self):
+        for chunk in (b'one', b'two', b'three'):
+            self.write(chunk)
+            yield self.flush()
+
+
+class SlowHandler(web.RequestHandler):
+
+    @gen.coroutine
+    def get(self):
+        yield gen.sleep(0.5)
+        self.write('late')
+
+
+def make_upstream():
+    return web.Application([
+        web.url(r'/echo/(\d+)', EchoHandler),
+        web.url(r'/chunked', ChunkedHandler),
+        web.url(r'/slow', SlowHandler),
+    ])
+
+
+class LoopbackTransportTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(LoopbackTransportTests, self).setUp()
+        self.client = client.HTTPClient()
+        self.client.transport = transports.LoopbackTransport(
+            make_upstream(), io_loop=self.io_loop)
+
+    @testing.gen_test
+    def test_that_request_is_dispatched_to_application(self):
+        response = yield self.client.send_request(
+            'GET', 'http', 'service', 'echo', 200, port=8000)
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.body, b'/echo/200')
+        self.assertEqual(response.headers['X-Host'], 'service:8000')
+        self.assertEqual(response.effective_url,
+                         'http://service:8000/echo/200')
+
+    @testing.gen_test
+    def test_that_query_is_dispatched(self):
+        response = yield self.client.transport.fetch(
+            httpclient.HTTPRequest('http://service/echo/200?q=x'))
+        self.assertEqual(response.body, b'/echo/200?q=x')
+
+    @testing.gen_test
+    def test_that_request_body_is_delivered(self):
+        response = yield self.client.send_request(
+            'POST', 'http', 'service', 'echo', 201, body=b'payload')
+        self.assertEqual(response.code, 201)
+        self.assertEqual(response.body, b'payload')
+
+    @testing.gen_test
+    def test_that_streaming_request_body_is_delivered(self):
+        response = yield self.client.send_request(
+            'POST', 'http', 'service', 'echo', 200,
+            body=iter([b'pay', b'load']))
+        self.assertEqual(response.body, b'payload')
+
+    @testing.gen_test
+    def test_that_failures_raise_http_error(self):
+        with self.assertRaises(client.HTTPError) as context:
+            yield self.client.send_request('GET', 'http', 'service',
+                                           'echo', 404)
+        self.assertEqual(context.exception.code, 404)
+        self.assertEqual(context.exception.response.body, b'/echo/404')
+
+    @testing.gen_test
+    def test_that_unknown_paths_are_not_found(self):
+        with self.assertRaises(client.HTTPError) as context:
+            yield self.client.send_request('GET', 'http', 'service', 'nope')
+        self.assertEqual(context.exception.code, 404)
+
+    @testing.gen_test
+    def test_that_response_is_streamed(self):
+        chunks = []
+        headers = []
+        response = yield self.client.send_request(
+            'GET', 'http', 'service', 'chunked',
+            streaming_callback=chunks.append,
+            header_callback=headers.append)
+        self.assertEqual(b''.join(chunks), b'onetwothree')
+        self.assertEqual(response.body, b'')
+        self.assertEqual(headers[0], 'HTTP/1.1 200 OK\r\n')
+        self.assertEqual(headers[-1], '\r\n')
+
+    @testing.gen_test
+    def test_that_request_timeout_is_enforced(self):
+        with self.assertRaises(client.HTTPError) as context:
+            yield self.client.send_request('GET', 'http', 'service', 'slow',
+                                           request_timeout=0.05)
+        self.assertEqual(context.exception.code, 599)
+
+
+class ForwardingHandler(mixins.ClientMixin, web.RequestHandler):
+
+    http_client_name = 'loopback'
+
+    @gen.coroutine
+    def get(self):
+        response = yield self.make_http_request('GET', 'http', 'service',
+                                                'echo', 200)
+        self.write(response.body)
+
+
+class MixinTransportTests(testing.AsyncHTTPTestCase):
+
+    def get_app(self):
+        transport = transports.LoopbackTransport(make_upstream(),
+                                                 io_loop=self.io_loop)
+        return web.Application(
+            [web.url('/forward', ForwardingHandler)],
+            http_clients={'loopback': {'transport': transport}})
+
+    def tearDown(self):
+        registry.close_clients(self.io_loop)
+        super(MixinTransportTests, self).tearDown()
+
+    def test_that_registry_installs_transport(self):
+        response = self.fetch('/forward')
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.body, b'/echo/200')